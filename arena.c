@@ -0,0 +1,106 @@
+#include "segel.h"
+#include "request.h"
+#include "arena.h"
+
+#define ARENA_ALIGN 16
+
+// Header of an allocation that did not fit in the arena
+typedef struct arena_overflow {
+    struct arena_overflow *next;
+} __attribute__((aligned(ARENA_ALIGN))) arena_overflow;
+
+typedef struct {
+    char *base;              // ARENA_SIZE bytes, NULL without an arena
+    size_t used;
+    size_t overflow_bytes;   // malloc'ed since the last reset
+    arena_overflow *overflow;
+} arena;
+
+typedef struct __attribute__((aligned(CACHE_LINE))) {
+    unsigned long high_water;
+    unsigned long overflows;
+} arena_counters;
+
+static arena_counters *g_counters = NULL;
+static int g_arena_threads = 0;
+static __thread arena tl_arena;
+static __thread arena_counters *tl_counters = NULL;
+
+void arena_init(int num_threads) {
+    size_t size = sizeof(arena_counters) * (num_threads + 1);
+    int rc = posix_memalign((void **)&g_counters, CACHE_LINE, size);
+    if (rc != 0) {
+        posix_error(rc, "posix_memalign error");
+    }
+    memset(g_counters, 0, size);
+    g_arena_threads = num_threads;
+}
+
+void arena_destroy(void) {
+    free(g_counters);
+    g_counters = NULL;
+    g_arena_threads = 0;
+}
+
+void arena_attach(int thread_id) {
+    int rc = posix_memalign((void **)&tl_arena.base, CACHE_LINE, ARENA_SIZE);
+    if (rc != 0) {
+        posix_error(rc, "posix_memalign error");
+    }
+    tl_arena.used = 0;
+    if (thread_id <= g_arena_threads) {
+        tl_counters = &g_counters[thread_id];
+    }
+}
+
+void arena_detach(void) {
+    arena_reset();
+    free(tl_arena.base);
+    tl_arena.base = NULL;
+    tl_counters = NULL;
+}
+
+void *arena_alloc(size_t size) {
+    arena *a = &tl_arena;
+    size_t aligned = (size + ARENA_ALIGN - 1) & ~(size_t)(ARENA_ALIGN - 1);
+
+    if (a->base != NULL && aligned <= ARENA_SIZE - a->used) {
+        void *p = a->base + a->used;
+        a->used += aligned;
+        return p;
+    }
+    arena_overflow *block = Malloc(sizeof(arena_overflow) + size);
+    block->next = a->overflow;
+    a->overflow = block;
+    a->overflow_bytes += size;
+    if (tl_counters) {
+        __atomic_store_n(&tl_counters->overflows, tl_counters->overflows + 1,
+                         __ATOMIC_RELAXED);
+    }
+    return block + 1;
+}
+
+void arena_reset(void) {
+    arena *a = &tl_arena;
+    unsigned long total = a->used + a->overflow_bytes;
+
+    // only the owning thread writes its counters
+    if (tl_counters && total > tl_counters->high_water) {
+        __atomic_store_n(&tl_counters->high_water, total, __ATOMIC_RELAXED);
+    }
+    while (a->overflow) {
+        arena_overflow *next = a->overflow->next;
+        free(a->overflow);
+        a->overflow = next;
+    }
+    a->used = 0;
+    a->overflow_bytes = 0;
+}
+
+void arena_snapshot(int thread_id, unsigned long *high_water,
+                    unsigned long *overflows) {
+    *high_water = __atomic_load_n(&g_counters[thread_id].high_water,
+                                  __ATOMIC_RELAXED);
+    *overflows = __atomic_load_n(&g_counters[thread_id].overflows,
+                                 __ATOMIC_RELAXED);
+}
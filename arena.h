@@ -0,0 +1,45 @@
+#ifndef SERVER_ARENA_H
+#define SERVER_ARENA_H
+
+#include <stddef.h>
+
+//
+// Per-worker arena allocator for memory that only lives while one request is
+// handled: header buffers, the parsed filename and CGI arguments, log
+// snapshots.
+//
+// Every worker owns an ARENA_SIZE block. arena_alloc bumps a pointer into the
+// calling thread's block, and arena_reset, called after every request,
+// releases everything at once. Allocations that do not fit fall back to
+// malloc and are freed by the next arena_reset, so the request path never
+// calls free itself. Threads without an arena get every allocation from
+// malloc. Long-lived objects (the log, the queue, caches) stay on the heap.
+//
+
+#define ARENA_SIZE (64 * 1024)
+
+// Allocates the high-water counters of worker threads 1..num_threads
+void arena_init(int num_threads);
+
+// Frees the counters
+void arena_destroy(void);
+
+// Creates the calling thread's arena and binds it to a worker's counters
+void arena_attach(int thread_id);
+
+// Frees the calling thread's arena
+void arena_detach(void);
+
+// Returns size bytes that stay valid until the next arena_reset
+void *arena_alloc(size_t size);
+
+// Releases everything allocated since the last reset and updates the
+// thread's high-water mark
+void arena_reset(void);
+
+// Reads a worker's counters: the most bytes one request used and how many
+// allocations did not fit in the arena
+void arena_snapshot(int thread_id, unsigned long *high_water,
+                    unsigned long *overflows);
+
+#endif // SERVER_ARENA_H
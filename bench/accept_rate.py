@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Connections/sec against the number of acceptor threads (--acceptors=K).
+
+Every connection carries one small static GET, so the result is bounded by
+how fast the server can accept and hand off connections.
+
+    python3 bench/accept_rate.py --acceptors 1 2 4 --threads 8 --duration 3
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(__file__))
+from common import Server, hammer, percentile  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--acceptors", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--queue-size", type=int, default=256)
+    parser.add_argument("--clients", type=int, default=0, help="load processes (default: cpu count)")
+    parser.add_argument("--duration", type=float, default=3.0)
+    args = parser.parse_args()
+
+    print(f"{'acceptors':>9} {'conn/s':>10} {'errors':>7} {'p50 ms':>8} {'p99 ms':>8}")
+    for k in args.acceptors:
+        with Server(args.threads, args.queue_size, [f"--acceptors={k}"]) as server:
+            rate, errors, latencies = hammer(server.port, args.duration, args.clients)
+        print(
+            f"{k:>9} {rate:>10.0f} {errors:>7}"
+            f" {percentile(latencies, 50) * 1e3:>8.3f} {percentile(latencies, 99) * 1e3:>8.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
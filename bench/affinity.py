@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Requests/sec with and without pinning threads to CPUs (--affinity).
+
+The pinned run puts worker i on CPU i (wrapping around) and the acceptor on
+the last CPU of the list, so compare against the unpinned run on a box with
+enough cores for the workers and the load generator.
+
+    python3 bench/affinity.py --threads 4 --cpus 0-3 --acceptor-cpus 4
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(__file__))
+from common import Server, hammer, percentile  # noqa: E402
+
+
+def main():
+    cpus = sorted(os.sched_getaffinity(0))
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--queue-size", type=int, default=256)
+    parser.add_argument("--cpus", default=f"{cpus[0]}-{cpus[-1]}", help="worker CPU list")
+    parser.add_argument("--acceptor-cpus", default=str(cpus[-1]), help="acceptor CPU list")
+    parser.add_argument("--clients", type=int, default=0, help="load processes (default: cpu count)")
+    parser.add_argument("--duration", type=float, default=3.0)
+    parser.add_argument("--path", default="/pageA.txt")
+    args = parser.parse_args()
+
+    runs = {
+        "unpinned": [],
+        "pinned": [f"--affinity={args.cpus}", f"--acceptor-affinity={args.acceptor_cpus}"],
+    }
+    print(f"{'mode':>9} {'req/s':>10} {'errors':>7} {'p50 ms':>8} {'p99 ms':>8}")
+    for mode, flags in runs.items():
+        with Server(args.threads, args.queue_size, flags) as server:
+            rate, errors, latencies = hammer(server.port, args.duration, args.clients, args.path)
+        print(
+            f"{mode:>9} {rate:>10.0f} {errors:>7}"
+            f" {percentile(latencies, 50) * 1e3:>8.3f} {percentile(latencies, 99) * 1e3:>8.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Helpers shared by the benchmarks in bench/.
+
+Run benchmarks from the directory containing the `server` binary, e.g.:
+
+    python3 bench/accept_rate.py
+"""
+
+import multiprocessing as mp
+import os
+import subprocess as sp
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import server_process  # noqa: E402
+from http_client import Client  # noqa: E402
+
+SERVER_BIN = os.environ.get("SERVER_BIN", "./server")
+
+
+class Server:
+    """Runs ./server for the duration of a `with` block."""
+
+    def __init__(self, threads: int, queue_size: int, args=(), port: int = 0):
+        # port 0: the server binds a free port and reports it when ready
+        self.port = port
+        self.cmd = [SERVER_BIN, str(port), str(threads), str(queue_size), *args]
+
+    def __enter__(self) -> "Server":
+        self.process, port = server_process.start(self.cmd, stdout=sp.DEVNULL, stderr=sp.DEVNULL)
+        if port is None:
+            self.process.kill()
+            self.process.wait()
+            raise RuntimeError(f"server did not start: {self.cmd}")
+        self.port = port
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.process.kill()
+        self.process.wait()
+
+
+def _hammer_worker(port: int, requests, offset: int, duration: float, ready, results) -> None:
+    client = Client("localhost", port)
+    errors = 0
+    samples = []
+    ready.wait()
+    end = time.monotonic() + duration
+    i = offset
+    while time.monotonic() < end:
+        method, path = requests[i % len(requests)]
+        i += 1
+        response = client.request(path, method)
+        if response.ok and response.status == 200:
+            samples.append((response.done, response.elapsed))
+        else:
+            errors += 1
+    results.put((errors, samples))
+
+
+def hammer_samples(port: int, requests, duration: float = 3.0, clients: int = 0):
+    """
+    Like hammer(), cycling through (method, path) `requests`; every process
+    starts at a different point of the cycle.
+
+    Returns (start, errors, samples): the time.monotonic() the load
+    started at, once every process was running, and one (time.monotonic()
+    at completion, latency in seconds) per successful request, in no
+    particular order.
+    """
+    clients = clients or os.cpu_count() or 4
+    results = mp.Queue()
+    barrier = mp.Barrier(clients + 1)
+    workers = [
+        mp.Process(target=_hammer_worker, args=(port, requests, i, duration, barrier, results))
+        for i in range(clients)
+    ]
+    for worker in workers:
+        worker.start()
+    barrier.wait()
+    start = time.monotonic()
+    errors = 0
+    samples = []
+    for _ in workers:
+        e, s = results.get()
+        errors += e
+        samples.extend(s)
+    for worker in workers:
+        worker.join()
+    return start, errors, samples
+
+
+def hammer(port: int, duration: float = 3.0, clients: int = 0, path: str = "/pageA.txt"):
+    """
+    Opens connections as fast as `clients` processes can, each doing one
+    request per connection, for `duration` seconds.
+
+    Returns (connections per second, errors, sorted latencies in seconds).
+    """
+    _, errors, samples = hammer_samples(port, [("GET", path)], duration, clients)
+    return len(samples) / duration, errors, sorted(latency for _, latency in samples)
+
+
+def percentile(sorted_values, p: float) -> float:
+    if not sorted_values:
+        return float("nan")
+    index = min(len(sorted_values) - 1, int(p / 100 * len(sorted_values)))
+    return sorted_values[index]
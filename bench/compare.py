@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Compares two bench/suite.py result files and fails on regressions.
+
+For every workload in both files, throughput (mean completions per window,
+higher is better) and p50/p99 latency (lower is better) are compared as the
+ratio current / baseline. A bootstrap over the stored samples gives a 95%
+confidence interval of that ratio; a metric regressed only if the whole
+interval is worse than the baseline by more than --threshold, so noise
+alone does not fail the comparison.
+
+    python3 bench/compare.py bench/baseline.json bench/results/<sha>-<time>.json
+
+Exits with status 1 if any metric regressed.
+"""
+
+import argparse
+import json
+import random
+import sys
+
+# name, samples key, statistic, higher is better
+METRICS = (
+    ("throughput", "throughput", "mean", True),
+    ("p50 latency", "latency_ms", 50, False),
+    ("p99 latency", "latency_ms", 99, False),
+)
+
+
+def statistic(values, kind) -> float:
+    if kind == "mean":
+        return sum(values) / len(values)
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(kind / 100 * len(ordered)))]
+
+
+def bootstrap_ratio(baseline, current, kind, resamples: int, rng: random.Random):
+    """95% confidence interval of statistic(current) / statistic(baseline)."""
+    ratios = []
+    for _ in range(resamples):
+        base = statistic(rng.choices(baseline, k=len(baseline)), kind)
+        cur = statistic(rng.choices(current, k=len(current)), kind)
+        ratios.append(cur / base if base else float("inf"))
+    ratios.sort()
+    return ratios[int(0.025 * resamples)], ratios[min(resamples - 1, int(0.975 * resamples))]
+
+
+def compare(baseline: dict, current: dict, threshold: float, resamples: int, seed: int) -> list:
+    """Returns (workload, metric, ratio, low, high, verdict) for every comparable metric."""
+    rng = random.Random(seed)
+    rows = []
+    for name, cur in current["workloads"].items():
+        base = baseline["workloads"].get(name)
+        if base is None:
+            continue
+        for metric, key, kind, higher_is_better in METRICS:
+            base_samples, cur_samples = base["samples"][key], cur["samples"][key]
+            if not base_samples or not cur_samples:
+                continue
+            base_value = statistic(base_samples, kind)
+            ratio = statistic(cur_samples, kind) / base_value if base_value else float("inf")
+            low, high = bootstrap_ratio(base_samples, cur_samples, kind, resamples, rng)
+            # "worse" and "better" must hold over the whole confidence interval
+            if higher_is_better:
+                worse, better = high < 1 - threshold, low > 1 + threshold
+            else:
+                worse, better = low > 1 + threshold, high < 1 - threshold
+            verdict = "REGRESSION" if worse else "improved" if better else "same"
+            rows.append((name, metric, ratio, low, high, verdict))
+    return rows
+
+
+def describe(result: dict) -> str:
+    dirty = "+dirty" if result.get("dirty") else ""
+    return f"{result['sha'][:12]}{dirty} ({result['timestamp']}, {result['host']['cpus']} cpus)"
+
+
+def report(baseline: dict, current: dict, threshold: float, resamples: int = 1000,
+           seed: int = 0) -> bool:
+    """Prints the comparison; returns True if nothing regressed."""
+    print(f"baseline: {describe(baseline)}")
+    print(f"current:  {describe(current)}")
+    if baseline["host"] != current["host"] or baseline["config"] != current["config"]:
+        print("warning: host or run configuration differs from the baseline")
+    rows = compare(baseline, current, threshold, resamples, seed)
+    print(f"{'workload':<16} {'metric':<12} {'ratio':>7} {'95% CI':>17}  verdict")
+    for name, metric, ratio, low, high, verdict in rows:
+        print(f"{name:<16} {metric:<12} {ratio:>7.3f} {f'[{low:.3f}, {high:.3f}]':>17}  {verdict}")
+    return not any(row[5] == "REGRESSION" for row in rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="relative change tolerated beyond the confidence interval")
+    parser.add_argument("--resamples", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    sys.exit(0 if report(baseline, current, args.threshold, args.resamples, args.seed) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Latency-vs-throughput curves under open-loop load.
+
+For every server configuration, requests are started on a fixed (or, with
+--poisson, exponentially spaced) timeline at each offered rate, whether or
+not earlier ones were answered, and latency is taken from the time each
+request was due. Closed-loop clients wait for the server and so never see
+the queueing delay of an overloaded one; this does.
+
+A configuration is THREADS:QUEUE_SIZE, optionally followed by a third
+field of server flags separated by spaces:
+
+    python3 bench/latency_curve.py --config 4:16 --config 8:64 --rates 200,400,800
+    python3 bench/latency_curve.py --config "4:16:--acceptors=2 --nodelay" --poisson
+
+The "late" column is the 99th percentile of how far behind schedule the
+generator itself sent requests; once it grows, the load generator, not the
+server, is the bottleneck and higher rates are not meaningful.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "tests"))
+from common import Server, percentile  # noqa: E402
+from loadgen import constant, poisson, run_schedule  # noqa: E402
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+def parse_config(text: str):
+    fields = text.split(":", 2)
+    if len(fields) < 2:
+        raise argparse.ArgumentTypeError(f"expected THREADS:QUEUE_SIZE[:FLAGS], got {text!r}")
+    flags = fields[2].split() if len(fields) == 3 else []
+    return int(fields[0]), int(fields[1]), flags
+
+
+def measure(port: int, rate: float, args):
+    """Runs one open-loop load; returns (throughput, errors, latencies, lateness)."""
+    if args.poisson:
+        schedule = poisson(rate, args.duration, args.path, args.seed)
+    else:
+        schedule = constant(rate, args.duration, args.path)
+    if not schedule:
+        # a low Poisson rate or a short duration can schedule nothing at all
+        return 0.0, 0, [], []
+    results = asyncio.run(run_schedule(port, schedule, timeout=args.timeout))
+    ok = [result for result in results if result.ok and result.status == 200]
+    span = max(result.done for result in results) - min(result.due for result in results)
+    return (
+        len(ok) / span if span > 0 else 0.0,
+        len(results) - len(ok),
+        sorted(result.latency for result in ok),
+        sorted(result.sent - result.due for result in results),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--config", type=parse_config, action="append",
+                        help="THREADS:QUEUE_SIZE[:FLAGS], repeatable (default 4:16)")
+    parser.add_argument("--rates", default="100,200,400,800",
+                        help="comma-separated offered loads in requests/sec")
+    parser.add_argument("--duration", type=float, default=3.0, help="seconds per rate")
+    parser.add_argument("--poisson", action="store_true", help="Poisson instead of constant arrivals")
+    parser.add_argument("--seed", type=int, default=None, help="seed of the Poisson arrivals")
+    parser.add_argument("--timeout", type=float, default=10.0, help="per-request timeout")
+    parser.add_argument("--path", default="/pageA.txt")
+    args = parser.parse_args()
+    rates = [float(rate) for rate in args.rates.split(",")]
+
+    for threads, queue_size, flags in args.config or [parse_config("4:16")]:
+        print(f"threads={threads} queue_size={queue_size} {' '.join(flags)}".rstrip())
+        print(f"{'offered':>8} {'req/s':>8} {'errors':>7}"
+              + "".join(f" {f'p{p:g} ms':>9}" for p in PERCENTILES) + f" {'late ms':>8}")
+        with Server(threads, queue_size, flags) as server:
+            for rate in rates:
+                throughput, errors, latencies, lateness = measure(server.port, rate, args)
+                print(f"{rate:>8.0f} {throughput:>8.0f} {errors:>7}"
+                      + "".join(f" {percentile(latencies, p) * 1e3:>9.3f}" for p in PERCENTILES)
+                      + f" {percentile(lateness, 99) * 1e3:>8.3f}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
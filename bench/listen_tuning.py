@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Connection-burst success rate and small-response latency per socket setting.
+
+For every setting the server is started with one worker and a small queue, so
+a burst of simultaneous connections has to wait in the listen backlog:
+
+  - burst: opens --burst connections at once and counts the ones that get a
+    200 response within --timeout seconds;
+  - latency: p50/p99 of back-to-back small static GETs.
+
+    python3 bench/listen_tuning.py --burst 2000
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(__file__))
+from common import Server, hammer, percentile  # noqa: E402
+
+SETTINGS = {
+    "default": [],
+    "backlog=16": ["--backlog=16"],
+    "backlog=4096": ["--backlog=4096"],
+    "nodelay": ["--nodelay"],
+    "defer-accept": ["--defer-accept=1"],
+    "fastopen": ["--fastopen=256"],
+    "sndbuf=256k": ["--sndbuf=262144"],
+}
+
+
+async def _one(port: int, timeout: float) -> bool:
+    try:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection("localhost", port), timeout
+        )
+        writer.write(b"GET /pageA.txt HTTP/1.0\r\n\r\n")
+        status = await asyncio.wait_for(reader.readline(), timeout)
+        await asyncio.wait_for(reader.read(), timeout)
+        writer.close()
+        return status.startswith(b"HTTP/1.0 200")
+    except (OSError, asyncio.TimeoutError):
+        return False
+
+
+async def _burst(port: int, count: int, timeout: float) -> int:
+    results = await asyncio.gather(*(_one(port, timeout) for _ in range(count)))
+    return sum(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--settings", nargs="+", default=list(SETTINGS), choices=list(SETTINGS))
+    parser.add_argument("--burst", type=int, default=1000)
+    parser.add_argument("--timeout", type=float, default=5.0)
+    parser.add_argument("--duration", type=float, default=2.0)
+    args = parser.parse_args()
+
+    print(f"{'setting':>14} {'burst ok':>9} {'conn/s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    for name in args.settings:
+        with Server(1, 8, SETTINGS[name]) as server:
+            ok = asyncio.run(_burst(server.port, args.burst, args.timeout))
+        with Server(4, 64, SETTINGS[name]) as server:
+            rate, _, latencies = hammer(server.port, args.duration)
+        print(
+            f"{name:>14} {ok / args.burst:>8.1%} {rate:>8.0f}"
+            f" {percentile(latencies, 50) * 1e3:>8.3f} {percentile(latencies, 99) * 1e3:>8.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
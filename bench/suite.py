@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite: runs a fixed set of workloads and records the results.
+
+    python3 bench/suite.py                          # all workloads, 5 s each
+    python3 bench/suite.py --workloads cgi mixed --duration 2
+    python3 bench/suite.py --baseline bench/baseline.json
+    python3 bench/suite.py --save-baseline
+
+Every workload starts its own server and is driven closed-loop by
+--clients processes (see common.hammer_samples). The results are written
+as JSON tagged with the git SHA, the host and the configuration, to
+bench/results/<sha>-<time>.json unless --output is given. Besides the
+summary, the file keeps throughput per --window and a seeded sample of
+latencies, which is what compare.py bootstraps its confidence intervals
+from. With --baseline the run is compared right away and the exit status
+is 1 if a workload regressed beyond --threshold.
+
+Workloads:
+
+    static_small    GET of a small file
+    static_large    GET of a 1 MiB file
+    cgi             GET of a CGI script that sleeps 5 ms
+    post_large_log  POST returning a log prefilled with PREFILL_LOG entries
+    mixed           static, CGI and POST requests in a 7:2:1 ratio
+    overload        CGI load from many clients on a single thread and a
+                    queue of two, so most connections wait in the queue
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import subprocess as sp
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+from common import Server, hammer_samples, percentile  # noqa: E402
+from compare import report  # noqa: E402
+from http_client import Client  # noqa: E402
+
+SCHEMA = 1
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+LARGE_FILE = "bench_large.bin"
+LARGE_SIZE = 1 << 20
+PREFILL_LOG = 5000
+MAX_LATENCY_SAMPLES = 5000
+
+# name -> (threads, queue_size, server args, clients or 0 for --clients, [(method, path)])
+WORKLOADS = {
+    "static_small": (4, 64, [], 0, [("GET", "/pageA.txt")]),
+    "static_large": (4, 64, [], 0, [("GET", f"/{LARGE_FILE}")]),
+    "cgi": (4, 64, [], 0, [("GET", "/output.cgi?0.005")]),
+    "post_large_log": (4, 64, [], 0, [("POST", "/")]),
+    "mixed": (4, 64, [], 0, [("GET", "/pageA.txt")] * 7
+              + [("GET", "/output.cgi?0.005")] * 2 + [("POST", "/")]),
+    "overload": (1, 2, [], 16, [("GET", "/output.cgi?0.002")]),
+}
+
+
+def git(*args) -> str:
+    try:
+        return sp.run(["git", *args], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, sp.CalledProcessError):
+        return ""
+
+
+def prefill_log(port: int, entries: int) -> None:
+    """Grows the server log by `entries` GETs, each of which adds a log line."""
+    client = Client("localhost", port)
+    for _ in range(entries):
+        client.request("/pageA.txt")
+
+
+def run_workload(name: str, args, rng: random.Random) -> dict:
+    threads, queue_size, server_args, clients, requests = WORKLOADS[name]
+    clients = clients or args.clients
+    with Server(threads, queue_size, server_args) as server:
+        if name == "post_large_log":
+            prefill_log(server.port, PREFILL_LOG)
+        start, errors, samples = hammer_samples(server.port, requests, args.duration, clients)
+
+    windows = [0] * max(1, int(args.duration / args.window))
+    for done, _ in samples:
+        index = int((done - start) / args.window)
+        if 0 <= index < len(windows):
+            windows[index] += 1
+    throughput = [count / args.window for count in windows]
+    latencies = sorted(latency * 1e3 for _, latency in samples)
+    kept = latencies
+    if len(kept) > MAX_LATENCY_SAMPLES:
+        kept = sorted(rng.sample(latencies, MAX_LATENCY_SAMPLES))
+    return {
+        "server": {"threads": threads, "queue_size": queue_size, "args": server_args,
+                   "clients": clients, "requests": [list(request) for request in requests]},
+        "summary": {
+            "throughput": len(samples) / args.duration,
+            "errors": errors,
+            **{f"p{p}_ms": percentile(latencies, p) for p in (50, 90, 99)},
+        },
+        "samples": {"throughput": throughput, "latency_ms": kept},
+    }
+
+
+def run(args) -> dict:
+    sha = git("rev-parse", "HEAD")
+    result = {
+        "schema": SCHEMA,
+        "sha": sha or "unknown",
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "host": {"platform": platform.platform(), "cpus": os.cpu_count(),
+                 "python": platform.python_version()},
+        "config": {"duration": args.duration, "clients": args.clients, "window": args.window,
+                   "seed": args.seed},
+        "workloads": {},
+    }
+    rng = random.Random(args.seed)
+    large = os.path.join("public", LARGE_FILE)
+    with open(large, "wb") as f:
+        f.write(os.urandom(LARGE_SIZE))
+    try:
+        for name in args.workloads:
+            workload = run_workload(name, args, rng)
+            result["workloads"][name] = workload
+            summary = workload["summary"]
+            print(f"{name:<16} {summary['throughput']:>9.0f} {summary['errors']:>7}"
+                  f" {summary['p50_ms']:>8.3f} {summary['p90_ms']:>8.3f} {summary['p99_ms']:>8.3f}")
+    finally:
+        os.remove(large)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workloads", nargs="+", choices=list(WORKLOADS), default=list(WORKLOADS))
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per workload")
+    parser.add_argument("--clients", type=int, default=os.cpu_count() or 4,
+                        help="load processes, unless the workload fixes it")
+    parser.add_argument("--window", type=float, default=0.25,
+                        help="seconds per throughput sample")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the latency sampling")
+    parser.add_argument("--output", help="result file (default bench/results/<sha>-<time>.json)")
+    parser.add_argument("--baseline", help="compare against this result file")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="relative regression tolerated, see compare.py")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help=f"also write the result to {os.path.relpath(BASELINE)}")
+    args = parser.parse_args()
+
+    print(f"{'workload':<16} {'req/s':>9} {'errors':>7} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8}")
+    result = run(args)
+
+    output = args.output
+    if output is None:
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        output = os.path.join(RESULTS_DIR, f"{result['sha'][:7]}-{stamp}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    for path in [output] + ([BASELINE] if args.save_baseline else []):
+        with open(path, "w") as f:
+            json.dump(result, f, indent=1)
+        print(f"wrote {path}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print()
+        if not report(baseline, result, args.threshold, seed=args.seed):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+#include "segel.h"
+#include <dirent.h>
+#include "request.h"
+#include "contentcache.h"
+#include "watch.h"
+
+static content_entry *g_buckets[CONTENT_BUCKETS];
+static pthread_rwlock_t g_locks[CONTENT_STRIPES];
+static int g_enabled = 0;
+static size_t g_file_max = CONTENT_FILE_MAX;
+static size_t g_bytes = 0; // size of all loaded entries, cached or not
+
+// FNV-1a over the filename with runs of '/' counted once, since requests
+// resolve to names like ./public//home.html
+static unsigned long hash_filename(const char *filename) {
+    unsigned long hash = 14695981039346656037UL;
+
+    for (const char *p = filename; *p; p++) {
+        if (*p == '/' && p[1] == '/') {
+            continue;
+        }
+        hash = (hash ^ (unsigned char)*p) * 1099511628211UL;
+    }
+    return hash;
+}
+
+// strcmp() == 0 with runs of '/' counted once
+static int same_filename(const char *a, const char *b) {
+    while (*a && *b) {
+        if (*a != *b) {
+            return 0;
+        }
+        if (*a == '/') {
+            while (a[1] == '/') {
+                a++;
+            }
+            while (b[1] == '/') {
+                b++;
+            }
+        }
+        a++;
+        b++;
+    }
+    return *a == *b;
+}
+
+static pthread_rwlock_t *stripe_lock(unsigned long hash) {
+    return &g_locks[(hash & (CONTENT_BUCKETS - 1)) % CONTENT_STRIPES];
+}
+
+static void entry_free(content_entry *entry) {
+    if (entry->mapped) {
+        Munmap(entry->data, entry->size);
+    } else {
+        free(entry->data);
+    }
+    __atomic_fetch_sub(&g_bytes, entry->size, __ATOMIC_RELAXED);
+    free(entry->header);
+    free(entry);
+}
+
+// Reads or maps a file. Returns NULL if it is empty, too large or unreadable.
+static content_entry *entry_load(const char *filename, unsigned long hash,
+                                 unsigned long epoch) {
+    struct stat sbuf;
+    size_t len = strlen(filename) + 1;
+
+    int fd = open(filename, O_RDONLY | O_CLOEXEC);
+    if (fd < 0) {
+        return NULL;
+    }
+    if (fstat(fd, &sbuf) < 0 || !S_ISREG(sbuf.st_mode) || sbuf.st_size == 0 ||
+        (size_t)sbuf.st_size > g_file_max) {
+        Close(fd);
+        return NULL;
+    }
+    if (__atomic_add_fetch(&g_bytes, sbuf.st_size, __ATOMIC_RELAXED)
+            > CONTENT_MAX_BYTES) {
+        __atomic_fetch_sub(&g_bytes, sbuf.st_size, __ATOMIC_RELAXED);
+        Close(fd);
+        return NULL;
+    }
+    content_entry *entry = Malloc(sizeof(content_entry) + len);
+    entry->hash = hash;
+    entry->epoch = epoch;
+    entry->size = sbuf.st_size;
+    memcpy(entry->filename, filename, len);
+    if (entry->size <= CONTENT_COPY_MAX) {
+        entry->mapped = 0;
+        entry->data = Malloc(entry->size);
+        if (rio_readn(fd, entry->data, entry->size) != (ssize_t)entry->size) {
+            entry->header = NULL;
+            Close(fd);
+            entry_free(entry);
+            return NULL;
+        }
+    } else {
+        entry->mapped = 1;
+        entry->data = mmap(NULL, entry->size, PROT_READ,
+                           MAP_PRIVATE | MAP_POPULATE, fd, 0);
+        if (entry->data == MAP_FAILED) {
+            __atomic_fetch_sub(&g_bytes, entry->size, __ATOMIC_RELAXED);
+            Close(fd);
+            free(entry);
+            return NULL;
+        }
+    }
+    Close(fd);
+    entry->header = Malloc(MAXBUF);
+    entry->header_len = requestStaticHeader(entry->header, filename, entry->size);
+    entry->header = realloc(entry->header, entry->header_len + 1);
+    return entry;
+}
+
+// Publishes a loaded entry unless the content changed since epoch or another
+// thread loaded the same file first. Returns the entry to use, with a
+// reference held for the caller.
+static content_entry *entry_insert(content_entry *entry) {
+    pthread_rwlock_t *lock = stripe_lock(entry->hash);
+    content_entry **link = &g_buckets[entry->hash & (CONTENT_BUCKETS - 1)];
+    content_entry *stale = NULL;
+
+    entry->refs = 1;
+    pthread_rwlock_wrlock(lock);
+    for (; *link; link = &(*link)->next) {
+        if ((*link)->hash == entry->hash &&
+            same_filename((*link)->filename, entry->filename)) {
+            break;
+        }
+    }
+    if (entry->epoch != watch_epoch()) {
+        // not cached; the caller's reference is the only one
+    } else if (*link && (*link)->epoch == entry->epoch) {
+        content_entry *existing = *link;
+        __atomic_fetch_add(&existing->refs, 1, __ATOMIC_RELAXED);
+        stale = entry;
+        entry = existing;
+    } else {
+        // the cache holds the second reference
+        entry->refs = 2;
+        if (*link) {
+            stale = *link;
+            entry->next = stale->next;
+        } else {
+            entry->next = NULL;
+        }
+        *link = entry;
+    }
+    pthread_rwlock_unlock(lock);
+    if (stale) {
+        contentcache_release(stale);
+    }
+    return entry;
+}
+
+// Runs from watch_handle(): stale entries are never hit again, drop them
+static void on_change(unsigned long epoch, void *arg) {
+    (void)epoch;
+    (void)arg;
+    contentcache_clear();
+}
+
+void contentcache_init(int enabled, size_t file_max) {
+    for (int i = 0; i < CONTENT_STRIPES; i++) {
+        pthread_rwlock_init(&g_locks[i], NULL);
+    }
+    if (file_max > 0) {
+        g_file_max = file_max;
+    }
+    if (enabled && !watch_enabled()) {
+        fprintf(stderr, "content cache disabled: ./public is not watched\n");
+        enabled = 0;
+    }
+    g_enabled = enabled;
+    if (g_enabled) {
+        watch_register(on_change, NULL);
+    }
+}
+
+void contentcache_destroy(void) {
+    g_enabled = 0;
+    contentcache_clear();
+    for (int i = 0; i < CONTENT_STRIPES; i++) {
+        pthread_rwlock_destroy(&g_locks[i]);
+    }
+}
+
+int contentcache_enabled(void) {
+    return g_enabled;
+}
+
+content_entry *contentcache_get(const char *filename) {
+    unsigned long hash = hash_filename(filename);
+    pthread_rwlock_t *lock = stripe_lock(hash);
+    content_entry *found = NULL;
+
+    if (!g_enabled) {
+        return NULL;
+    }
+    // read before the lookup: a change that races with a load invalidates it
+    unsigned long epoch = watch_epoch();
+    pthread_rwlock_rdlock(lock);
+    for (content_entry *entry = g_buckets[hash & (CONTENT_BUCKETS - 1)];
+         entry; entry = entry->next) {
+        if (entry->hash == hash && same_filename(entry->filename, filename)) {
+            if (entry->epoch == epoch) {
+                __atomic_fetch_add(&entry->refs, 1, __ATOMIC_RELAXED);
+                found = entry;
+            }
+            break;
+        }
+    }
+    pthread_rwlock_unlock(lock);
+    if (found) {
+        return found;
+    }
+    content_entry *entry = entry_load(filename, hash, epoch);
+    return entry ? entry_insert(entry) : NULL;
+}
+
+void contentcache_release(content_entry *entry) {
+    if (__atomic_sub_fetch(&entry->refs, 1, __ATOMIC_ACQ_REL) == 0) {
+        entry_free(entry);
+    }
+}
+
+int contentcache_preload(const char *root, size_t *bytes) {
+    char path[MAXLINE];
+    struct stat sbuf;
+    struct dirent *dirent;
+    int count = 0;
+
+    DIR *dir = opendir(root);
+    if (dir == NULL) {
+        return 0;
+    }
+    while ((dirent = readdir(dir)) != NULL) {
+        if (!strcmp(dirent->d_name, ".") || !strcmp(dirent->d_name, "..")) {
+            continue;
+        }
+        snprintf(path, sizeof(path), "%s/%s", root, dirent->d_name);
+        if (lstat(path, &sbuf) < 0) {
+            continue;
+        }
+        if (S_ISDIR(sbuf.st_mode)) {
+            count += contentcache_preload(path, bytes);
+        } else if (S_ISREG(sbuf.st_mode) && (S_IRUSR & sbuf.st_mode) &&
+                   !strstr(path, "cgi")) {
+            // requestParseURI serves anything named *cgi* as a program
+            content_entry *entry = contentcache_get(path);
+            if (entry) {
+                *bytes += entry->size;
+                count++;
+                contentcache_release(entry);
+            }
+        }
+    }
+    closedir(dir);
+    return count;
+}
+
+void contentcache_clear(void) {
+    for (int stripe = 0; stripe < CONTENT_STRIPES; stripe++) {
+        content_entry *dropped = NULL;
+
+        pthread_rwlock_wrlock(&g_locks[stripe]);
+        for (int i = stripe; i < CONTENT_BUCKETS; i += CONTENT_STRIPES) {
+            while (g_buckets[i]) {
+                content_entry *next = g_buckets[i]->next;
+                g_buckets[i]->next = dropped;
+                dropped = g_buckets[i];
+                g_buckets[i] = next;
+            }
+        }
+        pthread_rwlock_unlock(&g_locks[stripe]);
+        // munmap outside the lock
+        while (dropped) {
+            content_entry *next = dropped->next;
+            contentcache_release(dropped);
+            dropped = next;
+        }
+    }
+}
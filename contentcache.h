@@ -0,0 +1,65 @@
+#ifndef SERVER_CONTENTCACHE_H
+#define SERVER_CONTENTCACHE_H
+
+#include <stddef.h>
+
+//
+// Cache of static file contents, enabled with ./server ... --preload.
+//
+// Every entry holds a file's bytes together with its ready-made response
+// header (status line, Content-Length, MIME type), keyed by filename.
+// Small files are copied into memory; larger ones are mapped with
+// MAP_POPULATE so their pages are resident before the first request.
+// contentcache_preload fills the cache from the whole content root at
+// startup. Afterwards a static request that misses loads its file into the
+// cache.
+//
+// Entries are stamped with the watch epoch (see watch.h) and dropped after
+// any change under ./public. They are reference counted, so a worker still
+// writing an entry out keeps it alive after it left the cache.
+//
+
+#define CONTENT_BUCKETS  1024              // a power of two
+#define CONTENT_STRIPES  64                // rwlocks; bucket i uses lock i % STRIPES
+#define CONTENT_COPY_MAX (16 * 1024)       // smaller files are copied, larger mapped
+#define CONTENT_FILE_MAX (16 * 1024 * 1024) // default size limit of one cached file
+#define CONTENT_MAX_BYTES (256UL * 1024 * 1024) // all cached files together
+
+typedef struct content_entry {
+    struct content_entry *next;
+    unsigned long hash;
+    unsigned long epoch;
+    int refs;
+    int mapped;        // data is an mmap of the file rather than a copy
+    char *data;
+    size_t size;
+    char *header;      // response header up to the Stat-* lines
+    int header_len;
+    char filename[];
+} content_entry;
+
+// Sets the cache up; it stays off unless enabled and watch_init succeeded.
+// Files larger than file_max bytes are never cached.
+void contentcache_init(int enabled, size_t file_max);
+
+// Drops every entry
+void contentcache_destroy(void);
+
+// Returns 1 if the cache is on
+int contentcache_enabled(void);
+
+// Returns the cached entry of filename, loading it on a miss, or NULL if
+// the file cannot be cached. Release the entry once done with it.
+content_entry *contentcache_get(const char *filename);
+
+// Drops a reference taken by contentcache_get
+void contentcache_release(content_entry *entry);
+
+// Loads every static file below root.
+// Returns the number of files cached and adds their size to *bytes.
+int contentcache_preload(const char *root, size_t *bytes);
+
+// Drops every entry from the cache
+void contentcache_clear(void);
+
+#endif // SERVER_CONTENTCACHE_H
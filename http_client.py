@@ -0,0 +1,210 @@
+"""
+In-process HTTP client for the test scripts, in place of running ./client.
+
+Forking ./client for every request made process startup the dominant cost of
+the test scripts and blurred their timing. Client sends the same request
+over a plain socket from a pool of reusable threads and returns a Response
+holding the status, headers, body and timestamps:
+
+    responses = Client("localhost", port).run([("/pageA.txt", "GET"), ("/pageB.txt", "POST")])
+
+The server closes every connection once it answered the requests sent on
+it, so it is the threads, shared by all clients of the process, that are
+pooled rather than connections. Response.stdout renders a response the way
+./client prints it, which keeps the scripts' validation of that output.
+
+This is the only HTTP client in the repo: Client.fetch() is the asyncio
+form of Client.request() that tests/loadgen.py schedules, and the bench/
+load processes call Client.request() directly. Both read the response
+with parse_response(), into a Response or a subclass of it.
+"""
+
+import asyncio
+import socket
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterable, List, Optional, Tuple
+
+MAX_WORKERS = 128
+"""requests in flight at once, across all clients"""
+
+_pool: Optional[ThreadPoolExecutor] = None
+
+
+class Response:
+    """One request as seen by the client; `error` is set if it failed."""
+
+    __slots__ = ("path", "method", "status", "reason", "status_line", "header_lines",
+                 "headers", "body", "sent", "first_byte", "done", "error")
+
+    def __init__(self, path: str, method: str):
+        self.path = path
+        self.method = method
+        self.status = 0
+        self.reason = ""
+        self.status_line = ""
+        self.header_lines: List[str] = []
+        """header lines as received, without the status line"""
+        self.headers = {}
+        self.body = b""
+        self.sent = 0.0
+        """time.monotonic() when the connection was opened"""
+        self.first_byte = 0.0
+        """time.monotonic() when the first byte of the response arrived"""
+        self.done = 0.0
+        """time.monotonic() when the server closed the connection"""
+        self.error: Optional[BaseException] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    @property
+    def timed_out(self) -> bool:
+        return isinstance(self.error, socket.timeout)
+
+    @property
+    def elapsed(self) -> float:
+        return self.done - self.sent
+
+    @property
+    def returncode(self) -> int:
+        """The exit status ./client would have had"""
+        return 0 if self.ok else 1
+
+    @property
+    def stderr(self) -> str:
+        return "" if self.ok else f"Error: {self.error}\n"
+
+    @property
+    def stdout(self) -> str:
+        """The response as ./client prints it: one "Header: " line per header, then the body"""
+        if not self.status_line:
+            return ""
+        lines = [f"Header: {line}\n" for line in [self.status_line, *self.header_lines]]
+        return "".join(lines) + self.body.decode("utf-8", "replace")
+
+    def __repr__(self) -> str:
+        state = f"error={self.error!r}" if self.error else f"status={self.status}"
+        return f"<{type(self).__name__} {self.method} {self.path} {state}>"
+
+
+def parse_response(raw: bytes, response: Response) -> None:
+    head, _, response.body = raw.partition(b"\r\n\r\n")
+    lines = head.decode("iso-8859-1").split("\r\n")
+    parts = lines[0].split(" ", 2)
+    if len(parts) < 2 or not parts[0].startswith("HTTP/"):
+        raise ConnectionError(f"malformed status line: {lines[0]!r}")
+    response.status_line = lines[0]
+    response.status = int(parts[1])
+    response.reason = parts[2] if len(parts) > 2 else ""
+    response.header_lines = lines[1:]
+    for line in response.header_lines:
+        name, _, value = line.partition(":")
+        response.headers[name] = value.strip(" ")
+
+
+def encode_request(method: str, path: str, host: str, body: bytes = b"") -> bytes:
+    """The request as ./client sends it, with a Content-Length if there is a body"""
+    head = f"{method} {path} HTTP/1.1\r\nHost: {host}\r\n"
+    if body:
+        head += f"Content-Length: {len(body)}\r\n"
+    return head.encode() + b"\r\n" + body
+
+
+def _finish(chunks: List[bytes], response: Response) -> None:
+    # an empty response means the server dropped the connection
+    if not chunks:
+        raise ConnectionError("connection closed without a response")
+    parse_response(b"".join(chunks), response)
+
+
+def pool() -> ThreadPoolExecutor:
+    """The threads sending requests for Client.submit and Client.run"""
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="http-client")
+    return _pool
+
+
+class Client:
+    """Sends requests to one server."""
+
+    def __init__(self, host: str, port, timeout: Optional[float] = 10.0):
+        self.host = host
+        self.port = int(port)
+        self.timeout = timeout
+        """seconds to connect and to wait for every read, None to wait forever"""
+        self.address = socket.getaddrinfo(host, self.port, socket.AF_INET, socket.SOCK_STREAM)[0][4]
+
+    def request(self, path: str, method: str = "GET", body: bytes = b"",
+                response: Optional[Response] = None) -> Response:
+        """
+        One request on a fresh connection, read until the server closes it.
+
+        Errors are recorded in Response.error, not raised. The result is
+        filled into `response` if given, so callers can pass a subclass.
+        """
+        response = response or Response(path, method)
+        request = encode_request(method, path, self.host, body)
+        chunks = []
+        response.sent = time.monotonic()
+        try:
+            with socket.create_connection(self.address, timeout=self.timeout) as sock:
+                sock.sendall(request)
+                while chunk := sock.recv(65536):
+                    if not chunks:
+                        response.first_byte = time.monotonic()
+                    chunks.append(chunk)
+            _finish(chunks, response)
+        except (OSError, ValueError) as error:
+            response.error = error
+        finally:
+            response.done = time.monotonic()
+        return response
+
+    async def fetch(self, path: str, method: str = "GET", body: bytes = b"",
+                    response: Optional[Response] = None) -> Response:
+        """request() on the running event loop; the timeout covers the whole exchange."""
+        response = response or Response(path, method)
+        request = encode_request(method, path, self.host, body)
+        chunks = []
+
+        async def exchange() -> None:
+            reader, writer = await asyncio.open_connection(*self.address)
+            try:
+                writer.write(request)
+                await writer.drain()
+                while chunk := await reader.read(65536):
+                    if not chunks:
+                        response.first_byte = time.monotonic()
+                    chunks.append(chunk)
+            finally:
+                writer.close()
+
+        response.sent = time.monotonic()
+        try:
+            await asyncio.wait_for(exchange(), self.timeout)
+            _finish(chunks, response)
+        except (OSError, asyncio.TimeoutError, ValueError) as error:
+            response.error = error
+        finally:
+            response.done = time.monotonic()
+        return response
+
+    def submit(self, path: str, method: str = "GET", at: Optional[float] = None) -> "Future[Response]":
+        """Sends a request on a pool thread, at time.monotonic() == `at` (now if None)."""
+
+        def run() -> Response:
+            if at is not None:
+                time.sleep(max(0.0, at - time.monotonic()))
+            return self.request(path, method)
+
+        return pool().submit(run)
+
+    def run(self, reqs: Iterable[Tuple[str, str]], delay: float = 0.0) -> List[Response]:
+        """Sends (path, method) requests concurrently, `delay` seconds apart; returns them in order."""
+        start = time.monotonic()
+        futures = [self.submit(path, method, start + i * delay if delay else None)
+                   for i, (path, method) in enumerate(reqs)]
+        return [future.result() for future in futures]
@@ -10,10 +10,14 @@ Tests specific requirements from the assignment PDF:
 6. Proper error handling and HTTP responses
 """
 
-import os, sys, time, signal, socket, random, subprocess, threading, re
+import os, sys, signal, subprocess, threading, re
 from collections import namedtuple, Counter
 import json
 
+import response_stats
+import server_process
+from http_client import Client
+
 # Colors for output
 try:
     from colorama import init, Fore, Style
@@ -27,49 +31,28 @@ except ImportError:
 class HW3RequirementTester:
     def __init__(self):
         self.server_bin = "./server"
-        self.client_bin = "./client"
-        self.base_port = 9000
-        self.used_ports = set()
 
-        if not (os.path.isfile(self.server_bin) and os.path.isfile(self.client_bin)):
-            sys.exit(f"{RED}Error: {self.server_bin} or {self.client_bin} not found{RST}")
+        if not os.path.isfile(self.server_bin):
+            sys.exit(f"{RED}Error: {self.server_bin} not found{RST}")
 
     def next_port(self):
-        while True:
-            p = random.randint(self.base_port, 60000)
-            if p not in self.used_ports:
-                self.used_ports.add(p)
-                return str(p)
-
-    def wait_for_port(self, port, timeout=3.0):
-        end_time = time.time() + timeout
-        while time.time() < end_time:
-            try:
-                with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-                    sock.settimeout(1.0)
-                    result = sock.connect_ex(('localhost', int(port)))
-                    if result == 0:
-                        return True
-            except Exception:
-                pass
-            time.sleep(0.1)
-        return False
+        """A free port, already bound for the next start_server"""
+        return str(server_process.reserve_port())
 
     def start_server(self, port, pool, queue):
-        proc = subprocess.Popen(
+        proc, ready_port = server_process.start(
             [self.server_bin, port, str(pool), str(queue)],
+            timeout=3.0,
+            port=int(port),
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             preexec_fn=os.setsid
         )
-        time.sleep(0.5)
-        proc.poll()
-        if proc.returncode is not None:
+        if proc.poll() is not None:
             err = proc.stderr.read().decode().strip()
             return proc, False, err
 
-        ready = self.wait_for_port(port, 3.0)
-        return proc, ready, ""
+        return proc, ready_port is not None, ""
 
     def kill_server(self, proc):
         try:
@@ -83,91 +66,39 @@ class HW3RequirementTester:
                 pass
 
     def run_client(self, host, port, file_path, method, timeout=10):
-        try:
-            result = subprocess.run(
-                [self.client_bin, host, port, file_path, method],
-                capture_output=True, text=True, timeout=timeout
-            )
-            return result
-        except subprocess.TimeoutExpired:
-            return None
-        except Exception:
-            return None
+        result = Client(host, port, timeout).request(file_path, method)
+        return None if result.timed_out else result
 
     def parse_all_statistics(self, output):
         """Parse all required statistics according to HW3 spec"""
-        stats = {}
-        lines = output.splitlines()
-
-        for line in lines:
-            # Request timing statistics
-            if "Stat-Req-Arrival::" in line:
-                match = re.search(r'Stat-Req-Arrival:: ([\d.]+)', line)
-                if match:
-                    stats['req_arrival'] = float(match.group(1))
-            elif "Stat-Req-Dispatch::" in line:
-                match = re.search(r'Stat-Req-Dispatch:: ([\d.]+)', line)
-                if match:
-                    stats['req_dispatch'] = float(match.group(1))
-
-            # Thread statistics
-            elif "Stat-Thread-Id::" in line:
-                match = re.search(r'Stat-Thread-Id:: (\d+)', line)
-                if match:
-                    stats['thread_id'] = int(match.group(1))
-            elif "Stat-Thread-Count::" in line:
-                match = re.search(r'Stat-Thread-Count:: (\d+)', line)
-                if match:
-                    stats['thread_count'] = int(match.group(1))
-            elif "Stat-Thread-Static::" in line:
-                match = re.search(r'Stat-Thread-Static:: (\d+)', line)
-                if match:
-                    stats['thread_static'] = int(match.group(1))
-            elif "Stat-Thread-Dynamic::" in line:
-                match = re.search(r'Stat-Thread-Dynamic:: (\d+)', line)
-                if match:
-                    stats['thread_dynamic'] = int(match.group(1))
-            elif "Stat-Thread-Post::" in line:
-                match = re.search(r'Stat-Thread-Post:: (\d+)', line)
-                if match:
-                    stats['thread_post'] = int(match.group(1))
-
+        stats = response_stats.parse(output).as_dict()
+        for name in ("arrival", "dispatch"):
+            if name in stats:
+                stats[f"req_{name}"] = stats.pop(name)
         return stats
 
     def find_http_status(self, output):
         """Find HTTP status in client output"""
-        lines = output.splitlines()
-        for line in lines:
-            if "HTTP/" in line:
-                if "200" in line:
-                    return "200"
-                elif "404" in line:
-                    return "404"
-                elif "403" in line:
-                    return "403"
-                elif "501" in line:
-                    return "501"
-                elif "400" in line or "405" in line:
-                    return "error"
-        return None
+        return response_stats.parse(output).status_name
 
     def test_command_line_arguments(self):
         """Test requirement: Server accepts [port] [threads] [queue_size]"""
         print(f"{YEL}=== Testing Command Line Arguments ==={RST}")
 
         test_cases = [
-            (8080, 1, 1, True, "Minimum configuration"),
-            (8081, 5, 10, True, "Normal configuration"),
-            (8082, 20, 50, True, "Large configuration"),
-            (8083, 0, 5, False, "Invalid threads (0)"),
-            (8084, 5, 0, False, "Invalid queue size (0)"),
+            (1, 1, True, "Minimum configuration"),
+            (5, 10, True, "Normal configuration"),
+            (20, 50, True, "Large configuration"),
+            (0, 5, False, "Invalid threads (0)"),
+            (5, 0, False, "Invalid queue size (0)"),
         ]
 
         passed = 0
-        for port, threads, queue, should_work, description in test_cases:
+        for threads, queue, should_work, description in test_cases:
+            port = self.next_port()
             print(f"{DIM}  Testing {description}: port={port}, threads={threads}, queue={queue}{RST}")
 
-            proc, ready, error = self.start_server(str(port), threads, queue)
+            proc, ready, error = self.start_server(port, threads, queue)
 
             if should_work:
                 if ready:
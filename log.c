@@ -2,6 +2,7 @@
 #include <string.h>
 #include "log.h"
 #include "segel.h"
+#include "arena.h"
 
 // Creates a new server log instance (stub)
 server_log create_log() {
@@ -73,19 +74,36 @@ static void log_end_write(server_log log) {
     pthread_mutex_unlock(&log->lock);
 }
 
-// Returns dummy log content as string (stub)
-int get_log(server_log log, char **dst) {
+// Copies the log into memory from alloc; the size is only stable under the lock
+static int copy_log(server_log log, char **dst, void *(*alloc)(size_t)) {
     if (!log || !dst) {
         return 0;
     }
     log_start_read(log);
-    *dst = Malloc(log->size + 1);
+    *dst = alloc(log->size + 1);
     memcpy(*dst, log->buffer, log->size + 1);
     int result_size = log->size;
     log_end_read(log);
     return result_size;
 }
 
+// Returns dummy log content as string (stub)
+int get_log(server_log log, char **dst) {
+    return copy_log(log, dst, Malloc);
+}
+
+// Returns the log content as a string allocated from the thread's arena
+int get_log_arena(server_log log, char **dst) {
+    return copy_log(log, dst, arena_alloc);
+}
+
+// Returns the log size; a relaxed read, so it never waits behind a writer
+int get_log_size(server_log log) {
+    if (!log) {
+        return 0;
+    }
+    return __atomic_load_n(&log->size, __ATOMIC_RELAXED);
+}
 
 // Appends a new entry to the log (no-op stub)
 void add_to_log(server_log log, const char *data, int data_len) {
@@ -107,7 +125,7 @@ void add_to_log(server_log log, const char *data, int data_len) {
     }
 
     memcpy(log->buffer + log->size, data, data_len);
-    log->size += data_len;
+    __atomic_store_n(&log->size, log->size + data_len, __ATOMIC_RELAXED);
     log->buffer[log->size] = '\0';
 
     log_end_write(log);
@@ -115,3 +133,13 @@ void add_to_log(server_log log, const char *data, int data_len) {
 
 }
 
+// Empties the log, keeping its buffer
+void clear_log(server_log log) {
+    if (!log) {
+        return;
+    }
+    log_start_write(log);
+    __atomic_store_n(&log->size, 0, __ATOMIC_RELAXED);
+    log->buffer[0] = '\0';
+    log_end_write(log);
+}
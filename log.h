@@ -37,7 +37,17 @@ void destroy_log(server_log log);
 // NOTE: caller is responsible for freeing dst
 int get_log(server_log log, char **dst);
 
+// Same as get_log, but the copy comes from the calling thread's arena and is
+// released by the next arena_reset (see arena.h)
+int get_log_arena(server_log log, char **dst);
+
+// Returns the current size of the log in bytes, without taking the lock
+int get_log_size(server_log log);
+
 // Appends a new entry to the log
 void add_to_log(server_log log, const char *data, int data_len);
 
+// Empties the log
+void clear_log(server_log log);
+
 #endif // SERVER_LOG_H
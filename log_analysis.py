@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Vectorized analysis of the server log that a POST returns.
+
+The log is one block of Stat-* lines per request (see append_stats in
+request.c). parse_log() pulls all of them out with one compiled pattern
+over the raw bytes. findall() still builds a tuple of fields per entry;
+after that the loops run over the seven columns only, each converted with
+one NumPy cast into a structured array of LOG_DTYPE. From there,
+analyze() computes per-thread throughput, queue-wait percentiles and load
+imbalance with array operations only.
+
+    python3 log_analysis.py --port 8080 --threads 8     # POST to a running server
+    python3 log_analysis.py log_dump.txt --threads 8    # a saved POST body
+    curl -s -X POST localhost:8080/ | python3 log_analysis.py -
+
+Stat-Req-Dispatch is the time a request waited in the queue, so it is the
+queue wait directly; Stat-Req-Arrival is absolute, and the span of the log
+runs from the first arrival to the last dispatch. Throughput and imbalance
+count only the requests still in the log.
+
+Needs NumPy, which tests/requirements.txt lists (tests/test_log_analysis.py
+covers this module).
+"""
+
+import argparse
+import re
+import sys
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from http_client import Client
+
+LOG_DTYPE = np.dtype([
+    ("arrival", np.float64),
+    ("dispatch", np.float64),
+    ("thread_id", np.int32),
+    ("thread_count", np.int64),
+    ("thread_static", np.int64),
+    ("thread_dynamic", np.int64),
+    ("thread_post", np.int64),
+])
+
+_ENTRY = re.compile(
+    rb"Stat-Req-Arrival:: ([\d.]+)\r?\n"
+    rb"Stat-Req-Dispatch:: ([\d.]+)\r?\n"
+    rb"Stat-Thread-Id:: (\d+)\r?\n"
+    rb"Stat-Thread-Count:: (\d+)\r?\n"
+    rb"Stat-Thread-Static:: (\d+)\r?\n"
+    rb"Stat-Thread-Dynamic:: (\d+)\r?\n"
+    rb"Stat-Thread-Post:: (\d+)"
+)
+
+FIELD_DTYPE = "S24"
+"""wide enough for "%ld.%06ld" of a time and any %d counter"""
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+def parse_log(body: bytes) -> np.ndarray:
+    """All complete entries of a log dump, in log order, as a LOG_DTYPE array."""
+    # a fixed width is much faster than letting NumPy size the strings itself
+    fields = np.array(_ENTRY.findall(body), dtype=FIELD_DTYPE).reshape(-1, len(LOG_DTYPE.names))
+    entries = np.empty(len(fields), dtype=LOG_DTYPE)
+    for column, name in enumerate(LOG_DTYPE.names):
+        entries[name] = fields[:, column].astype(LOG_DTYPE[name])
+    return entries
+
+
+@dataclass
+class LogAnalysis:
+    """What analyze() derives from a log; per-thread arrays are indexed by thread id - 1."""
+
+    entries: int
+    span: float
+    """seconds from the first arrival to the last dispatch"""
+    throughput: float
+    """logged requests per second over the span"""
+    thread_requests: np.ndarray
+    thread_throughput: np.ndarray
+    queue_wait: dict
+    """percentile -> seconds waited in the queue"""
+    imbalance: float
+    """busiest thread's share over the mean share, 1.0 when perfectly even"""
+    cv: float
+    """coefficient of variation of the per-thread request counts"""
+
+
+def analyze(entries: np.ndarray, threads: Optional[int] = None) -> LogAnalysis:
+    """
+    Analyzes parse_log() output. Threads are numbered from 1; pass the
+    server's thread count so that threads which served nothing count
+    towards the imbalance.
+    """
+    if not len(entries):
+        raise ValueError("the log has no complete entries")
+    ids = entries["thread_id"]
+    threads = max(threads or 0, int(ids.max()))
+    thread_requests = np.bincount(ids, minlength=threads + 1)[1:]
+    span = float((entries["arrival"] + entries["dispatch"]).max() - entries["arrival"].min())
+    rate = 1.0 / span if span > 0 else 0.0
+    mean = thread_requests.mean()
+    return LogAnalysis(
+        entries=len(entries),
+        span=span,
+        throughput=len(entries) * rate,
+        thread_requests=thread_requests,
+        thread_throughput=thread_requests * rate,
+        queue_wait=dict(zip(PERCENTILES, np.percentile(entries["dispatch"], PERCENTILES))),
+        imbalance=float(thread_requests.max() / mean),
+        cv=float(thread_requests.std() / mean),
+    )
+
+
+def fetch_log(port: int, host: str = "localhost") -> bytes:
+    """The log of a running server, as its answer to a POST."""
+    response = Client(host, port, timeout=60.0).request("/", "POST")
+    if not response.ok:
+        raise response.error
+    return response.body
+
+
+def report(analysis: LogAnalysis) -> None:
+    print(f"entries: {analysis.entries}  span: {analysis.span:.3f} s"
+          f"  throughput: {analysis.throughput:.1f} req/s")
+    print("queue wait: " + "  ".join(f"p{p:g} {seconds * 1e3:.3f} ms"
+                                     for p, seconds in analysis.queue_wait.items()))
+    print(f"imbalance (max/mean): {analysis.imbalance:.3f}  cv: {analysis.cv:.3f}")
+    print(f"{'thread':>6} {'requests':>9} {'req/s':>9}")
+    for thread, (requests, rate) in enumerate(
+            zip(analysis.thread_requests, analysis.thread_throughput), start=1):
+        print(f"{thread:>6} {requests:>9} {rate:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("dump", nargs="?", help="file holding a POST body, - for stdin")
+    parser.add_argument("--port", type=int, help="POST to the server on this port instead")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--threads", type=int, help="the server's thread count")
+    args = parser.parse_args()
+
+    if args.port is not None:
+        body = fetch_log(args.port, args.host)
+    elif args.dump == "-":
+        body = sys.stdin.buffer.read()
+    elif args.dump:
+        with open(args.dump, "rb") as f:
+            body = f.read()
+    else:
+        parser.error("give a dump file or --port")
+    try:
+        report(analyze(parse_log(body), args.threads))
+    except ValueError as error:
+        sys.exit(f"Error: {error}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+#include "segel.h"
+#include "metrics.h"
+#include "stats.h"
+#include "arena.h"
+
+typedef struct __attribute__((aligned(CACHE_LINE))) {
+    unsigned int generation;                // see stats_reset
+    unsigned long dropped;                  // connections closed without a request
+    unsigned long path_hits;                // path cache lookups
+    unsigned long path_misses;
+    unsigned long queue_wait[HIST_BUCKETS]; // microseconds
+    unsigned long service[HIST_BUCKETS];    // microseconds
+    unsigned long queue_wait_sum;
+    unsigned long service_sum;
+} metrics_slot;
+
+static metrics_slot *g_slots = NULL;
+static int g_num_threads = 0;
+static server_log g_metrics_log = NULL;
+static queue_probe g_probe = NULL;
+
+// Only the owning worker writes a slot, so a relaxed load+store is enough
+#define SLOT_ADD(field, value) \
+    __atomic_store_n(&(field), __atomic_load_n(&(field), __ATOMIC_RELAXED) + (value), \
+                     __ATOMIC_RELAXED)
+
+#define LOAD(field) __atomic_load_n(&(field), __ATOMIC_RELAXED)
+
+// Zeroes a slot last written before a stats_reset; only its owner calls this
+static metrics_slot *slot_get(int thread_id) {
+    metrics_slot *slot = &g_slots[thread_id];
+    unsigned int generation = stats_generation();
+
+    if (slot->generation != generation) {
+        memset(slot, 0, sizeof(*slot));
+        __atomic_store_n(&slot->generation, generation, __ATOMIC_RELEASE);
+    }
+    return slot;
+}
+
+void metrics_init(int num_threads, server_log log, queue_probe probe) {
+    size_t size = sizeof(metrics_slot) * (num_threads + 1);
+    int rc = posix_memalign((void **)&g_slots, CACHE_LINE, size);
+    if (rc != 0) {
+        posix_error(rc, "posix_memalign error");
+    }
+    memset(g_slots, 0, size);
+    g_num_threads = num_threads;
+    g_metrics_log = log;
+    g_probe = probe;
+}
+
+void metrics_destroy(void) {
+    free(g_slots);
+    g_slots = NULL;
+    g_num_threads = 0;
+}
+
+//
+// Maps a value to its histogram bucket
+//
+static int hist_index(unsigned long value) {
+    if (value < HIST_SUB) {
+        return value;
+    }
+    int msb = 63 - __builtin_clzl(value);
+    int shift = msb - HIST_SUB_BITS;
+    int index = (shift + 1) * HIST_SUB + (int)((value >> shift) - HIST_SUB);
+    return index < HIST_BUCKETS ? index : HIST_BUCKETS - 1;
+}
+
+//
+// Returns the largest value that falls into a histogram bucket
+//
+static unsigned long hist_upper(int index) {
+    if (index < HIST_SUB) {
+        return index;
+    }
+    int shift = index / HIST_SUB - 1;
+    unsigned long lower = (unsigned long)(HIST_SUB + index % HIST_SUB) << shift;
+    return lower + (1UL << shift) - 1;
+}
+
+void metrics_record(int thread_id, long queue_wait_us, long service_us) {
+    metrics_slot *slot = slot_get(thread_id);
+    if (queue_wait_us < 0) {
+        queue_wait_us = 0;
+    }
+    if (service_us < 0) {
+        service_us = 0;
+    }
+    SLOT_ADD(slot->queue_wait[hist_index(queue_wait_us)], 1);
+    SLOT_ADD(slot->service[hist_index(service_us)], 1);
+    SLOT_ADD(slot->queue_wait_sum, queue_wait_us);
+    SLOT_ADD(slot->service_sum, service_us);
+}
+
+void metrics_record_drop(int thread_id) {
+    SLOT_ADD(slot_get(thread_id)->dropped, 1);
+}
+
+void metrics_record_path_lookup(int thread_id, int hit) {
+    metrics_slot *slot = slot_get(thread_id);
+
+    if (hit) {
+        SLOT_ADD(slot->path_hits, 1);
+    } else {
+        SLOT_ADD(slot->path_misses, 1);
+    }
+}
+
+static void render_histogram(FILE *out, const char *name, const char *help,
+                             unsigned long *buckets, unsigned long sum) {
+    unsigned long cumulative = 0;
+    int last = -1;
+
+    for (int i = 0; i < HIST_BUCKETS; i++) {
+        if (buckets[i]) {
+            last = i;
+        }
+    }
+    fprintf(out, "# HELP %s %s\n# TYPE %s histogram\n", name, help, name);
+    for (int i = 0; i <= last; i++) {
+        cumulative += buckets[i];
+        fprintf(out, "%s_bucket{le=\"%.6f\"} %lu\n", name,
+                hist_upper(i) / 1e6, cumulative);
+    }
+    fprintf(out, "%s_bucket{le=\"+Inf\"} %lu\n", name, cumulative);
+    fprintf(out, "%s_sum %.6f\n", name, sum / 1e6);
+    fprintf(out, "%s_count %lu\n", name, cumulative);
+}
+
+int metrics_render(char **dst) {
+    unsigned long total = 0, stat = 0, dynm = 0, post = 0, dropped = 0;
+    unsigned long path_hits = 0, path_misses = 0;
+    unsigned long queue_wait[HIST_BUCKETS] = {0}, service[HIST_BUCKETS] = {0};
+    unsigned long queue_wait_sum = 0, service_sum = 0, arena_overflows = 0;
+    int size = 0, pending = 0, capacity = 0;
+    size_t len = 0;
+
+    for (int t = 1; t <= g_num_threads; t++) {
+        metrics_slot *slot = &g_slots[t];
+        struct Threads_stats stats;
+        stats_snapshot(t, &stats);
+        total += stats.total_req;
+        stat += stats.stat_req;
+        dynm += stats.dynm_req;
+        post += stats.post_req;
+        if (__atomic_load_n(&slot->generation, __ATOMIC_ACQUIRE) != stats_generation()) {
+            continue; // not written since a reset
+        }
+        dropped += LOAD(slot->dropped);
+        path_hits += LOAD(slot->path_hits);
+        path_misses += LOAD(slot->path_misses);
+        for (int i = 0; i < HIST_BUCKETS; i++) {
+            queue_wait[i] += LOAD(slot->queue_wait[i]);
+            service[i] += LOAD(slot->service[i]);
+        }
+        queue_wait_sum += LOAD(slot->queue_wait_sum);
+        service_sum += LOAD(slot->service_sum);
+    }
+    if (g_probe) {
+        g_probe(&size, &pending, &capacity);
+    }
+
+    FILE *out = open_memstream(dst, &len);
+    if (out == NULL) {
+        unix_error("open_memstream error");
+    }
+    fprintf(out, "# HELP oshw3_requests_total Requests handled by all worker threads.\n"
+                 "# TYPE oshw3_requests_total counter\n"
+                 "oshw3_requests_total %lu\n", total);
+    fprintf(out, "# HELP oshw3_static_requests_total Static GET requests served.\n"
+                 "# TYPE oshw3_static_requests_total counter\n"
+                 "oshw3_static_requests_total %lu\n", stat);
+    fprintf(out, "# HELP oshw3_dynamic_requests_total Dynamic (CGI) GET requests served.\n"
+                 "# TYPE oshw3_dynamic_requests_total counter\n"
+                 "oshw3_dynamic_requests_total %lu\n", dynm);
+    fprintf(out, "# HELP oshw3_post_requests_total POST requests served.\n"
+                 "# TYPE oshw3_post_requests_total counter\n"
+                 "oshw3_post_requests_total %lu\n", post);
+    fprintf(out, "# HELP oshw3_connections_dropped_total Connections closed before a request was read.\n"
+                 "# TYPE oshw3_connections_dropped_total counter\n"
+                 "oshw3_connections_dropped_total %lu\n", dropped);
+    fprintf(out, "# HELP oshw3_path_cache_hits_total GET URIs resolved from the path cache.\n"
+                 "# TYPE oshw3_path_cache_hits_total counter\n"
+                 "oshw3_path_cache_hits_total %lu\n", path_hits);
+    fprintf(out, "# HELP oshw3_path_cache_misses_total GET URIs resolved with stat().\n"
+                 "# TYPE oshw3_path_cache_misses_total counter\n"
+                 "oshw3_path_cache_misses_total %lu\n", path_misses);
+    fprintf(out, "# HELP oshw3_queue_size Connections queued or being handled.\n"
+                 "# TYPE oshw3_queue_size gauge\n"
+                 "oshw3_queue_size %d\n", size);
+    fprintf(out, "# HELP oshw3_queue_pending Connections waiting for a worker (dequeueing_size).\n"
+                 "# TYPE oshw3_queue_pending gauge\n"
+                 "oshw3_queue_pending %d\n", pending);
+    fprintf(out, "# HELP oshw3_queue_capacity Maximum number of queued connections.\n"
+                 "# TYPE oshw3_queue_capacity gauge\n"
+                 "oshw3_queue_capacity %d\n", capacity);
+    fprintf(out, "# HELP oshw3_log_bytes Size of the server log.\n"
+                 "# TYPE oshw3_log_bytes gauge\n"
+                 "oshw3_log_bytes %d\n", get_log_size(g_metrics_log));
+    fprintf(out, "# HELP oshw3_arena_high_water_bytes Most arena memory one request used.\n"
+                 "# TYPE oshw3_arena_high_water_bytes gauge\n");
+    for (int t = 1; t <= g_num_threads; t++) {
+        unsigned long high_water, overflows;
+        arena_snapshot(t, &high_water, &overflows);
+        arena_overflows += overflows;
+        fprintf(out, "oshw3_arena_high_water_bytes{thread=\"%d\"} %lu\n",
+                t, high_water);
+    }
+    fprintf(out, "# HELP oshw3_arena_overflows_total Request allocations that did not fit in the arena.\n"
+                 "# TYPE oshw3_arena_overflows_total counter\n"
+                 "oshw3_arena_overflows_total %lu\n", arena_overflows);
+    render_histogram(out, "oshw3_queue_wait_seconds",
+                     "Time between arrival and dispatch.",
+                     queue_wait, queue_wait_sum);
+    render_histogram(out, "oshw3_service_seconds",
+                     "Time spent handling a connection.",
+                     service, service_sum);
+    fclose(out);
+    return len;
+}
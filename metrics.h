@@ -0,0 +1,45 @@
+#ifndef SERVER_METRICS_H
+#define SERVER_METRICS_H
+
+#include "request.h"
+
+//
+// Server-wide metrics, exported in Prometheus text format on GET /__metrics.
+//
+// Every worker owns one cache-line-aligned slot and is the only thread that
+// writes to it, so recording is a relaxed atomic store with no locking. The
+// exporter reads all slots with relaxed atomic loads and sums them, together
+// with snapshots of the per-thread request counters (see stats.h).
+// Slots follow stats_reset() the same way the request counters do.
+//
+
+// Histogram layout (HDR-style): values below HIST_SUB are exact, above that
+// every power of two is split into HIST_SUB linear sub-buckets.
+#define HIST_SUB_BITS 2
+#define HIST_SUB      (1 << HIST_SUB_BITS)
+#define HIST_BUCKETS  (HIST_SUB * 40)
+
+// Reports the queue occupancy (size), requests not yet picked up by a worker
+// (pending) and the queue capacity
+typedef void (*queue_probe)(int *size, int *pending, int *capacity);
+
+// Allocates one metrics slot per worker thread (ids 1..num_threads)
+void metrics_init(int num_threads, server_log log, queue_probe probe);
+
+// Frees the metrics slots
+void metrics_destroy(void);
+
+// Records one handled connection: time spent in the queue and in service
+void metrics_record(int thread_id, long queue_wait_us, long service_us);
+
+// Records a connection that was closed without a request being read
+void metrics_record_drop(int thread_id);
+
+// Records a path cache lookup (see pathcache.h)
+void metrics_record_path_lookup(int thread_id, int hit);
+
+// Renders all metrics into a newly allocated string.
+// NOTE: caller is responsible for freeing dst
+int metrics_render(char **dst);
+
+#endif // SERVER_METRICS_H
@@ -0,0 +1,156 @@
+#include "segel.h"
+#include "pathcache.h"
+#include "watch.h"
+
+typedef struct path_node {
+    struct path_node *next;
+    unsigned long hash;
+    path_entry entry;
+    char *filename; // points into the same allocation, after uri
+    char uri[];
+} path_node;
+
+static path_node *g_buckets[PATHCACHE_BUCKETS];
+static pthread_rwlock_t g_locks[PATHCACHE_STRIPES];
+static int g_entries = 0;
+static int g_enabled = 0; // 0 if changes under ./public are not tracked
+
+// FNV-1a
+static unsigned long hash_uri(const char *uri) {
+    unsigned long hash = 14695981039346656037UL;
+
+    for (; *uri; uri++) {
+        hash = (hash ^ (unsigned char)*uri) * 1099511628211UL;
+    }
+    return hash;
+}
+
+static pthread_rwlock_t *stripe_lock(unsigned long hash) {
+    return &g_locks[(hash & (PATHCACHE_BUCKETS - 1)) % PATHCACHE_STRIPES];
+}
+
+// Runs from watch_handle(): stale entries are never hit again, free them
+static void on_change(unsigned long epoch, void *arg) {
+    (void)epoch;
+    (void)arg;
+    pathcache_clear();
+}
+
+void pathcache_init(void) {
+    for (int i = 0; i < PATHCACHE_STRIPES; i++) {
+        pthread_rwlock_init(&g_locks[i], NULL);
+    }
+    g_enabled = watch_enabled();
+    if (g_enabled) {
+        watch_register(on_change, NULL);
+    }
+}
+
+void pathcache_destroy(void) {
+    g_enabled = 0;
+    pathcache_clear();
+    for (int i = 0; i < PATHCACHE_STRIPES; i++) {
+        pthread_rwlock_destroy(&g_locks[i]);
+    }
+}
+
+int pathcache_lookup(const char *uri, char *filename, path_entry *entry) {
+    unsigned long hash = hash_uri(uri);
+    pthread_rwlock_t *lock = stripe_lock(hash);
+    int found = 0;
+
+    // read before the lookup: a change that races with it invalidates the miss
+    entry->epoch = watch_epoch();
+    if (!g_enabled) {
+        return 0;
+    }
+    pthread_rwlock_rdlock(lock);
+    for (path_node *node = g_buckets[hash & (PATHCACHE_BUCKETS - 1)];
+         node; node = node->next) {
+        if (node->hash == hash && !strcmp(node->uri, uri)) {
+            if (node->entry.epoch == entry->epoch) {
+                strcpy(filename, node->filename);
+                *entry = node->entry;
+                found = 1;
+            }
+            break;
+        }
+    }
+    pthread_rwlock_unlock(lock);
+    return found;
+}
+
+void pathcache_insert(const char *uri, const char *filename,
+                      const path_entry *entry) {
+    unsigned long hash = hash_uri(uri);
+    pthread_rwlock_t *lock = stripe_lock(hash);
+    path_node **bucket = &g_buckets[hash & (PATHCACHE_BUCKETS - 1)];
+    path_node **link = bucket;
+    path_node *evicted = NULL;
+    size_t uri_len = strlen(uri) + 1, filename_len = strlen(filename) + 1;
+
+    if (!g_enabled || !watch_enabled() || entry->epoch != watch_epoch()) {
+        return;
+    }
+    path_node *node = Malloc(sizeof(path_node) + uri_len + filename_len);
+    node->hash = hash;
+    node->entry = *entry;
+    memcpy(node->uri, uri, uri_len);
+    node->filename = node->uri + uri_len;
+    memcpy(node->filename, filename, filename_len);
+
+    pthread_rwlock_wrlock(lock);
+    for (; *link; link = &(*link)->next) {
+        if ((*link)->hash == hash && !strcmp((*link)->uri, uri)) {
+            break;
+        }
+    }
+    int full = *link == NULL &&
+        __atomic_load_n(&g_entries, __ATOMIC_RELAXED) >= PATHCACHE_MAX_ENTRIES;
+    if (full) {
+        // make room by evicting the bucket the new entry goes to; an empty
+        // bucket has nothing to give, and then the entry is not cached
+        evicted = *bucket;
+        *bucket = NULL;
+        link = bucket;
+        for (path_node *old = evicted; old; old = old->next) {
+            __atomic_fetch_sub(&g_entries, 1, __ATOMIC_RELAXED);
+        }
+    }
+    if (*link == NULL) {
+        if (!full || evicted) {
+            node->next = NULL;
+            *link = node;
+            __atomic_fetch_add(&g_entries, 1, __ATOMIC_RELAXED);
+            node = NULL;
+        }
+    } else if ((*link)->entry.epoch < node->entry.epoch) {
+        // replace an entry from before the last change
+        path_node *stale = *link;
+        node->next = stale->next;
+        *link = node;
+        node = stale;
+    }
+    pthread_rwlock_unlock(lock);
+    free(node);
+    while (evicted) {
+        path_node *next = evicted->next;
+        free(evicted);
+        evicted = next;
+    }
+}
+
+void pathcache_clear(void) {
+    for (int stripe = 0; stripe < PATHCACHE_STRIPES; stripe++) {
+        pthread_rwlock_wrlock(&g_locks[stripe]);
+        for (int i = stripe; i < PATHCACHE_BUCKETS; i += PATHCACHE_STRIPES) {
+            while (g_buckets[i]) {
+                path_node *next = g_buckets[i]->next;
+                free(g_buckets[i]);
+                g_buckets[i] = next;
+                __atomic_fetch_sub(&g_entries, 1, __ATOMIC_RELAXED);
+            }
+        }
+        pthread_rwlock_unlock(&g_locks[stripe]);
+    }
+}
@@ -0,0 +1,51 @@
+#ifndef SERVER_PATHCACHE_H
+#define SERVER_PATHCACHE_H
+
+#include <sys/types.h>
+
+//
+// Cache of resolved request URIs.
+//
+// Maps a GET URI to what requestParseURI and stat() made of it: the
+// filename, whether it is static content, its mode bits and its size, so
+// repeated requests for the same URI skip the parsing and the stat() call.
+// Callers key scripts by their path alone (see requestResolveURI), so that
+// a stream of distinct query strings does not take a new entry each.
+// Once PATHCACHE_MAX_ENTRIES are cached, an insert evicts its whole bucket.
+// The buckets are guarded by striped rwlocks: lookups only take a read lock
+// and lookups of different stripes never touch the same lock. Entries are
+// stamped with the watch epoch (see watch.h) and ignored once anything under
+// ./public changed, so an entry never outlives the file it describes.
+//
+
+#define PATHCACHE_BUCKETS     1024 // a power of two
+#define PATHCACHE_STRIPES     64   // rwlocks; bucket i uses lock i % STRIPES
+#define PATHCACHE_MAX_ENTRIES 4096 // beyond this, inserts evict a bucket
+
+typedef struct {
+    int is_static;            // 1 if static, 0 if dynamic content
+    mode_t mode;
+    off_t size;
+    unsigned long epoch;      // set by a missed lookup, see pathcache_insert
+} path_entry;
+
+// Creates the cache; it stays off unless watch_init succeeded
+void pathcache_init(void);
+
+// Frees all entries
+void pathcache_destroy(void);
+
+// Looks up uri. On a hit copies the resolved filename into filename
+// (MAXLINE bytes), fills entry and returns 1; returns 0 on a miss.
+int pathcache_lookup(const char *uri, char *filename, path_entry *entry);
+
+// Caches the resolution of uri. entry must come from a missed lookup of the
+// same uri: if the content changed since, the resolution may be stale and
+// is dropped.
+void pathcache_insert(const char *uri, const char *filename,
+                      const path_entry *entry);
+
+// Drops every entry
+void pathcache_clear(void);
+
+#endif // SERVER_PATHCACHE_H
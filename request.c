@@ -4,6 +4,15 @@
 
 #include "segel.h"
 #include "request.h"
+#include "metrics.h"
+#include "stats.h"
+#include "trace.h"
+#include "arena.h"
+#include "pathcache.h"
+#include "contentcache.h"
+
+static __thread request_conn *tl_conn = NULL;
+static int g_control = 0; // serve RESET_URI
 
 int append_stats(char *buf, threads_stats t_stats, struct timeval arrival,
                  struct timeval dispatch) {
@@ -36,14 +45,14 @@ void
 requestError(int fd, char *cause, char *errnum, char *shortmsg, char *longmsg,
              struct timeval arrival, struct timeval dispatch,
              threads_stats t_stats) {
-    char buf[MAXLINE], body[MAXBUF];
+    char *buf = arena_alloc(MAXLINE), *body = arena_alloc(MAXBUF);
 
     // Create the body of the error message
-    sprintf(body, "<html><title>OS-HW3 Error</title>");
-    sprintf(body, "%s<body bgcolor=""fffff"">\r\n", body);
-    sprintf(body, "%s%s: %s\r\n", body, errnum, shortmsg);
-    sprintf(body, "%s<p>%s: %s\r\n", body, longmsg, cause);
-    sprintf(body, "%s<hr>OS-HW3 Web Server\r\n", body);
+    int offset = sprintf(body, "<html><title>OS-HW3 Error</title>");
+    offset += sprintf(body + offset, "<body bgcolor=""fffff"">\r\n");
+    offset += sprintf(body + offset, "%s: %s\r\n", errnum, shortmsg);
+    offset += sprintf(body + offset, "<p>%s: %s\r\n", longmsg, cause);
+    offset += sprintf(body + offset, "<hr>OS-HW3 Web Server\r\n");
 
     // Write out the header information for this response
     sprintf(buf, "HTTP/1.0 %s %s\r\n", errnum, shortmsg);
@@ -66,14 +75,68 @@ requestError(int fd, char *cause, char *errnum, char *shortmsg, char *longmsg,
 }
 
 
-void requestReadhdrs(rio_t *rp) {
-    char buf[MAXLINE];
+//
+// Reads (and discards) the request headers.
+// Returns the value of Content-Length, or 0 if none was sent.
+//
+int requestReadhdrs(request_conn *conn) {
+    char *buf = conn->scratch;
+    int content_length = 0;
+
+    while (Rio_readlineb(&conn->rio, buf, MAXBUF) > 0 && strcmp(buf, "\r\n")) {
+        if (!strncasecmp(buf, "Content-Length:", 15)) {
+            content_length = atoi(buf + 15);
+        }
+    }
+    return content_length;
+}
+
+//
+// Discards a request body so the next pipelined request can be parsed
+//
+void requestSkipBody(request_conn *conn, int content_length) {
+    while (content_length > 0) {
+        int chunk = content_length < MAXBUF ? content_length : MAXBUF;
+        if (Rio_readnb(&conn->rio, conn->scratch, chunk) <= 0) {
+            return;
+        }
+        content_length -= chunk;
+    }
+}
+
+//
+// Returns 1 if another request is already waiting on this connection,
+// either in the rio buffer or in the socket receive queue
+//
+int requestPending(int fd, rio_t *rp) {
+    char c;
+
+    if (rp->rio_cnt > 0) {
+        return 1;
+    }
+    return recv(fd, &c, 1, MSG_PEEK | MSG_DONTWAIT) > 0;
+}
+
+//
+// Splits the request line in place into method, URI and version, the way
+// sscanf("%s %s %s") would; missing fields are empty strings
+//
+void requestParseLine(request_conn *conn) {
+    char *p = conn->line;
+    unsigned short *fields[] = {&conn->method, &conn->uri, &conn->version};
 
-    Rio_readlineb(rp, buf, MAXLINE);
-    while (strcmp(buf, "\r\n")) {
-        Rio_readlineb(rp, buf, MAXLINE);
+    for (int i = 0; i < 3; i++) {
+        while (isspace((unsigned char)*p)) {
+            p++;
+        }
+        *fields[i] = p - conn->line;
+        while (*p && !isspace((unsigned char)*p)) {
+            p++;
+        }
+        if (*p) {
+            *p++ = '\0';
+        }
     }
-    return;
 }
 
 //
@@ -108,6 +171,59 @@ int requestParseURI(char *uri, char *filename, char *cgiargs) {
     }
 }
 
+//
+// The path cache key of uri, allocated from the request arena.
+// A script's query string only becomes cgiargs, so every query of one
+// script shares the entry of its path. Any other query stays in the key:
+// it can change how the URI resolves (".." in it, or "cgi" only there).
+//
+char *requestCacheKey(const char *uri) {
+    const char *args = index(uri, '?');
+    size_t len = strlen(uri) + 1;
+    char *key = memcpy(arena_alloc(len), uri, len);
+
+    if (args && !strstr(args, "..")) {
+        key[args - uri] = '\0';
+        if (!strstr(key, "cgi")) {
+            key[args - uri] = '?';
+        }
+    }
+    return key;
+}
+
+//
+// Resolves uri like requestParseURI followed by stat(), going through the
+// path cache so a repeated URI costs neither.
+// Returns 1 if static, 0 if dynamic content, -1 if the file does not exist.
+// Only st_mode and st_size of sbuf are filled in on a cache hit.
+//
+int requestResolveURI(char *uri, char *filename, char *cgiargs,
+                      struct stat *sbuf, int thread_id) {
+    path_entry entry;
+    char *key = requestCacheKey(uri);
+
+    if (pathcache_lookup(key, filename, &entry)) {
+        metrics_record_path_lookup(thread_id, 1);
+        sbuf->st_mode = entry.mode;
+        sbuf->st_size = entry.size;
+        char *args = index(uri, '?');
+        strcpy(cgiargs, entry.is_static || !args ? "" : args + 1);
+        return entry.is_static;
+    }
+    metrics_record_path_lookup(thread_id, 0);
+    entry.is_static = requestParseURI(uri, filename, cgiargs);
+    unsigned long start = trace_now();
+    int rc = stat(filename, sbuf);
+    trace_end(TRACE_STAT, start);
+    if (rc < 0) {
+        return -1;
+    }
+    entry.mode = sbuf->st_mode;
+    entry.size = sbuf->st_size;
+    pathcache_insert(key, filename, &entry);
+    return entry.is_static;
+}
+
 //
 // Fills in the filetype given the filename
 //
@@ -126,38 +242,78 @@ void requestGetFiletype(char *filename, char *filetype) {
 void requestServeDynamic(int fd, char *filename, char *cgiargs,
                          struct timeval arrival, struct timeval dispatch,
                          threads_stats t_stats) {
-    char buf[MAXLINE], *emptylist[] = {NULL};
+    char *buf = arena_alloc(MAXLINE), *emptylist[] = {NULL};
 
     // The server does only a little bit of the header.
     // The CGI script has to finish writing out the header.
-    sprintf(buf, "HTTP/1.0 200 OK\r\n");
-    sprintf(buf, "%sServer: OS-HW3 Web Server\r\n", buf);
+    int offset = sprintf(buf, "HTTP/1.0 200 OK\r\n");
+    offset += sprintf(buf + offset, "Server: OS-HW3 Web Server\r\n");
     int buf_len = append_stats(buf, t_stats, arrival, dispatch);
 
+    unsigned long start = trace_now();
     Rio_writen(fd, buf, buf_len);
+    trace_end(TRACE_WRITE, start);
     int pid = 0;
+    start = trace_now();
     if ((pid = Fork()) == 0) {
         /* Child process */
+        // main blocked the signals the server handles; the exec'ed program
+        // would inherit that mask, so give it the default one
+        sigset_t none;
+        sigemptyset(&none);
+        if (sigprocmask(SIG_SETMASK, &none, NULL) < 0) {
+            unix_error("sigprocmask error");
+        }
         Setenv("QUERY_STRING", cgiargs, 1);
         /* When the CGI process writes to stdout, it will instead go to the socket */
         Dup2(fd, STDOUT_FILENO);
         Execve(filename, emptylist, environ);
     }
+    trace_end(TRACE_CGI_FORK, start);
+    start = trace_now();
     WaitPid(pid, NULL, WUNTRACED);
+    trace_end(TRACE_CGI_WAIT, start);
 }
 
 
+//
+// Writes the header of a static response, up to the Stat-* lines, into buf.
+// Returns its length.
+//
+int requestStaticHeader(char *buf, const char *filename, int filesize) {
+    char filetype[64]; // longer than any type requestGetFiletype knows
+
+    requestGetFiletype((char *)filename, filetype);
+    int offset = sprintf(buf, "HTTP/1.0 200 OK\r\n");
+    offset += sprintf(buf + offset, "Server: OS-HW3 Web Server\r\n");
+    offset += sprintf(buf + offset, "Content-Length: %d\r\n", filesize);
+    offset += sprintf(buf + offset, "Content-Type: %s\r\n", filetype);
+    return offset;
+}
+
 void
 requestServeStatic(int fd, char *filename, int filesize, struct timeval arrival,
                    struct timeval dispatch, threads_stats t_stats) {
     int srcfd;
-    char *srcp, filetype[MAXLINE], buf[MAXBUF];
-
-    requestGetFiletype(filename, filetype);
-
+    char *srcp, *buf = arena_alloc(MAXBUF);
+
+    unsigned long start = trace_now();
+    content_entry *entry = contentcache_get(filename);
+    if (entry) {
+        // cached: the header prefix and the file bytes are ready to send
+        trace_end(TRACE_OPEN, start);
+        memcpy(buf, entry->header, entry->header_len + 1);
+        int buf_len = append_stats(buf, t_stats, arrival, dispatch);
+        start = trace_now();
+        Rio_writen(fd, buf, buf_len);
+        Rio_writen(fd, entry->data, entry->size);
+        trace_end(TRACE_WRITE, start);
+        contentcache_release(entry);
+        return;
+    }
     srcfd = Open(filename, O_RDONLY, 0);
     if (srcfd < 0) {
-        t_stats->stat_req--;
+        stats_count(t_stats, &t_stats->stat_req, -1);
         requestError(fd, filename, "403", "Forbidden",
                      "OS-HW3 Server could not read this file",
                      arrival, dispatch, t_stats);
@@ -165,7 +321,7 @@ requestServeStatic(int fd, char *filename, int filesize, struct timeval arrival,
     }
     //printf("open didn't fail got fd: %d\n", srcfd);
     if (filesize == 0) {
-        t_stats->stat_req--;
+        stats_count(t_stats, &t_stats->stat_req, -1);
         Close(srcfd);
         requestError(fd, filename, "403", "Forbidden",
                      "OS-HW3 Server cannot map empty file",
@@ -177,7 +333,7 @@ requestServeStatic(int fd, char *filename, int filesize, struct timeval arrival,
     srcp = Mmap(0, filesize, PROT_READ, MAP_PRIVATE, srcfd, 0);
     if (srcp == MAP_FAILED) {
         //printf("Mmap failed\n");
-        t_stats->stat_req--;
+        stats_count(t_stats, &t_stats->stat_req, -1);
         Close(srcfd);
         requestError(fd, filename, "403", "Forbidden",
                      "OS-HW3 Server could not read this file",
@@ -186,57 +342,114 @@ requestServeStatic(int fd, char *filename, int filesize, struct timeval arrival,
     }
     //printf("Mmap didn't fail\n");
     Close(srcfd);
+    trace_end(TRACE_OPEN, start);
 
     // put together response
-    sprintf(buf, "HTTP/1.0 200 OK\r\n");
-    sprintf(buf, "%sServer: OS-HW3 Web Server\r\n", buf);
-    sprintf(buf, "%sContent-Length: %d\r\n", buf, filesize);
-    sprintf(buf, "%sContent-Type: %s\r\n", buf, filetype);
+    requestStaticHeader(buf, filename, filesize);
     int buf_len = append_stats(buf, t_stats, arrival, dispatch);
+    start = trace_now();
     Rio_writen(fd, buf, buf_len);
 
     //  Writes out to the client socket the memory-mapped file
     Rio_writen(fd, srcp, filesize);
+    trace_end(TRACE_WRITE, start);
     Munmap(srcp, filesize);
 }
 
 void requestServePost(int fd, struct timeval arrival, struct timeval dispatch,
                       threads_stats t_stats, server_log log) {
-    char header[MAXBUF], *body = NULL;
-    int body_len = get_log(log, &body);
+    char *header = arena_alloc(MAXBUF), *body = NULL;
+    int body_len = get_log_arena(log, &body);
     // put together response
-    sprintf(header, "HTTP/1.0 200 OK\r\n");
-    sprintf(header, "%sServer: OS-HW3 Web Server\r\n", header);
-    sprintf(header, "%sContent-Length: %d\r\n", header, body_len);
-    sprintf(header, "%sContent-Type: %s\r\n", header, "text/plain");
+    int offset = sprintf(header, "HTTP/1.0 200 OK\r\n");
+    offset += sprintf(header + offset, "Server: OS-HW3 Web Server\r\n");
+    offset += sprintf(header + offset, "Content-Length: %d\r\n", body_len);
+    offset += sprintf(header + offset, "Content-Type: %s\r\n", "text/plain");
+    int header_len = append_stats(header, t_stats, arrival, dispatch);
+    unsigned long start = trace_now();
+    Rio_writen(fd, header, header_len);
+    Rio_writen(fd, body, body_len);
+    trace_end(TRACE_WRITE, start);
+}
+
+void requestServeMetrics(int fd, struct timeval arrival,
+                         struct timeval dispatch, threads_stats t_stats) {
+    char *header = arena_alloc(MAXBUF), *body = NULL;
+    int body_len = metrics_render(&body);
+    // put together response
+    int offset = sprintf(header, "HTTP/1.0 200 OK\r\n");
+    offset += sprintf(header + offset, "Server: OS-HW3 Web Server\r\n");
+    offset += sprintf(header + offset, "Content-Length: %d\r\n", body_len);
+    offset += sprintf(header + offset, "Content-Type: %s\r\n",
+                      "text/plain; version=0.0.4");
     int header_len = append_stats(header, t_stats, arrival, dispatch);
     Rio_writen(fd, header, header_len);
     Rio_writen(fd, body, body_len);
     free(body);
 }
 
-// handle a request
-void requestHandle(int fd, struct timeval arrival, struct timeval dispatch,
-                   threads_stats t_stats, server_log log) {
-    // TODO:  should update static request stats
-    int is_static;
-    struct stat sbuf;
-    char buf[MAXLINE], method[MAXLINE], uri[MAXLINE], version[MAXLINE];
-    char filename[MAXLINE], cgiargs[MAXLINE];
-    rio_t rio;
+// Starts the statistics and the log over; the response is counted in neither
+void requestServeReset(int fd, struct timeval arrival,
+                       struct timeval dispatch, threads_stats t_stats,
+                       server_log log) {
+    char *header = arena_alloc(MAXBUF);
+    stats_reset(t_stats);
+    clear_log(log);
+    // put together response
+    int offset = sprintf(header, "HTTP/1.0 200 OK\r\n");
+    offset += sprintf(header + offset, "Server: OS-HW3 Web Server\r\n");
+    offset += sprintf(header + offset, "Content-Length: 0\r\n");
+    offset += sprintf(header + offset, "Content-Type: %s\r\n", "text/plain");
+    int header_len = append_stats(header, t_stats, arrival, dispatch);
+    Rio_writen(fd, header, header_len);
+}
 
-    Rio_readinitb(&rio, fd);
-    ssize_t n = Rio_readlineb(&rio, buf, MAXLINE);
-    if (n <= 0) { //should be deleted?
-        return;
-    }
-    sscanf(buf, "%s %s %s", method, uri, version);
-    t_stats->total_req++;
-    if (!strcasecmp(method, "GET")) {
-        requestReadhdrs(&rio);
+void requestServeTrace(int fd, struct timeval arrival,
+                       struct timeval dispatch, threads_stats t_stats) {
+    char *header = arena_alloc(MAXBUF), *body = NULL;
+    int body_len = trace_export(&body);
+    // put together response
+    int offset = sprintf(header, "HTTP/1.0 200 OK\r\n");
+    offset += sprintf(header + offset, "Server: OS-HW3 Web Server\r\n");
+    offset += sprintf(header + offset, "Content-Length: %d\r\n", body_len);
+    offset += sprintf(header + offset, "Content-Type: %s\r\n", "application/json");
+    int header_len = append_stats(header, t_stats, arrival, dispatch);
+    Rio_writen(fd, header, header_len);
+    Rio_writen(fd, body, body_len);
+    free(body);
+}
 
-        is_static = requestParseURI(uri, filename, cgiargs);
-        if (stat(filename, &sbuf) < 0) {
+// handle a single request already waiting in rio
+void requestHandleOne(int fd, request_conn *conn, struct timeval arrival,
+                      struct timeval dispatch, threads_stats t_stats,
+                      server_log log, unsigned long parse_start) {
+    int is_static;
+    struct stat sbuf;
+    char *filename = arena_alloc(MAXLINE), *cgiargs = arena_alloc(MAXLINE);
+
+    requestParseLine(conn);
+    char *method = REQUEST_FIELD(conn, method);
+    char *uri = REQUEST_FIELD(conn, uri);
+    stats_count(t_stats, &t_stats->total_req, 1);
+    int content_length = requestReadhdrs(conn);
+    requestSkipBody(conn, content_length);
+    trace_end(TRACE_PARSE, parse_start);
+    if (!strcasecmp(method, "GET") && !strcmp(uri, METRICS_URI)) {
+        // internal endpoint: counted in total_req only and never logged
+        requestServeMetrics(fd, arrival, dispatch, t_stats);
+
+    } else if (!strcasecmp(method, "GET") && !strcmp(uri, TRACE_URI)
+               && trace_enabled()) {
+        // internal endpoint: counted in total_req only and never logged
+        requestServeTrace(fd, arrival, dispatch, t_stats);
+
+    } else if (!strcasecmp(method, "POST") && !strcmp(uri, RESET_URI)
+               && g_control) {
+        requestServeReset(fd, arrival, dispatch, t_stats, log);
+
+    } else if (!strcasecmp(method, "GET")) {
+        is_static = requestResolveURI(uri, filename, cgiargs, &sbuf, t_stats->id);
+        if (is_static < 0) {
             requestError(fd, filename, "404", "Not found",
                          "OS-HW3 Server could not find this file",
                          arrival, dispatch, t_stats);
@@ -252,13 +465,15 @@ void requestHandle(int fd, struct timeval arrival, struct timeval dispatch,
                 return;
             }
             //printf("valid static request\n");
-            t_stats->stat_req++;
-            char stats_buf[MAXLINE];
+            stats_count(t_stats, &t_stats->stat_req, 1);
+            char *stats_buf = arena_alloc(MAXLINE);
             stats_buf[0] = '\0';
             append_stats(stats_buf, t_stats, arrival, dispatch);
             requestServeStatic(fd, filename, sbuf.st_size, arrival, dispatch,
                                t_stats);
+            unsigned long start = trace_now();
             add_to_log(log, stats_buf, strlen(stats_buf));
+            trace_end(TRACE_LOG, start);
 
 
         } else {
@@ -268,20 +483,20 @@ void requestHandle(int fd, struct timeval arrival, struct timeval dispatch,
                              arrival, dispatch, t_stats);
                 return;
             }
-            t_stats->dynm_req++;
-            char stats_buf[MAXLINE];
+            stats_count(t_stats, &t_stats->dynm_req, 1);
+            char *stats_buf = arena_alloc(MAXLINE);
             stats_buf[0] = '\0';
             append_stats(stats_buf, t_stats, arrival, dispatch);
             requestServeDynamic(fd, filename, cgiargs, arrival, dispatch,
                                 t_stats);
+            unsigned long start = trace_now();
             add_to_log(log, stats_buf, strlen(stats_buf));
+            trace_end(TRACE_LOG, start);
 
         }
 
-        // TODO: add log entry using add_to_log(server_log log, const char* data, int data_len);
-
     } else if (!strcasecmp(method, "POST")) {
-        t_stats->post_req++;
+        stats_count(t_stats, &t_stats->post_req, 1);
         requestServePost(fd, arrival, dispatch, t_stats, log);
 
     } else {
@@ -292,3 +507,42 @@ void requestHandle(int fd, struct timeval arrival, struct timeval dispatch,
     }
 
 }
+
+// handle a request, and any requests the client pipelined behind it
+// returns the number of requests handled
+int requestHandle(int fd, struct timeval arrival, struct timeval dispatch,
+                   threads_stats t_stats, server_log log) {
+    int handled = 0;
+
+    if (tl_conn == NULL) {
+        tl_conn = Malloc(sizeof(request_conn));
+    }
+    request_conn *conn = tl_conn;
+    Rio_readinitb(&conn->rio, fd);
+    do {
+        unsigned long parse_start = trace_now();
+        ssize_t n = Rio_readlineb(&conn->rio, conn->line, MAXLINE);
+        if (n <= 0) {
+            break;
+        }
+        if (!strcmp(conn->line, "\r\n")) {
+            // tolerate a stray CRLF between pipelined requests
+            continue;
+        }
+        requestHandleOne(fd, conn, arrival, dispatch, t_stats, log,
+                         parse_start);
+        // everything the request allocated was transient
+        arena_reset();
+        handled++;
+    } while (requestPending(fd, &conn->rio));
+    return handled;
+}
+
+void requestSetControl(int enabled) {
+    g_control = enabled;
+}
+
+void requestThreadExit(void) {
+    free(tl_conn);
+    tl_conn = NULL;
+}
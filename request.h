@@ -1,22 +1,55 @@
 #ifndef __REQUEST_H__
 #define __REQUEST_H__
 
+#include "segel.h"
 #include "log.h"
 
-typedef struct Threads_stats {
+// Internal endpoint that serves the server metrics (see metrics.h)
+#define METRICS_URI "/__metrics"
+
+// Internal endpoint that serves the request trace when tracing is on (see trace.h)
+#define TRACE_URI "/__trace"
+
+// Internal endpoint (POST, with --control) that starts the statistics and
+// the log over, so a test harness can reuse one server for many tests
+#define RESET_URI "/__reset"
+
+#define CACHE_LINE 64
+
+// Each thread's stats fill a whole cache line (see stats.h)
+typedef struct __attribute__((aligned(CACHE_LINE))) Threads_stats {
     int id;           // Thread ID
     int stat_req;     // Number of static requests handled
     int dynm_req;     // Number of dynamic requests handled
     int post_req;     // Number of POST requests handled
     int total_req;    // Total number of requests handled
+    unsigned int seq; // Odd while the owning thread updates the counters
+    unsigned int generation; // stats_reset() count the counters belong to
 } *threads_stats;
 
+// Parsing state of the connection a worker is handling. Each worker has one,
+// off its stack. The request line is split in place and its fields are
+// offsets into line, so nothing is copied out of it.
+typedef struct {
+    rio_t rio;
+    char line[MAXLINE];     // request line of the current request
+    char scratch[MAXBUF];   // header lines and discarded request bodies
+    unsigned short method;  // offsets of the request-line fields in line
+    unsigned short uri;
+    unsigned short version;
+} request_conn;
+
+#define REQUEST_FIELD(conn, field) ((conn)->line + (conn)->field)
+
 // Handles a client request.
+// Requests the client pipelined on the same connection are answered in order,
+// each one counted in the thread's statistics.
 // - fd: the connection socket
 // - arrival: time the request arrived
 // - dispatch: time the thread began processing the request
 // - t_stats: pointer to the current thread's statistics (must be updated by student)
 // - log: server-wide shared log (thread-safe access required)
+// Returns the number of requests handled (0 if the client sent nothing).
 // TODO:
 // - must correctly track and update per-thread statistics inside the request handler.
 // - Update the following fields in `threads_stats`:
@@ -26,13 +59,22 @@ typedef struct Threads_stats {
 //   - post_req (for POST requests)
 // - These values should reflect accurate request processing for each thread and be used in response headers/logs.
 
-void requestHandle(int fd, struct timeval arrival, struct timeval dispatch,
+int requestHandle(int fd, struct timeval arrival, struct timeval dispatch,
                    threads_stats t_stats, server_log log);
 
+// Frees the calling worker's connection state; call before the thread exits
+void requestThreadExit(void);
+
+// Serves the control endpoints (RESET_URI) if enabled
+void requestSetControl(int enabled);
+
+// Writes the header of a static response for filename, up to the Stat-*
+// lines, into buf (MAXBUF bytes). Returns its length.
+int requestStaticHeader(char *buf, const char *filename, int filesize);
+
 typedef struct {
     int connfd;
-    struct timeval arrival_time;
-    struct timeval dispatch_time;
+    unsigned long arrival_ns; // monotonic arrival time (see timing.h)
 } Request;
 
 #endif
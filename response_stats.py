@@ -0,0 +1,133 @@
+"""
+Single-pass parser of the status line and the Stat-* headers of a response.
+
+Works on a raw HTTP response as well as on the ./client transcript that
+http_client.Response.stdout renders ("Header: " before every header line):
+
+    stats = parse(response.stdout)
+    stats.status, stats.thread_id, stats.as_dict()
+
+Lines are split with bytes.find and str.partition and looked up by header
+name, instead of trying a regular expression per statistic on every line.
+Parsing stops at the end of the header block, so the body, which for a POST
+is the whole server log of further Stat-* blocks, is never decoded or split.
+StatsParser takes the response in chunks, as it arrives from a socket.
+"""
+
+from dataclasses import dataclass
+from typing import Optional, Union
+
+TRANSCRIPT_PREFIX = b"Header: "
+CHUNK_SIZE = 4096
+
+# header name -> (ResponseStats field, type)
+_FIELDS = {
+    b"Stat-Req-Arrival": ("arrival", float),
+    b"Stat-Req-Dispatch": ("dispatch", float),
+    b"Stat-Thread-Id": ("thread_id", int),
+    b"Stat-Thread-Count": ("thread_count", int),
+    b"Stat-Thread-Static": ("thread_static", int),
+    b"Stat-Thread-Dynamic": ("thread_dynamic", int),
+    b"Stat-Thread-Post": ("thread_post", int),
+}
+
+STATUS_NAMES = {200: "200", 403: "403", 404: "404", 501: "501", 400: "error", 405: "error"}
+"""how the test scripts name the statuses they check for"""
+
+
+@dataclass(slots=True)
+class ResponseStats:
+    """Status and Stat-* values of one response; None where absent."""
+
+    status: Optional[int] = None
+    arrival: Optional[float] = None
+    dispatch: Optional[float] = None
+    thread_id: Optional[int] = None
+    thread_count: Optional[int] = None
+    thread_static: Optional[int] = None
+    thread_dynamic: Optional[int] = None
+    thread_post: Optional[int] = None
+
+    @property
+    def status_name(self) -> Optional[str]:
+        """STATUS_NAMES of the status, None for any other"""
+        return STATUS_NAMES.get(self.status)
+
+    def as_dict(self) -> dict:
+        """The Stat-* values that were present, by field name"""
+        return {field: getattr(self, field) for field, _ in _FIELDS.values()
+                if getattr(self, field) is not None}
+
+
+class StatsParser:
+    """Parses a response fed in chunks; feed() returns True once the headers ended."""
+
+    __slots__ = ("stats", "done", "_partial", "_prefixed")
+
+    def __init__(self):
+        self.stats = ResponseStats()
+        self.done = False
+        self._partial = b""
+        self._prefixed = False
+
+    def feed(self, data: bytes) -> bool:
+        if self.done:
+            return True
+        if self._partial:
+            data = self._partial + data
+        start = 0
+        while (end := data.find(b"\n", start)) >= 0:
+            if self._line(data[start:end]):
+                self.done = True
+                self._partial = b""
+                return True
+            start = end + 1
+        self._partial = data[start:]
+        return False
+
+    def close(self) -> ResponseStats:
+        """Parses what is left of an unterminated last line; returns the stats."""
+        if not self.done and self._partial:
+            self._line(self._partial)
+        self.done = True
+        self._partial = b""
+        return self.stats
+
+    def _line(self, line: bytes) -> bool:
+        """Takes one line without its \\n; True if it ends the header block."""
+        if line.endswith(b"\r"):
+            line = line[:-1]
+        prefixed = line.startswith(TRANSCRIPT_PREFIX)
+        if prefixed:
+            line = line[len(TRANSCRIPT_PREFIX):]
+        stats = self.stats
+        if stats.status is None:
+            if line.startswith(b"HTTP/"):
+                parts = line.split(None, 2)
+                if len(parts) > 1 and parts[1].isdigit():
+                    stats.status = int(parts[1])
+                    self._prefixed = prefixed
+                return False
+        elif not line or (self._prefixed and not prefixed):
+            return True
+        name, _, value = line.partition(b":")
+        field = _FIELDS.get(name)
+        if field is not None and value.startswith(b": "):
+            try:
+                setattr(stats, field[0], field[1](value[2:].strip()))
+            except ValueError:
+                pass
+        return False
+
+
+def parse(output: Union[str, bytes]) -> ResponseStats:
+    """Parses a whole response or ./client transcript, up to the end of its headers."""
+    parser = StatsParser()
+    if isinstance(output, bytes):
+        parser.feed(output)
+    else:
+        # encode chunk by chunk, so a long body after the headers never is
+        for start in range(0, len(output), CHUNK_SIZE):
+            if parser.feed(output[start:start + CHUNK_SIZE].encode("utf-8", "surrogateescape")):
+                break
+    return parser.close()
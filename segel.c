@@ -507,11 +507,23 @@ int open_clientfd(char *hostname, int port) {
  */
 /* $begin open_listenfd */
 int open_listenfd(int port) {
+    return open_listenfd_opts(port, NULL);
+}
+
+/*
+ * open_listenfd_opts - open_listenfd with socket options (see listen_opts)
+ */
+int open_listenfd_opts(int port, const listen_opts *opts) {
     int listenfd, optval = 1;
+    int type = SOCK_STREAM | SOCK_CLOEXEC;
     struct sockaddr_in serveraddr;
 
+    if (opts && opts->nonblock) {
+        type |= SOCK_NONBLOCK;
+    }
+
     /* Create a socket descriptor */
-    if ((listenfd = socket(AF_INET, SOCK_STREAM, 0)) < 0) {
+    if ((listenfd = socket(AF_INET, type, 0)) < 0) {
         fprintf(stderr, "socket failed\n");
         return -1;
     }
@@ -523,6 +535,44 @@ int open_listenfd(int port) {
         return -1;
     }
 
+    /* Lets every acceptor thread bind its own socket to the same port;
+       the kernel spreads incoming connections across them */
+    if (opts && opts->reuseport &&
+        setsockopt(listenfd, SOL_SOCKET, SO_REUSEPORT,
+                   (const void *)&optval, sizeof(int)) < 0) {
+        fprintf(stderr, "setsockopt SO_REUSEPORT failed\n");
+        return -1;
+    }
+
+    /* Linux copies these options from the listening socket to every
+       accepted socket, so they need to be set only once */
+    if (opts && opts->nodelay &&
+        setsockopt(listenfd, IPPROTO_TCP, TCP_NODELAY,
+                   (const void *)&optval, sizeof(int)) < 0) {
+        fprintf(stderr, "setsockopt TCP_NODELAY failed\n");
+        return -1;
+    }
+    if (opts && opts->sndbuf > 0 &&
+        setsockopt(listenfd, SOL_SOCKET, SO_SNDBUF,
+                   (const void *)&opts->sndbuf, sizeof(int)) < 0) {
+        fprintf(stderr, "setsockopt SO_SNDBUF failed\n");
+        return -1;
+    }
+
+    /* Accept only returns connections that already sent their request */
+    if (opts && opts->defer_accept > 0 &&
+        setsockopt(listenfd, IPPROTO_TCP, TCP_DEFER_ACCEPT,
+                   (const void *)&opts->defer_accept, sizeof(int)) < 0) {
+        fprintf(stderr, "setsockopt TCP_DEFER_ACCEPT failed\n");
+        return -1;
+    }
+    if (opts && opts->fastopen > 0 &&
+        setsockopt(listenfd, IPPROTO_TCP, TCP_FASTOPEN,
+                   (const void *)&opts->fastopen, sizeof(int)) < 0) {
+        fprintf(stderr, "setsockopt TCP_FASTOPEN failed\n");
+        return -1;
+    }
+
     /* Listenfd will be an endpoint for all requests to port
        on any IP address for this host */
     bzero((char *)&serveraddr, sizeof(serveraddr));
@@ -535,7 +585,7 @@ int open_listenfd(int port) {
     }
 
     /* Make it a listening socket ready to accept connection requests */
-    if (listen(listenfd, LISTENQ) < 0) {
+    if (listen(listenfd, opts && opts->backlog > 0 ? opts->backlog : LISTENQ) < 0) {
         fprintf(stderr, "listen failed\n");
         return -1;
     }
@@ -568,6 +618,15 @@ int Open_listenfd(int port) {
     return rc;
 }
 
+int Open_listenfd_opts(int port, const listen_opts *opts) {
+    int rc;
+
+    if ((rc = open_listenfd_opts(port, opts)) < 0) {
+        unix_error("Open_listenfd error");
+    }
+    return rc;
+}
+
 void *Malloc(size_t size) {
     void *ptr = malloc(size);
     if (ptr == NULL) {
@@ -23,6 +23,7 @@
 #include <netdb.h>
 #include <netinet/in.h>
 #include <arpa/inet.h>
+#include <netinet/tcp.h>
 
 
 /* Default file permissions are DEF_MODE & ~DEF_UMASK */
@@ -144,16 +145,31 @@ ssize_t Rio_readnb(rio_t *rp, void *usrbuf, size_t n);
 
 ssize_t Rio_readlineb(rio_t *rp, void *usrbuf, size_t maxlen);
 
+/* Options for open_listenfd_opts (NULL means defaults) */
+typedef struct {
+    int reuseport;     /* SO_REUSEPORT: several sockets may listen on the port */
+    int nonblock;      /* O_NONBLOCK, so accept() returns EAGAIN when drained */
+    int backlog;       /* listen() backlog, 0 means LISTENQ */
+    int nodelay;       /* TCP_NODELAY: no Nagle delay on small writes */
+    int defer_accept;  /* TCP_DEFER_ACCEPT: seconds to wait for request data */
+    int fastopen;      /* TCP_FASTOPEN: pending TFO request queue length */
+    int sndbuf;        /* SO_SNDBUF in bytes, 0 means the kernel default */
+} listen_opts;
+
 /* Client/server helper functions */
 int open_clientfd(char *hostname, int portno);
 
 int open_listenfd(int portno);
 
+int open_listenfd_opts(int portno, const listen_opts *opts);
+
 /* Wrappers for client/server helper functions */
 int Open_clientfd(char *hostname, int port);
 
 int Open_listenfd(int port);
 
+int Open_listenfd_opts(int port, const listen_opts *opts);
+
 void *Malloc(size_t size);
 
 #endif /* __CSAPP_H__ */
@@ -1,7 +1,23 @@
+#define _GNU_SOURCE // accept4
 #include "segel.h"
+#include <limits.h>
+#include <poll.h>
+#include <sched.h>
+#include <sys/signalfd.h>
 #include "request.h"
 #include "log.h"
+#include "metrics.h"
+#include "stats.h"
+#include "trace.h"
+#include "timing.h"
+#include "arena.h"
+#include "pathcache.h"
+#include "watch.h"
+#include "contentcache.h"
 #define MAX_QUEUE_SIZE 1024
+#define ACCEPT_BATCH 64 // most connections an acceptor drains per wakeup
+#define LISTEN_FDS_ENV "OSHW3_LISTEN_FDS" // listening sockets handed to a new binary
+#define READY_FD_ENV "OSHW3_READY_FD"     // where to report that the server is up
 
 
 
@@ -10,7 +26,45 @@
 // server.c: A very, very simple web server
 //
 // To run:
-//  ./server <portnum (above 2000)>
+//  ./server <portnum (above 2000)> <threads> <queue size> [options]
+//
+// Port 0 listens on a free port chosen by the kernel (see OSHW3_READY_FD).
+//
+// Options:
+//  --trace          record request-lifecycle traces (GET /__trace, SIGUSR1)
+//  --acceptors=K    accept on K threads, each with its own SO_REUSEPORT socket
+//  --backlog=N      listen() backlog (default LISTENQ)
+//  --nodelay        disable Nagle's algorithm on client sockets
+//  --defer-accept=S accept a connection only once its request arrived
+//                   (waiting at most S seconds)
+//  --fastopen=N     enable TCP Fast Open with a queue of N pending requests
+//  --sndbuf=BYTES   send buffer size of client sockets
+//  --affinity=CPUS  pin worker i to the i-th CPU of a list such as 0-3,6
+//                   (wrapping around when there are more workers than CPUs)
+//  --acceptor-affinity=CPUS  same for the acceptor threads
+//  --preload        cache ./public in memory at startup, before listening
+//  --preload-max=BYTES  largest file to cache (K/M suffix allowed)
+//  --stack-size=BYTES  stack size of worker and acceptor threads (K/M suffix
+//                   allowed); request buffers live off the stack, so small
+//                   stacks allow thousands of workers
+//  --control        serve POST /__reset, which zeroes the statistics and
+//                   clears the log (for test harnesses reusing a server)
+//
+// Signals:
+//  SIGTERM    stop accepting, finish every queued request and exit
+//  SIGUSR2    hot restart: exec the binary at the path the server was started
+//             as (argv[0], made absolute at startup), which inherits the
+//             listening sockets through OSHW3_LISTEN_FDS, then shut down like
+//             SIGTERM
+//  SIGUSR1    write the request trace (see --trace)
+//
+// Environment:
+//  OSHW3_READY_FD=N  once the worker pool and listening sockets are up,
+//             write "READY <port>\n" to fd N and close it, so whoever started
+//             the server does not have to poll or sleep
+//  OSHW3_LISTEN_FDS=N[,M...]  serve on these already listening sockets
+//             instead of binding the port, one acceptor each; set by SIGUSR2,
+//             or by a test harness that bound free ports up front
 //
 // Repeatedly handles HTTP requests sent to this port number.
 // Most of the work is done within routines written in request.c
@@ -26,6 +80,8 @@ typedef struct {
     int front;
     int rear;
     int dequeueing_size;
+    int accepting; // cleared on shutdown: acceptors stop
+    int closed;    // set once acceptors stopped: workers exit when drained
     pthread_mutex_t mutex;
     pthread_cond_t not_full;
     pthread_cond_t not_empty;
@@ -34,11 +90,33 @@ typedef struct {
     int thread_id;
     RequestQueue *queue;
 } ThreadArgs;
+typedef struct {
+    int listenfd;
+    int trace_slot;
+    RequestQueue *queue;
+} AcceptorArgs;
 static pthread_t *thread_pool;
+static pthread_t *acceptor_pool;
 static int num_threads=10;
+static int num_acceptors=1;
+static listen_opts socket_opts;
+static char **g_argv;
+static char *g_exe; // absolute path of the server binary, for hot_restart
+static int *g_listenfds;
+static int g_wakeup[2]; // becomes readable when the server shuts down
+static int g_signal_stop[2]; // becomes readable once signal_thread must exit
+static int shutting_down = 0;
 static RequestQueue *g_queue = NULL;
 static server_log g_log = NULL;
 static int que_size=50;
+static int trace_on=0;
+static int *worker_cpus = NULL; // --affinity, NULL leaves placement to the scheduler
+static int num_worker_cpus = 0;
+static int *acceptor_cpus = NULL;
+static int num_acceptor_cpus = 0;
+static size_t stack_size = 0; // --stack-size, 0 keeps the default
+static int preload = 0;
+static size_t preload_max = 0; // --preload-max, 0 keeps CONTENT_FILE_MAX
 
 RequestQueue* init_queue(int capacity) {
     RequestQueue *q = Malloc(sizeof(RequestQueue));
@@ -48,76 +126,401 @@ RequestQueue* init_queue(int capacity) {
     q->front = 0;
     q->rear = 0;
     q->dequeueing_size=0;
+    q->accepting = 1;
+    q->closed = 0;
     pthread_mutex_init(&q->mutex, NULL);
     pthread_cond_init(&q->not_full, NULL);
     pthread_cond_init(&q->not_empty, NULL);
     return q;
 }
-void enqueue(RequestQueue *q, int connfd, struct timeval arrival_time) {
+// Waits until the queue has room and returns the number of free slots,
+// or -1 once the server stopped accepting
+int wait_for_space(RequestQueue *q) {
     pthread_mutex_lock(&q->mutex);
-    while (q->size == q->capacity) {
+    while (q->size == q->capacity && q->accepting) {
         pthread_cond_wait(&q->not_full, &q->mutex);
     }
-    q->buffer[q->rear].connfd = connfd;
-    q->buffer[q->rear].arrival_time = arrival_time;
-    q->rear = (q->rear + 1) % q->capacity;
-    q->size++;
-    q->dequeueing_size++;
-    pthread_cond_signal(&q->not_empty);
+    int free_slots = q->accepting ? q->capacity - q->size : -1;
+    pthread_mutex_unlock(&q->mutex);
+    return free_slots;
+}
+// Adds a batch of connections under one lock acquisition
+void enqueue_batch(RequestQueue *q, int *connfds, unsigned long *arrivals, int count) {
+    pthread_mutex_lock(&q->mutex);
+    for (int i = 0; i < count; i++) {
+        // only reachable when another acceptor took the free slots first
+        while (q->size == q->capacity) {
+            pthread_cond_broadcast(&q->not_empty);
+            pthread_cond_wait(&q->not_full, &q->mutex);
+        }
+        q->buffer[q->rear].connfd = connfds[i];
+        q->buffer[q->rear].arrival_ns = arrivals[i];
+        q->rear = (q->rear + 1) % q->capacity;
+        q->size++;
+        q->dequeueing_size++;
+    }
+    if (count == 1) {
+        pthread_cond_signal(&q->not_empty);
+    } else {
+        pthread_cond_broadcast(&q->not_empty);
+    }
     pthread_mutex_unlock(&q->mutex);
 }
 
 
-Request dequeue(RequestQueue *q, struct timeval *arrival_out, struct timeval *dispatch) {
+// Returns the next request, or one with connfd -1 once the queue is
+// closed and drained
+Request dequeue(RequestQueue *q) {
+    Request req = { .connfd = -1 };
     pthread_mutex_lock(&q->mutex);
-    while (q->dequeueing_size == 0) {
+    while (q->dequeueing_size == 0 && !q->closed) {
         pthread_cond_wait(&q->not_empty, &q->mutex);
     }
-    Request req = q->buffer[q->front];
-    if (arrival_out != NULL)
-        *arrival_out = req.arrival_time;
+    if (q->dequeueing_size == 0) {
+        pthread_mutex_unlock(&q->mutex);
+        return req;
+    }
+    req = q->buffer[q->front];
     q->front = (q->front + 1) % q->capacity;
     q->dequeueing_size--;
-    gettimeofday(dispatch, NULL);
     pthread_mutex_unlock(&q->mutex);
     return req;
 }
+// Wakes acceptors waiting for room so they can exit
+void queue_stop_accepting(RequestQueue *q) {
+    pthread_mutex_lock(&q->mutex);
+    q->accepting = 0;
+    pthread_cond_broadcast(&q->not_full);
+    pthread_mutex_unlock(&q->mutex);
+}
+// Lets workers exit once every queued request was handled
+void queue_close(RequestQueue *q) {
+    pthread_mutex_lock(&q->mutex);
+    q->closed = 1;
+    pthread_cond_broadcast(&q->not_empty);
+    pthread_mutex_unlock(&q->mutex);
+}
 void finishHandling(RequestQueue *q){
     pthread_mutex_lock(&q->mutex);
     q->size--;
     pthread_cond_signal(&q->not_full);
     pthread_mutex_unlock(&q->mutex);
 }
+// Reports queue state for the metrics endpoint without taking q->mutex
+void queue_probe_state(int *size, int *pending, int *capacity) {
+    *size = __atomic_load_n(&g_queue->size, __ATOMIC_RELAXED);
+    *pending = __atomic_load_n(&g_queue->dequeueing_size, __ATOMIC_RELAXED);
+    *capacity = g_queue->capacity;
+}
 void *worker_thread(void *arg) {
     ThreadArgs *args = (ThreadArgs *)arg;
     int thread_id = args->thread_id;
     free(args);
-    threads_stats stats = Malloc(sizeof(*stats));
-    stats->id = thread_id;
-    stats->stat_req = 0;
-    stats->dynm_req = 0;
-    stats->post_req = 0;
-    stats->total_req = 0;
+    threads_stats stats = stats_get(thread_id);
+    trace_attach(thread_id);
+    arena_attach(thread_id);
     while (1) {
-        struct timeval arrival;
-        struct timeval now, dispatch_interval;
-        Request req = dequeue(g_queue, &arrival, &now);
-        timersub(&now, &arrival, &dispatch_interval);
-        requestHandle(req.connfd, arrival, dispatch_interval, stats, g_log);
+        Request req = dequeue(g_queue);
+        if (req.connfd < 0) {
+            break;
+        }
+        // timestamps are taken outside the queue lock
+        unsigned long dispatch_ns = mono_now_ns();
+        trace_record(TRACE_QUEUE_WAIT, req.arrival_ns, dispatch_ns);
+        struct timeval arrival = mono_to_wall(req.arrival_ns);
+        struct timeval dispatch_interval = ns_to_timeval(dispatch_ns - req.arrival_ns);
+        unsigned int generation = stats_generation();
+        int handled = requestHandle(req.connfd, arrival, dispatch_interval, stats, g_log);
+        unsigned long done_ns = mono_now_ns();
+        // connections in flight across a stats reset are not counted after it
+        if (stats_generation() == generation) {
+            if (handled == 0) {
+                metrics_record_drop(thread_id);
+            }
+            metrics_record(thread_id, (dispatch_ns - req.arrival_ns) / 1000,
+                           (done_ns - dispatch_ns) / 1000);
+        }
         Close(req.connfd);
         finishHandling(g_queue);
     }
+    arena_detach();
+    requestThreadExit();
+    return NULL;
+}
+
+
+// Returns the port a listening socket is bound to
+int listen_port(int listenfd) {
+    struct sockaddr_in addr;
+    socklen_t addrlen = sizeof(addr);
+
+    if (getsockname(listenfd, (SA *)&addr, &addrlen) < 0) {
+        unix_error("getsockname error");
+    }
+    return ntohs(addr.sin_port);
+}
+
+// Reports through READY_FD_ENV, if set, that the server accepts connections
+void notify_ready(int listenfd) {
+    char line[64];
+
+    char *env = getenv(READY_FD_ENV);
+    if (env == NULL) {
+        return;
+    }
+    // neither CGI programs nor a hot restart may inherit it
+    unsetenv(READY_FD_ENV);
+    int fd = atoi(env);
+    int len = sprintf(line, "READY %d\n", listen_port(listenfd));
+    if (write(fd, line, len) < 0) {
+        // nobody is waiting anymore; keep serving
+        fprintf(stderr, "%s: %s\n", READY_FD_ENV, strerror(errno));
+    }
+    close(fd);
+}
+
+// Stops the acceptors; workers keep running until the queue is drained
+void begin_shutdown(void) {
+    if (__atomic_exchange_n(&shutting_down, 1, __ATOMIC_SEQ_CST)) {
+        return;
+    }
+    queue_stop_accepting(g_queue);
+    if (write(g_wakeup[1], "x", 1) < 0) {
+        unix_error("write error");
+    }
+}
+
+// The absolute path argv0 was run as, found the way execvp would find it.
+// Symlinks are kept, so a deploy that repoints a link is picked up.
+// Falls back to /proc/self/exe, the image already running.
+char *resolve_exe(const char *argv0) {
+    char *path = Malloc(PATH_MAX);
+
+    if (argv0[0] == '/') {
+        snprintf(path, PATH_MAX, "%s", argv0);
+        return path;
+    }
+    if (strchr(argv0, '/')) {
+        if (getcwd(path, PATH_MAX) == NULL) {
+            unix_error("getcwd error");
+        }
+        size_t len = strlen(path);
+        snprintf(path + len, PATH_MAX - len, "/%s", argv0);
+        return path;
+    }
+    const char *dirs = getenv("PATH");
+    while (dirs && *dirs) {
+        size_t len = strcspn(dirs, ":");
+        snprintf(path, PATH_MAX, "%.*s/%s", (int) len, dirs, argv0);
+        if (path[0] == '/' && access(path, X_OK) == 0) {
+            return path;
+        }
+        dirs += len + (dirs[len] == ':');
+    }
+    snprintf(path, PATH_MAX, "/proc/self/exe");
+    return path;
+}
+
+// Starts a new server binary that inherits the listening sockets.
+// The binary is the file at the path the server was started as, so
+// replacing that file and sending SIGUSR2 deploys a new build.
+// Returns 0 if the new process was started.
+int hot_restart(void) {
+    char fds[MAXLINE], var[sizeof(LISTEN_FDS_ENV) + MAXLINE];
+    int len = 0, count = 0;
 
-    free(stats);
+    for (int i = 0; i < num_acceptors; i++) {
+        len += sprintf(fds + len, "%s%d", i ? "," : "", g_listenfds[i]);
+    }
+    sprintf(var, "%s=%s", LISTEN_FDS_ENV, fds);
+    // build the environment here: the child may only call execve
+    while (environ[count]) {
+        count++;
+    }
+    char **envp = Malloc(sizeof(char *) * (count + 2));
+    for (int i = 0; i < count; i++) {
+        envp[i] = environ[i];
+    }
+    envp[count] = var;
+    envp[count + 1] = NULL;
+
+    for (int i = 0; i < num_acceptors; i++) {
+        fcntl(g_listenfds[i], F_SETFD, 0);
+    }
+    pid_t pid = fork();
+    if (pid == 0) {
+        execve(g_exe, g_argv, envp);
+        _exit(127);
+    }
+    for (int i = 0; i < num_acceptors; i++) {
+        fcntl(g_listenfds[i], F_SETFD, FD_CLOEXEC);
+    }
+    free(envp);
+    if (pid < 0) {
+        fprintf(stderr, "SIGUSR2: fork failed: %s\n", strerror(errno));
+        return -1;
+    }
+    fprintf(stderr, "SIGUSR2: started %d, shutting down %d\n", pid, getpid());
+    return 0;
+}
+
+// Handles process-directed signals on behalf of all other threads,
+// which keep them blocked. Also follows changes to ./public (see watch.h),
+// so the server runs one thread besides its workers and acceptors.
+void *signal_thread(void *arg) {
+    sigset_t *set = (sigset_t *)arg;
+    struct signalfd_siginfo info;
+    char path[MAXLINE];
+
+    int sigfd = signalfd(-1, set, SFD_CLOEXEC);
+    if (sigfd < 0) {
+        unix_error("signalfd error");
+    }
+    struct pollfd pfds[3] = {
+        { .fd = sigfd, .events = POLLIN },
+        { .fd = watch_fd(), .events = POLLIN }, // ignored by poll when -1
+        { .fd = g_signal_stop[0], .events = POLLIN },
+    };
+    while (1) {
+        if (poll(pfds, 3, -1) < 0) {
+            if (errno == EINTR) {
+                continue;
+            }
+            unix_error("poll error");
+        }
+        if (pfds[2].revents) {
+            break;
+        }
+        if (pfds[1].revents) {
+            watch_handle();
+        }
+        if (!pfds[0].revents || read(sigfd, &info, sizeof(info)) != sizeof(info)) {
+            continue;
+        }
+        int sig = info.ssi_signo;
+        if (sig == SIGUSR1) {
+            if (!trace_enabled()) {
+                fprintf(stderr, "SIGUSR1: tracing is off (run with --trace)\n");
+                continue;
+            }
+            sprintf(path, "trace-%d.json", getpid());
+            if (trace_dump(path) < 0) {
+                fprintf(stderr, "SIGUSR1: could not write %s\n", path);
+            } else {
+                fprintf(stderr, "SIGUSR1: trace written to %s\n", path);
+            }
+        } else if (sig == SIGTERM) {
+            begin_shutdown();
+        } else if (sig == SIGUSR2) {
+            if (!shutting_down && hot_restart() == 0) {
+                begin_shutdown();
+            }
+        }
+    }
+    Close(sigfd);
     return NULL;
 }
 
+// Parses a CPU list such as "0-3,6" into a newly allocated array.
+// Returns the number of CPUs in it.
+// NOTE: caller is responsible for freeing *cpus
+int parse_cpu_list(const char *list, int **cpus)
+{
+    int count = 0, capacity = 8;
+    char *end;
+
+    *cpus = Malloc(sizeof(int) * capacity);
+    while (*list) {
+        long first = strtol(list, &end, 10);
+        long last = first;
+        if (end == list) {
+            app_error("invalid cpu list");
+        }
+        if (*end == '-') {
+            list = end + 1;
+            last = strtol(list, &end, 10);
+            if (end == list) {
+                app_error("invalid cpu list");
+            }
+        }
+        if (first < 0 || last < first || last >= CPU_SETSIZE) {
+            app_error("invalid cpu list");
+        }
+        for (long cpu = first; cpu <= last; cpu++) {
+            if (count == capacity) {
+                capacity *= 2;
+                *cpus = realloc(*cpus, sizeof(int) * capacity);
+                if (*cpus == NULL) {
+                    unix_error("realloc error");
+                }
+            }
+            (*cpus)[count++] = cpu;
+        }
+        if (*end == ',') {
+            end++;
+        } else if (*end != '\0') {
+            app_error("invalid cpu list");
+        }
+        list = end;
+    }
+    if (count == 0) {
+        app_error("invalid cpu list");
+    }
+    return count;
+}
+
+// Parses a size such as 65536, 64K or 1M
+size_t parse_size(const char *arg)
+{
+    char *end;
+    unsigned long size = strtoul(arg, &end, 10);
+
+    if (end == arg) {
+        app_error("invalid size");
+    }
+    if (*end == 'K' || *end == 'k') {
+        size <<= 10;
+        end++;
+    } else if (*end == 'M' || *end == 'm') {
+        size <<= 20;
+        end++;
+    }
+    if (*end != '\0') {
+        app_error("invalid size");
+    }
+    return size;
+}
+
+// Prepares the attributes of the index-th thread of a group, pinning it to
+// one CPU of cpus when a CPU list was given
+void thread_attr_init(pthread_attr_t *attr, int *cpus, int num_cpus, int index)
+{
+    int rc = pthread_attr_init(attr);
+    if (rc != 0) {
+        posix_error(rc, "pthread_attr_init error");
+    }
+    if (stack_size > 0) {
+        rc = pthread_attr_setstacksize(attr, stack_size);
+        if (rc != 0) {
+            posix_error(rc, "pthread_attr_setstacksize error");
+        }
+    }
+    if (num_cpus > 0) {
+        cpu_set_t set;
+        CPU_ZERO(&set);
+        CPU_SET(cpus[index % num_cpus], &set);
+        rc = pthread_attr_setaffinity_np(attr, sizeof(set), &set);
+        if (rc != 0) {
+            posix_error(rc, "pthread_attr_setaffinity_np error");
+        }
+    }
+}
 
 // Parses command-line arguments
 void getargs(int *port, int argc, char *argv[])
 {
     if (argc < 4) {
-        app_error("Usage: ./server <port> <threads> <queue size>");
+        app_error("Usage: ./server <port> <threads> <queue size> [options]");
     }
     *port = atoi(argv[1]);
     num_threads=atoi(argv[2]);
@@ -125,7 +528,116 @@ void getargs(int *port, int argc, char *argv[])
     if(num_threads<1||que_size<1){
         app_error( "invalid parameters");
     }
+    for (int i = 4; i < argc; i++) {
+        if (!strcmp(argv[i], "--trace")) {
+            trace_on = 1;
+        } else if (!strncmp(argv[i], "--acceptors=", 12)) {
+            num_acceptors = atoi(argv[i] + 12);
+            if (num_acceptors < 1) {
+                app_error("invalid parameters");
+            }
+        } else if (!strncmp(argv[i], "--backlog=", 10)) {
+            socket_opts.backlog = atoi(argv[i] + 10);
+        } else if (!strcmp(argv[i], "--nodelay")) {
+            socket_opts.nodelay = 1;
+        } else if (!strncmp(argv[i], "--defer-accept=", 15)) {
+            socket_opts.defer_accept = atoi(argv[i] + 15);
+        } else if (!strncmp(argv[i], "--fastopen=", 11)) {
+            socket_opts.fastopen = atoi(argv[i] + 11);
+        } else if (!strncmp(argv[i], "--sndbuf=", 9)) {
+            socket_opts.sndbuf = atoi(argv[i] + 9);
+        } else if (!strncmp(argv[i], "--affinity=", 11)) {
+            num_worker_cpus = parse_cpu_list(argv[i] + 11, &worker_cpus);
+        } else if (!strncmp(argv[i], "--acceptor-affinity=", 20)) {
+            num_acceptor_cpus = parse_cpu_list(argv[i] + 20, &acceptor_cpus);
+        } else if (!strcmp(argv[i], "--control")) {
+            requestSetControl(1);
+        } else if (!strcmp(argv[i], "--preload")) {
+            preload = 1;
+        } else if (!strncmp(argv[i], "--preload-max=", 14)) {
+            preload_max = parse_size(argv[i] + 14);
+        } else if (!strncmp(argv[i], "--stack-size=", 13)) {
+            stack_size = parse_size(argv[i] + 13);
+            if (stack_size < PTHREAD_STACK_MIN) {
+                app_error("invalid stack size");
+            }
+        } else {
+            app_error("invalid option");
+        }
+    }
+}
+// Accepts up to max pending connections without blocking.
+// Returns how many were accepted, stamping each one's arrival time.
+int accept_batch(int listenfd, int *connfds, unsigned long *arrivals, int max) {
+    int count = 0;
+
+    while (count < max) {
+        int connfd = accept4(listenfd, NULL, NULL, SOCK_CLOEXEC);
+        if (connfd < 0) {
+            if (errno == EAGAIN || errno == EWOULDBLOCK) {
+                break;
+            }
+            if (errno == EINTR || errno == ECONNABORTED || errno == EPROTO) {
+                continue;
+            }
+            unix_error("Accept error");
+        }
+        arrivals[count] = mono_now_ns();
+        connfds[count++] = connfd;
+    }
+    return count;
+}
+
+// Accepts connections on its own listening socket and feeds the shared queue.
+// Every wakeup drains all pending connections that fit in the queue and
+// enqueues them together.
+void *acceptor_thread(void *arg) {
+    AcceptorArgs *args = (AcceptorArgs *)arg;
+    int listenfd = args->listenfd;
+    RequestQueue *queue = args->queue;
+    int connfds[ACCEPT_BATCH];
+    unsigned long arrivals[ACCEPT_BATCH];
+    struct pollfd pfds[2] = {
+        { .fd = listenfd, .events = POLLIN },
+        { .fd = g_wakeup[0], .events = POLLIN },
+    };
+
+    trace_attach(args->trace_slot);
+    free(args);
+    while (1) {
+        // wait for room first, so queued connections wait in the backlog
+        // and their arrival time is taken when they can be enqueued
+        int room = wait_for_space(queue);
+        if (room < 0) {
+            break;
+        }
+        if (room > ACCEPT_BATCH) {
+            room = ACCEPT_BATCH;
+        }
+        if (poll(pfds, 2, -1) < 0) {
+            if (errno == EINTR) {
+                continue;
+            }
+            unix_error("poll error");
+        }
+        if (pfds[1].revents) {
+            break;
+        }
+        int count = accept_batch(listenfd, connfds, arrivals, room);
+        if (count == 0) {
+            continue;
+        }
+        enqueue_batch(queue, connfds, arrivals, count);
+        unsigned long enqueued = trace_now();
+        for (int i = 0; i < count; i++) {
+            trace_record(TRACE_ACCEPT, arrivals[i], enqueued);
+        }
+    }
+    // a restarted server holds its own copy of the socket
+    Close(listenfd);
+    return NULL;
 }
+
 // TODO: HW3 — Initialize thread pool and request queue
 // This server currently handles all requests in the main thread.
 // You must implement a thread pool (fixed number of worker threads)
@@ -133,53 +645,163 @@ void getargs(int *port, int argc, char *argv[])
 
 int main(int argc, char *argv[])
 {
-    int listenfd, connfd, port, clientlen;
-    struct sockaddr_in clientaddr;
+    int port;
 
     getargs(&port, argc, argv);
+    g_argv = argv;
+    g_exe = resolve_exe(argv[0]);
+    timing_init();
 
+    // These are handled by signal_thread; block them before any thread starts
+    static sigset_t signals;
+    pthread_t signal_tid;
+    sigemptyset(&signals);
+    sigaddset(&signals, SIGUSR1);
+    sigaddset(&signals, SIGUSR2);
+    sigaddset(&signals, SIGTERM);
+    pthread_sigmask(SIG_BLOCK, &signals, NULL);
 
+    // caches of ./public rely on the watcher for invalidation
+    watch_init("./public");
+    pathcache_init();
+    contentcache_init(preload, preload_max);
+    if (contentcache_enabled()) {
+        // warm up before listening, so no client sees a cold file
+        size_t bytes = 0;
+        unsigned long start = mono_now_ns();
+        int files = contentcache_preload("./public", &bytes);
+        fprintf(stderr, "preloaded %d files (%zu bytes) in %.3f ms\n",
+                files, bytes, (mono_now_ns() - start) / 1e6);
+    }
 
-    listenfd = Open_listenfd(port);
+    int *listenfds;
+    char *inherited = getenv(LISTEN_FDS_ENV);
+    if (inherited != NULL) {
+        // hot restart: keep serving on the sockets of the previous server
+        listenfds = Malloc(sizeof(int) * (strlen(inherited) / 2 + 1));
+        num_acceptors = 0;
+        for (char *fd = strtok(inherited, ","); fd; fd = strtok(NULL, ",")) {
+            listenfds[num_acceptors] = atoi(fd);
+            fcntl(listenfds[num_acceptors], F_SETFD, FD_CLOEXEC);
+            fcntl(listenfds[num_acceptors], F_SETFL, O_NONBLOCK);
+            num_acceptors++;
+        }
+        unsetenv(LISTEN_FDS_ENV);
+        if (num_acceptors == 0) {
+            app_error("invalid " LISTEN_FDS_ENV);
+        }
+    } else {
+        // With several acceptors every one gets its own SO_REUSEPORT socket
+        socket_opts.reuseport = num_acceptors > 1;
+        socket_opts.nonblock = 1;
+        listenfds = Malloc(sizeof(int) * num_acceptors);
+        for (int i = 0; i < num_acceptors; i++) {
+            listenfds[i] = Open_listenfd_opts(port, &socket_opts);
+            // with port 0, the other acceptors join the port the first got
+            port = listen_port(listenfds[i]);
+        }
+    }
+    g_listenfds = listenfds;
+    if (pipe2(g_wakeup, O_CLOEXEC) < 0) {
+        unix_error("pipe error");
+    }
     //initialize que
     RequestQueue * queue=init_queue(que_size);
     //initialize thread pool
     thread_pool = Malloc(sizeof(pthread_t) * num_threads);
+    acceptor_pool = Malloc(sizeof(pthread_t) * num_acceptors);
     // Create the global server log
     server_log log = create_log();
     //assign log and queue to globals
     g_queue = queue;
     g_log = log;
+    stats_init(num_threads);
+    arena_init(num_threads);
+    trace_init(num_threads, num_acceptors, trace_on);
+    metrics_init(num_threads, log, queue_probe_state);
+    pthread_attr_t attr;
     for (int i = 0; i < num_threads; i++) {
         ThreadArgs *args = Malloc(sizeof(ThreadArgs));
         args->thread_id = i + 1;
         args->queue = queue;
-        int rc = pthread_create(&thread_pool[i], NULL, worker_thread, (void*)args);
+        thread_attr_init(&attr, worker_cpus, num_worker_cpus, i);
+        int rc = pthread_create(&thread_pool[i], &attr, worker_thread, (void*)args);
         if (rc != 0) {
             posix_error(rc, "pthread_create failed");
         }
+        pthread_attr_destroy(&attr);
     }
-
-
-    while (1) {
-        clientlen = sizeof(clientaddr);
-        connfd = Accept(listenfd, (SA *)&clientaddr, (socklen_t *) &clientlen);pthread_mutex_lock(&queue->mutex);
-        while (queue->size == queue->capacity) {
-            pthread_cond_wait(&queue->not_full, &queue->mutex);
+    if (pipe2(g_signal_stop, O_CLOEXEC) < 0) {
+        unix_error("pipe error");
+    }
+    int rc = pthread_create(&signal_tid, NULL, signal_thread, &signals);
+    if (rc != 0) {
+        posix_error(rc, "pthread_create failed");
+    }
+    AcceptorArgs *main_args = NULL;
+    for (int i = 0; i < num_acceptors; i++) {
+        AcceptorArgs *args = Malloc(sizeof(AcceptorArgs));
+        args->listenfd = listenfds[i];
+        args->trace_slot = num_threads + 1 + i;
+        args->queue = queue;
+        if (i == 0) {
+            // acceptor 0 is the main thread itself, started below
+            main_args = args;
+            continue;
+        }
+        thread_attr_init(&attr, acceptor_cpus, num_acceptor_cpus, i);
+        rc = pthread_create(&acceptor_pool[i], &attr, acceptor_thread, (void*)args);
+        if (rc != 0) {
+            posix_error(rc, "pthread_create failed");
+        }
+        pthread_attr_destroy(&attr);
+    }
+    if (num_acceptor_cpus > 0) {
+        // pinned only now, so the threads above did not inherit the CPU
+        cpu_set_t set;
+        CPU_ZERO(&set);
+        CPU_SET(acceptor_cpus[0], &set);
+        rc = pthread_setaffinity_np(pthread_self(), sizeof(set), &set);
+        if (rc != 0) {
+            posix_error(rc, "pthread_setaffinity_np error");
         }
-        pthread_mutex_unlock(&queue->mutex);
-        struct timeval arrival;
-        gettimeofday(&arrival, NULL);
-        enqueue(queue,connfd,arrival);
     }
+    notify_ready(listenfds[0]);
+
+    // Returns after SIGTERM/SIGUSR2: acceptors stopped, drain the queue
+    acceptor_thread(main_args);
+    for (int i = 1; i < num_acceptors; i++) {
+        pthread_join(acceptor_pool[i], NULL);
+    }
+    queue_close(queue);
+    for (int i = 0; i < num_threads; i++) {
+        pthread_join(thread_pool[i], NULL);
+    }
+    // SIGUSR1 still works while the queue drains; stop it before watch_destroy
+    Rio_writen(g_signal_stop[1], "x", 1);
+    pthread_join(signal_tid, NULL);
+    Close(g_signal_stop[0]);
+    Close(g_signal_stop[1]);
+    fflush(stdout);
     // Clean up the server log before exiting
+    metrics_destroy();
+    trace_destroy();
+    stats_destroy();
+    arena_destroy();
+    watch_destroy();
+    pathcache_destroy();
+    contentcache_destroy();
     destroy_log(log);
     // TODO: HW3 — Add cleanup code for thread pool and queue
+    pthread_mutex_destroy(&queue->mutex);
+    pthread_cond_destroy(&queue->not_full);
+    pthread_cond_destroy(&queue->not_empty);
+    free(queue->buffer);
     free(queue);
     free(thread_pool);
+    free(acceptor_pool);
+    free(listenfds);
+    free(worker_cpus);
+    free(acceptor_cpus);
     return 0;
 }
-
-
-
-
@@ -0,0 +1,101 @@
+"""
+Starts ./server and waits for it to report that it is serving.
+
+The server writes "READY <port>\\n" to the fd named by OSHW3_READY_FD once its
+worker pool and listening sockets are up (see server.c). Waiting for that
+line takes about a millisecond, where the harnesses used to sleep or poll
+connect() every 100 ms.
+
+    proc, port = start(["./server", "0", "4", "16"])
+    if port is None:
+        ...  # exited or never got ready
+
+Port 0 makes the server listen on a free port, which the readiness line
+reports. Harnesses that need the port before the server starts call
+reserve_port() instead: it binds a listening socket right away, and start()
+hands that socket to the server through OSHW3_LISTEN_FDS. Either way no two
+servers can race for a port, so suites can run in parallel (pytest -n).
+"""
+
+import os
+import select
+import socket
+import subprocess as sp
+import time
+from typing import Dict, Optional, Tuple
+
+READY_FD_ENV = "OSHW3_READY_FD"
+LISTEN_FDS_ENV = "OSHW3_LISTEN_FDS"
+LISTEN_BACKLOG = 1024
+"""LISTENQ of segel.h; the server cannot change the backlog of a socket it inherits"""
+
+_reserved: Dict[int, socket.socket] = {}
+
+
+def reserve_port() -> int:
+    """Binds a listening socket to a free port for the server started on it next."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(("", 0))
+    sock.listen(LISTEN_BACKLOG)
+    port = sock.getsockname()[1]
+    _reserved[port] = sock
+    return port
+
+
+def release_port(port: int) -> None:
+    """Closes the socket reserve_port() bound, if it was not handed to a server yet."""
+    sock = _reserved.pop(port, None)
+    if sock is not None:
+        sock.close()
+
+
+def start(cmd, timeout: float = 5.0, port: Optional[int] = None,
+          **popen_kwargs) -> Tuple[sp.Popen, Optional[int]]:
+    """
+    Runs Popen(cmd, **popen_kwargs) and waits for the readiness line.
+
+    If `port` came from reserve_port(), the server inherits its socket (and
+    serves it with a single acceptor) instead of binding the port itself.
+
+    Returns the process and the port it listens on, or None as the port if
+    the server exited or did not report within `timeout` seconds; the
+    process is not killed in that case.
+    """
+    read_fd, write_fd = os.pipe()
+    env = dict(popen_kwargs.pop("env", None) or os.environ)
+    env[READY_FD_ENV] = str(write_fd)
+    pass_fds = (*popen_kwargs.pop("pass_fds", ()), write_fd)
+    listen_sock = _reserved.pop(port, None) if port is not None else None
+    if listen_sock is not None:
+        env[LISTEN_FDS_ENV] = str(listen_sock.fileno())
+        pass_fds = (*pass_fds, listen_sock.fileno())
+    try:
+        try:
+            proc = sp.Popen(cmd, env=env, pass_fds=pass_fds, **popen_kwargs)
+        finally:
+            os.close(write_fd)
+            if listen_sock is not None:
+                # the server holds its own copy now
+                listen_sock.close()
+        return proc, wait_ready(read_fd, timeout)
+    finally:
+        os.close(read_fd)
+
+
+def wait_ready(fd: int, timeout: float) -> Optional[int]:
+    """Reads "READY <port>" from fd; None on EOF (the server exited) or timeout."""
+    line = b""
+    end = time.monotonic() + timeout
+    while not line.endswith(b"\n"):
+        remaining = end - time.monotonic()
+        if remaining <= 0 or not select.select([fd], [], [], remaining)[0]:
+            return None
+        chunk = os.read(fd, 64)
+        if not chunk:
+            return None
+        line += chunk
+    fields = line.split()
+    if len(fields) != 2 or fields[0] != b"READY":
+        return None
+    return int(fields[1])
@@ -0,0 +1,85 @@
+#include "segel.h"
+#include "stats.h"
+
+static struct Threads_stats *g_stats = NULL;
+static int g_stats_threads = 0;
+static unsigned int g_generation = 0;
+
+void stats_init(int num_threads) {
+    size_t size = sizeof(struct Threads_stats) * (num_threads + 1);
+    int rc = posix_memalign((void **)&g_stats, CACHE_LINE, size);
+    if (rc != 0) {
+        posix_error(rc, "posix_memalign error");
+    }
+    memset(g_stats, 0, size);
+    for (int i = 0; i <= num_threads; i++) {
+        g_stats[i].id = i;
+    }
+    g_stats_threads = num_threads;
+}
+
+void stats_destroy(void) {
+    free(g_stats);
+    g_stats = NULL;
+    g_stats_threads = 0;
+}
+
+int stats_thread_count(void) {
+    return g_stats_threads;
+}
+
+threads_stats stats_get(int thread_id) {
+    return &g_stats[thread_id];
+}
+
+void stats_count(threads_stats t_stats, int *counter, int delta) {
+    unsigned int seq = t_stats->seq;
+    unsigned int generation = stats_generation();
+
+    // odd sequence: an update is in progress
+    __atomic_store_n(&t_stats->seq, seq + 1, __ATOMIC_RELAXED);
+    __atomic_thread_fence(__ATOMIC_RELEASE);
+    if (t_stats->generation != generation) {
+        // first update since a reset
+        __atomic_store_n(&t_stats->stat_req, 0, __ATOMIC_RELAXED);
+        __atomic_store_n(&t_stats->dynm_req, 0, __ATOMIC_RELAXED);
+        __atomic_store_n(&t_stats->post_req, 0, __ATOMIC_RELAXED);
+        __atomic_store_n(&t_stats->total_req, 0, __ATOMIC_RELAXED);
+        __atomic_store_n(&t_stats->generation, generation, __ATOMIC_RELAXED);
+    }
+    __atomic_store_n(counter, *counter + delta, __ATOMIC_RELAXED);
+    __atomic_store_n(&t_stats->seq, seq + 2, __ATOMIC_RELEASE);
+}
+
+void stats_snapshot(int thread_id, struct Threads_stats *out) {
+    threads_stats t_stats = &g_stats[thread_id];
+    unsigned int begin, end;
+
+    do {
+        begin = __atomic_load_n(&t_stats->seq, __ATOMIC_ACQUIRE);
+        out->id = t_stats->id;
+        out->stat_req = __atomic_load_n(&t_stats->stat_req, __ATOMIC_RELAXED);
+        out->dynm_req = __atomic_load_n(&t_stats->dynm_req, __ATOMIC_RELAXED);
+        out->post_req = __atomic_load_n(&t_stats->post_req, __ATOMIC_RELAXED);
+        out->total_req = __atomic_load_n(&t_stats->total_req, __ATOMIC_RELAXED);
+        out->generation = __atomic_load_n(&t_stats->generation, __ATOMIC_RELAXED);
+        __atomic_thread_fence(__ATOMIC_ACQUIRE);
+        end = __atomic_load_n(&t_stats->seq, __ATOMIC_RELAXED);
+    } while ((begin & 1) || begin != end);
+    out->seq = end;
+    if (out->generation != stats_generation()) {
+        // not updated since a reset
+        out->stat_req = out->dynm_req = out->post_req = out->total_req = 0;
+    }
+}
+
+void stats_reset(threads_stats self) {
+    __atomic_add_fetch(&g_generation, 1, __ATOMIC_RELEASE);
+    if (self) {
+        stats_count(self, &self->total_req, 0);
+    }
+}
+
+unsigned int stats_generation(void) {
+    return __atomic_load_n(&g_generation, __ATOMIC_ACQUIRE);
+}
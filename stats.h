@@ -0,0 +1,45 @@
+#ifndef SERVER_STATS_H
+#define SERVER_STATS_H
+
+#include "request.h"
+
+//
+// Global registry of per-thread statistics.
+//
+// The stats of all worker threads live in one cache-line-aligned array, one
+// line per thread, so workers never share a line. Each struct is written only
+// by its own worker; every update is bracketed by a sequence counter
+// (a seqlock), so readers on other threads get consistent snapshots without
+// taking a lock.
+//
+// stats_reset() zeroes all counters without writing to other threads' slots:
+// it starts a new generation, and each slot still stamped with an older one
+// reads as zero and is cleared by its owner on its next update.
+//
+
+// Allocates the stats of worker threads 1..num_threads
+void stats_init(int num_threads);
+
+// Frees the registry
+void stats_destroy(void);
+
+// Number of threads in the registry
+int stats_thread_count(void);
+
+// Returns the stats of a worker thread (ids start at 1)
+threads_stats stats_get(int thread_id);
+
+// Adds delta to one counter of t_stats; only the owning thread may call this
+void stats_count(threads_stats t_stats, int *counter, int delta);
+
+// Copies a consistent snapshot of a thread's stats into out
+void stats_snapshot(int thread_id, struct Threads_stats *out);
+
+// Zeroes the counters of every thread; self (the caller's own stats, or
+// NULL) is cleared right away
+void stats_reset(threads_stats self);
+
+// Number of stats_reset calls so far
+unsigned int stats_generation(void);
+
+#endif // SERVER_STATS_H
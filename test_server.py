@@ -49,13 +49,17 @@
 5. Run tests:
 
     - python3 -m pytest test_server.py -vv -s -x --ff --timeout 30
+    - or in parallel (python3 -m pip install pytest-xdist):
+      python3 -m pytest test_server.py -n auto --timeout 30
 
 ## Write your own tests
 
 > Note: If you do add your own tests, please share them :)
 
 The test framework automatically runs your server, sends requests, and parses the
-response headers.
+response headers. Servers are shared by all tests with the same threads, queue_size
+and args: they run with `--control`, and `POST /__reset` zeroes their statistics and
+log before each test.
 
 Each test is [parameterized](https://docs.pytest.org/en/stable/example/parametrize.html),
 they values in the parameters array are expected to be a dictionary of type
@@ -135,6 +139,7 @@ import asyncio
 import collections
 import os
 import pathlib
+import socket
 import subprocess as sp
 import textwrap
 import time
@@ -144,6 +149,8 @@ from itertools import repeat
 import httpx
 import pytest
 
+import server_process
+
 CGI_SPINFOR = 0.5
 ADD_LOG_SLEEP = 0.2
 
@@ -179,6 +186,9 @@ class ResponseParams(typing.TypedDict):
     queue_size: int
     """queue_size to pass to server"""
 
+    args: list[str]
+    """extra options to pass to server after queue_size, e.g. ["--trace"]"""
+
     stagger: float | None
     """seconds to sleep between messages in each batch, None means no sleep"""
 
@@ -215,6 +225,92 @@ class Responses(typing.NamedTuple):
     params: ResponseParams
     """original params that were used to get the responses"""
 
+    port: int
+    """port the server is listening on, for tests that talk to it directly"""
+
+
+class ServerPool:
+    """
+    Servers kept running across tests, one per (threads, queue_size, args).
+
+    A new server listens on a port of the kernel's choosing and is handed out
+    as soon as it reports that it is serving (see server_process.py), so test
+    processes never compete for ports and can run in parallel (pytest -n).
+    Servers are reset through POST /__reset before they are handed out again;
+    one that died or stopped answering is replaced.
+
+    Only this file uses the pool. The suites in tests/ still start a Server
+    per test: they read its stdout and stderr through communicate() and
+    expect the counters of a server that has served nothing else.
+
+    What the pool saves is one server start per test. The time spent
+    waiting on slow CGI requests and log writes does not change, and it is
+    most of the run.
+    """
+
+    MAX_SERVERS = 8
+    """least recently used servers beyond this many are stopped"""
+
+    def __init__(self):
+        self.servers: collections.OrderedDict[tuple, tuple[sp.Popen, int]] = (
+            collections.OrderedDict()
+        )
+
+    def acquire(self, threads: int, queue_size: int, args: list[str]) -> int:
+        """Returns the port of a freshly reset server with this configuration."""
+        key = (threads, queue_size, tuple(args))
+        entry = self.servers.pop(key, None)
+        if entry is not None:
+            proc, port = entry
+            if proc.poll() is None and self._reset(port, timeout=2):
+                self.servers[key] = entry
+                return port
+            self._stop(proc)
+        while len(self.servers) >= self.MAX_SERVERS:
+            self._stop(self.servers.popitem(last=False)[1][0])
+
+        cmd = [
+            *os.environ.get("SERVER_CMD", "./server").split(" "),
+            "0",
+            str(threads),
+            str(queue_size),
+            *args,
+            "--control",
+        ]
+        print(f"Running cmd: {cmd}")
+        proc, port = server_process.start(cmd, cwd=pathlib.Path(__file__).parent)
+        if port is None:
+            self._stop(proc)
+            raise RuntimeError(f"server did not start: {cmd}")
+        self.servers[key] = (proc, port)
+        return port
+
+    def close(self) -> None:
+        while self.servers:
+            self._stop(self.servers.popitem()[1][0])
+
+    @staticmethod
+    def _reset(port: int, timeout: float) -> bool:
+        try:
+            response = httpx.post(f"http://localhost:{port}/__reset", timeout=timeout)
+        except httpx.TransportError:
+            return False
+        return response.status_code == 200
+
+    @staticmethod
+    def _stop(proc: sp.Popen) -> None:
+        proc.kill()
+        proc.wait()
+
+
+@pytest.fixture(scope="session")
+def server_pool() -> typing.Generator[ServerPool, None, None]:
+    pool = ServerPool()
+    try:
+        yield pool
+    finally:
+        pool.close()
+
 
 class TestServer:
     STAGGER = 0.01
@@ -233,37 +329,19 @@ class TestServer:
         )
 
     @pytest.fixture
-    def responses(self, request) -> typing.Generator[Responses, None, None]:
-        port = 8888
-
+    def responses(self, request, server_pool: ServerPool) -> Responses:
         params: ResponseParams = {
             "threads": request.param["threads"],
             "queue_size": request.param["queue_size"],
+            "args": request.param.get("args", []),
             "batches": request.param["batches"],
             "stagger": request.param.get("stagger", self.STAGGER),
             "warmup": request.param.get("warmup", []),
         }
 
-        cmd = [
-            *os.environ.get("SERVER_CMD", "./server").split(" "),
-            str(port),
-            str(params["threads"]),
-            str(params["queue_size"]),
-        ]
-        print(f"Running cmd: {cmd}")
-
-        proc = sp.Popen(
-            cmd,
-            cwd=pathlib.Path(__file__).parent,
-        )
-
-        time.sleep(0.5)
-        try:
-            headers = asyncio.run(self._send_cgi_requests(port, params))
-            yield Responses(headers, params)
-        finally:
-            proc.kill()
-            proc.wait()
+        port = server_pool.acquire(params["threads"], params["queue_size"], params["args"])
+        headers = asyncio.run(self._send_cgi_requests(port, params))
+        return Responses(headers, params, port)
 
     async def _send_cgi_requests(
         self, port: int, params: ResponseParams
@@ -498,6 +576,18 @@ class TestServer:
                     ]
                 ],
             ),
+            dict(
+                threads=4,
+                queue_size=8,
+                args=["--acceptors=3"],
+                batches=[
+                    [
+                        *repeat(dict(method="GET", url="home.html"), 5),
+                        *repeat(dict(method="GET", url="output.cgi"), 3),
+                        *repeat(dict(method="POST"), 4),
+                    ]
+                ],
+            ),
         ],
         indirect=["responses"],
     )
@@ -511,25 +601,18 @@ class TestServer:
             for msg in responses.params["batches"][0]
         )
 
-        actual_static = sum(
-            dict(
-                (r.StatThreadId, r.StatThreadStatic) for r in responses.headers
-            ).values()
-        )
-        actual_dynamic = sum(
-            dict(
-                (r.StatThreadId, r.StatThreadDynamic) for r in responses.headers
-            ).values()
-        )
-        actual_post = sum(
-            dict((r.StatThreadId, r.StatThreadPost) for r in responses.headers).values()
-        )
+        # with several acceptors responses can complete out of order, so use
+        # the latest (highest count) response of every thread
+        latest: dict[int, ResponseStats] = {}
+        for r in responses.headers:
+            current = latest.get(r.StatThreadId)
+            if current is None or r.StatThreadCount > current.StatThreadCount:
+                latest[r.StatThreadId] = r
 
-        actual_total_count = sum(
-            dict(
-                (r.StatThreadId, r.StatThreadCount) for r in responses.headers
-            ).values()
-        )
+        actual_static = sum(r.StatThreadStatic for r in latest.values())
+        actual_dynamic = sum(r.StatThreadDynamic for r in latest.values())
+        actual_post = sum(r.StatThreadPost for r in latest.values())
+        actual_total_count = sum(r.StatThreadCount for r in latest.values())
 
         assert expected["static"] == actual_static
         assert expected["dynamic"] == actual_dynamic
@@ -752,3 +835,195 @@ class TestServer:
 
         response = responses.headers[0].response
         assert "Content-Length" not in response.headers, (help_msg, response.headers)
+
+    @pytest.mark.parametrize(
+        "responses",
+        [
+            dict(threads=1, queue_size=1, batches=[]),
+            dict(threads=1, queue_size=1, args=["--stack-size=64K"], batches=[]),
+        ],
+        indirect=["responses"],
+    )
+    def test_pipelined_requests(self, responses: Responses):
+        """
+        Requests pipelined on one connection are answered in order, each one
+        counted by the thread that handled the connection.
+        """
+        with socket.create_connection(("localhost", responses.port)) as sock:
+            sock.sendall(
+                b"GET /home.html HTTP/1.1\r\nHost: localhost\r\n\r\n"
+                b"POST / HTTP/1.1\r\nContent-Length: 3\r\n\r\nabc"
+                b"GET /missing.html HTTP/1.1\r\n\r\n"
+            )
+            sock.shutdown(socket.SHUT_WR)
+            data = b""
+            while chunk := sock.recv(65536):
+                data += chunk
+
+        text = data.decode(errors="replace")
+        statuses = [line for line in text.splitlines() if line.startswith("HTTP/1.0")]
+        counts = [
+            int(line.split("::")[1])
+            for line in text.splitlines()
+            if line.startswith("Stat-Thread-Count")
+        ]
+
+        assert statuses == [
+            "HTTP/1.0 200 OK",
+            "HTTP/1.0 200 OK",
+            "HTTP/1.0 404 Not found",
+        ]
+        # the POST body carries the log entry of the first request
+        assert counts == [1, 2, 1, 3]
+
+    @pytest.mark.parametrize(
+        "responses",
+        [
+            dict(
+                threads=2,
+                queue_size=4,
+                batches=[
+                    [
+                        dict(method="GET", url="home.html"),
+                        dict(method="GET", url="output.cgi"),
+                        dict(method="POST"),
+                    ]
+                ],
+            ),
+        ],
+        indirect=["responses"],
+    )
+    def test_metrics_endpoint(self, responses: Responses):
+        response = httpx.get(f"http://localhost:{responses.port}/__metrics")
+        assert response.status_code == 200
+
+        samples = dict(
+            line.rsplit(" ", 1)
+            for line in response.text.splitlines()
+            if line and not line.startswith("#")
+        )
+
+        # the metrics request itself is counted before the body is rendered
+        assert samples["oshw3_requests_total"] == "4"
+        assert samples["oshw3_static_requests_total"] == "1"
+        assert samples["oshw3_dynamic_requests_total"] == "1"
+        assert samples["oshw3_post_requests_total"] == "1"
+        assert samples["oshw3_queue_capacity"] == "4"
+        assert samples['oshw3_queue_wait_seconds_bucket{le="+Inf"}'] == "3"
+        assert samples['oshw3_service_seconds_bucket{le="+Inf"}'] == "3"
+        assert int(samples["oshw3_log_bytes"]) > 0
+        assert any(
+            int(value) > 0
+            for name, value in samples.items()
+            if name.startswith("oshw3_arena_high_water_bytes")
+        )
+        assert samples["oshw3_arena_overflows_total"] == "0"
+
+    @pytest.mark.parametrize(
+        "responses",
+        [
+            dict(
+                threads=2,
+                queue_size=2,
+                args=["--trace"],
+                batches=[[dict(method="GET", url="home.html")]],
+            ),
+        ],
+        indirect=["responses"],
+    )
+    def test_trace_endpoint(self, responses: Responses):
+        response = httpx.get(f"http://localhost:{responses.port}/__trace")
+        assert response.status_code == 200
+
+        events = response.json()["traceEvents"]
+        phases = {e["name"] for e in events if e["ph"] == "X"}
+
+        assert {"accept", "queue_wait", "parse", "stat", "open_mmap", "write"} <= phases
+        assert all(e["dur"] >= 0 for e in events if e["ph"] == "X")
+
+    @pytest.mark.parametrize(
+        "responses",
+        [
+            dict(
+                threads=2,
+                queue_size=2,
+                batches=[[dict(method="GET", url="home.html"), dict(method="POST")]],
+            ),
+        ],
+        indirect=["responses"],
+    )
+    def test_reset_endpoint(self, responses: Responses):
+        base_url = f"http://localhost:{responses.port}"
+        reset = httpx.post(f"{base_url}/__reset")
+        assert reset.status_code == 200
+        assert self.parse_headers(reset).StatThreadCount == 0
+
+        # the log is empty again, and only requests after the reset are counted
+        assert httpx.post(base_url).text == ""
+        metrics = httpx.get(f"{base_url}/__metrics").text
+        assert "oshw3_requests_total 2\n" in metrics
+        assert "oshw3_static_requests_total 0\n" in metrics
+        assert 'oshw3_service_seconds_bucket{le="+Inf"} 1\n' in metrics
+
+    def test_sigterm_drains_in_flight_requests(self):
+        proc, port = server_process.start(
+            [*os.environ.get("SERVER_CMD", "./server").split(" "), "0", "1", "4"],
+            cwd=pathlib.Path(__file__).parent,
+        )
+        assert port is not None
+
+        async def send_and_terminate() -> list[httpx.Response]:
+            async with httpx.AsyncClient(base_url=f"http://localhost:{port}") as session:
+                requests = []
+                for _ in range(2):
+                    requests.append(
+                        asyncio.create_task(session.get("output.cgi", timeout=None))
+                    )
+                    await asyncio.sleep(self.STAGGER)
+                await asyncio.sleep(CGI_SPINFOR / 2)
+                proc.terminate()
+                return [await r for r in requests]
+
+        try:
+            responses = asyncio.run(send_and_terminate())
+            assert [r.status_code for r in responses] == [200, 200]
+            assert proc.wait(timeout=CGI_SPINFOR * 4) == 0
+        finally:
+            proc.kill()
+            proc.wait()
+
+    @pytest.mark.parametrize(
+        "responses",
+        [
+            dict(threads=1, queue_size=1, batches=[]),
+            dict(threads=1, queue_size=1, args=["--preload"], batches=[]),
+        ],
+        indirect=["responses"],
+    )
+    def test_path_cache_follows_file_changes(self, responses: Responses):
+        # a directory created after startup must be watched as well
+        # named after the server, so parallel runs of this test do not collide
+        directory = pathlib.Path(__file__).parent / "public" / f"path_cache_test_{responses.port}"
+        path = directory / "file.txt"
+        url = f"http://localhost:{responses.port}/{directory.name}/{path.name}"
+        try:
+            directory.mkdir()
+            time.sleep(0.1)
+            path.write_text("first")
+            assert httpx.get(url).text == "first"
+            assert httpx.get(url).text == "first"
+
+            path.write_text("second version")
+            time.sleep(0.1)
+            assert httpx.get(url).text == "second version"
+
+            path.unlink()
+            time.sleep(0.1)
+            assert httpx.get(url).status_code == 404
+        finally:
+            path.unlink(missing_ok=True)
+            directory.rmdir()
+
+        metrics = httpx.get(f"http://localhost:{responses.port}/__metrics").text
+        assert "oshw3_path_cache_hits_total 1\n" in metrics
+        assert "oshw3_path_cache_misses_total 3\n" in metrics
@@ -1,7 +1,11 @@
 #!/usr/bin/env python3
-import os, sys, time, signal, socket, random, subprocess, threading, re
+import os, sys, signal, random, subprocess
 from collections import namedtuple, Counter
 
+import response_stats
+import server_process
+from http_client import Client
+
 # ───────── pretty colours ─────────
 try:
     from colorama import init, Fore, Style
@@ -12,62 +16,30 @@ except ImportError:
     GREEN = RED = YEL = DIM = RST = ""
 
 SERVER_BIN = "./server"
-CLIENT_BIN = "./client"
-if not (os.path.isfile(SERVER_BIN) and os.path.isfile(CLIENT_BIN)):
-    sys.exit(f"{RED}Error: ./server or ./client not found{RST}")
-
-BASE_PORT = 9000
-_used = set()
-
+if not os.path.isfile(SERVER_BIN):
+    sys.exit(f"{RED}Error: ./server not found{RST}")
 
 def next_port() -> str:
-    while True:
-        p = random.randint(BASE_PORT, 60000)
-        if p not in _used:
-            _used.add(p)
-            return str(p)
-
-
-def wait_for_port(port: str, timeout=3.0) -> bool:
-    """Check if a port is accepting connections"""
-    end_time = time.time() + timeout
-    while time.time() < end_time:
-        try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-                sock.settimeout(1.0)
-                result = sock.connect_ex(('localhost', int(port)))
-                if result == 0:
-                    print(f"{YEL}[*] Port {port} is accepting connections{RST}")
-                    return True
-        except Exception:
-            pass
-        time.sleep(0.1)
-    return False
+    """A free port, already bound for the next start_server"""
+    return str(server_process.reserve_port())
 
 
 def start_server(port, pool, queue):
     print(f"{YEL}[*] Starting server on port {port} with pool={pool}, queue={queue}{RST}")
     print(f"[DEBUG] Launching server with args: {SERVER_BIN} {port} {pool} {queue}")
-    proc = subprocess.Popen(
+    proc, ready_port = server_process.start(
         [SERVER_BIN, port, str(pool), str(queue)],
+        timeout=3.0,
+        port=int(port),
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
         preexec_fn=os.setsid
     )
-    time.sleep(0.5)
-    proc.poll()
-    if proc.returncode is not None:
+    if proc.poll() is not None:
         print(f"{RED}[!] Server exited early! Return code: {proc.returncode}{RST}")
-        err = proc.stderr.read().decode().strip()
-        print(f"{RED}[!] Server stderr:\n{err}{RST}")
-    ready = wait_for_port(port, 3.0)
-    if not ready:
+    elif ready_port is None:
         print(f"{RED}[!] Server did not bind to port {port} in time.{RST}")
-        err = proc.stderr.read().decode().strip()
-        print(f"{RED}[!] Server stderr:\n{err}{RST}")
-    elif proc.poll() is not None:
-        print(f"{RED}[!] Server crashed before handling any client!{RST}")
-    return proc, ready
+    return proc, ready_port is not None and proc.poll() is None
 
 
 def kill_server(proc):
@@ -78,101 +50,20 @@ def kill_server(proc):
         proc.kill()
 
 
-def run_one_client(host, port, file_, method, bucket, idx):
-    cp = subprocess.run([CLIENT_BIN, host, port, file_, method],
-                        capture_output=True, text=True, timeout=10)
-    bucket[idx] = cp
-
-
 def run_clients(reqs, port):
-    outs = [None] * len(reqs)
-    th = []
-
-    def run_and_log(i, fn, m):
-        print(f"{DIM}    [*] Launching client {i}: {m} {fn}{RST}")
-        run_one_client("localhost", port, fn, m, outs, i)
-
     for i, (fn, m) in enumerate(reqs):
-        t = threading.Thread(target=run_and_log, args=(i, fn, m), daemon=True)
-        th.append(t)
-        t.start()
-    for t in th:
-        t.join()
-    return outs
+        print(f"{DIM}    [*] Launching client {i}: {m} {fn}{RST}")
+    return Client("localhost", port, timeout=10).run(reqs)
 
 
 def parse_stats(output):
     """Parse statistics from client output"""
-    stats = {}
-    lines = output.splitlines()
-
-    for line in lines:
-        if "Stat-Req-Arrival::" in line:
-            match = re.search(r'Stat-Req-Arrival:: ([\d.]+)', line)
-            if match:
-                stats['arrival'] = float(match.group(1))
-        elif "Stat-Req-Dispatch::" in line:
-            match = re.search(r'Stat-Req-Dispatch:: ([\d.]+)', line)
-            if match:
-                stats['dispatch'] = float(match.group(1))
-        elif "Stat-Thread-Id::" in line:
-            match = re.search(r'Stat-Thread-Id:: (\d+)', line)
-            if match:
-                stats['thread_id'] = int(match.group(1))
-        elif "Stat-Thread-Count::" in line:
-            match = re.search(r'Stat-Thread-Count:: (\d+)', line)
-            if match:
-                stats['thread_count'] = int(match.group(1))
-        elif "Stat-Thread-Static::" in line:
-            match = re.search(r'Stat-Thread-Static:: (\d+)', line)
-            if match:
-                stats['thread_static'] = int(match.group(1))
-        elif "Stat-Thread-Dynamic::" in line:
-            match = re.search(r'Stat-Thread-Dynamic:: (\d+)', line)
-            if match:
-                stats['thread_dynamic'] = int(match.group(1))
-        elif "Stat-Thread-Post::" in line:
-            match = re.search(r'Stat-Thread-Post:: (\d+)', line)
-            if match:
-                stats['thread_post'] = int(match.group(1))
-
-    return stats
+    return response_stats.parse(output).as_dict()
 
 
 def find_http_status(output):
     """Find HTTP status line in client output - more robust parsing"""
-    lines = output.splitlines()
-
-    # Look for HTTP status in different formats
-    for line in lines:
-        # Check for "Header: HTTP/..." format
-        if line.startswith("Header: HTTP/"):
-            status_line = line.replace("Header: ", "").strip()
-            if "200" in status_line:
-                return "200"
-            elif "404" in status_line:
-                return "404"
-            elif "400" in status_line or "405" in status_line:
-                return "error"
-            elif "403" in status_line:
-                return "403"
-            elif "501" in status_line:
-                return "501"
-
-        # Check for direct HTTP status line
-        elif line.startswith("HTTP/"):
-            if "200" in line:
-                return "200"
-            elif "404" in line:
-                return "404"
-            elif "400" in line or "405" in line:
-                return "error"
-            elif "403" in line:
-                return "403"
-            elif "501" in line:
-                return "501"
-
-    return None
+    return response_stats.parse(output).status_name
 
 
 def validate_response(cp, request_type, expected_pool_size, allow_404=False):
@@ -0,0 +1,203 @@
+"""
+Asyncio load generator on top of http_client.Client.fetch.
+
+Every request runs as a coroutine on one event loop, so thousands of them
+can be in flight at once without a thread (or a requests session) each.
+Requests are started at exact offsets from a common start time, so a
+stagger schedule is kept no matter how slowly earlier requests complete.
+
+    results = asyncio.run(run_schedule(port, stagger(["/output.cgi?1"] * 5, 0.1)))
+
+That makes it an open-loop generator: constant() and poisson() build
+schedules at a given offered rate, and Result.latency is measured from the
+time a request was due rather than from when it actually went out, so a
+server that falls behind shows its queueing delay instead of slowing the
+load down (coordinated omission).
+
+From synchronous tests, LoadGenerator runs the loop in a background thread
+and hands out futures resolving to requests.Response objects, see
+utils.spawn_clients.
+"""
+
+import asyncio
+import atexit
+import functools
+import os
+import random
+import sys
+import threading
+import time
+import typing
+from concurrent.futures import Future
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from http_client import Client, Response  # noqa: E402
+
+HOST = "localhost"
+
+
+class Result(Response):
+    """One request as seen by the load generator."""
+
+    __slots__ = ("due",)
+
+    def __init__(self, path: str, method: str = "GET"):
+        super().__init__(path, method)
+        self.due = 0.0
+        """time.monotonic() the schedule started the request at, 0 if unscheduled"""
+
+    @property
+    def latency(self) -> float:
+        """Seconds from when the request was due (or sent, if unscheduled) to its response"""
+        return self.done - (self.due or self.sent)
+
+    @property
+    def arrival(self) -> float:
+        """Stat-Req-Arrival reported by the server"""
+        return float(self.headers["Stat-Req-Arrival"][2:])
+
+    @property
+    def dispatch(self) -> float:
+        """Stat-Req-Dispatch reported by the server"""
+        return float(self.headers["Stat-Req-Dispatch"][2:])
+
+    def to_response(self) -> requests.Response:
+        """The result as a requests.Response, raising ConnectionError like requests would."""
+        if self.error is not None:
+            raise requests.exceptions.ConnectionError(self.error)
+        response = requests.Response()
+        response.status_code = self.status
+        response.reason = self.reason
+        response.headers = CaseInsensitiveDict(self.headers)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.url = f"http://{HOST}{self.path}"
+        response._content = self.body
+        return response
+
+
+def stagger(paths: typing.Iterable[str], interval: float) -> list[tuple[float, str]]:
+    """A schedule starting one request every `interval` seconds."""
+    return [(i * interval, path) for i, path in enumerate(paths)]
+
+
+def constant(rate: float, duration: float, path: str) -> list[tuple[float, str]]:
+    """An open-loop schedule of `rate` requests per second for `duration` seconds."""
+    return [(i / rate, path) for i in range(int(rate * duration))]
+
+
+def poisson(rate: float, duration: float, path: str,
+            seed: typing.Optional[int] = None) -> list[tuple[float, str]]:
+    """Like constant(), with exponentially distributed gaps between requests."""
+    rng = random.Random(seed)
+    schedule = []
+    offset = rng.expovariate(rate)
+    while offset < duration:
+        schedule.append((offset, path))
+        offset += rng.expovariate(rate)
+    return schedule
+
+
+@functools.lru_cache(maxsize=None)
+def _client(port: int, timeout: typing.Optional[float]) -> Client:
+    # resolves HOST once, rather than blocking the loop on it for every request
+    return Client(HOST, port, timeout)
+
+
+async def fetch(port: int, path: str, method: str = "GET", body: bytes = b"",
+                timeout: typing.Optional[float] = None) -> Result:
+    """
+    One request on a fresh connection, read until the server closes it.
+
+    Errors are recorded in Result.error rather than raised; an empty response
+    (the server dropped the connection) counts as an error.
+    """
+    return await _client(port, timeout).fetch(path, method, body, Result(path, method))
+
+
+async def run_schedule(port: int, schedule: typing.Iterable[tuple[float, str]],
+                       method: str = "GET",
+                       timeout: typing.Optional[float] = None) -> list[Result]:
+    """Starts request (offset, path) `offset` seconds after the first one; returns results in order."""
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+
+    async def at(offset: float, path: str) -> Result:
+        await asyncio.sleep(start + offset - loop.time())
+        result = await fetch(port, path, method, timeout=timeout)
+        # loop.time() is time.monotonic() for the default event loop
+        result.due = start + offset
+        return result
+
+    return await asyncio.gather(*(at(offset, path) for offset, path in schedule))
+
+
+class LoadGenerator:
+    """Runs an event loop in a daemon thread, for use from synchronous code."""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    def submit(self, port: int, path: str, at: typing.Optional[float] = None,
+               method: str = "GET", timeout: typing.Optional[float] = None) -> "Future[Result]":
+        """Starts a request at time.monotonic() == `at` (now if None)."""
+
+        async def run() -> Result:
+            if at is None:
+                return await fetch(port, path, method, timeout=timeout)
+            await asyncio.sleep(at - time.monotonic())
+            result = await fetch(port, path, method, timeout=timeout)
+            result.due = at
+            return result
+
+        return asyncio.run_coroutine_threadsafe(run(), self.loop)
+
+    def close(self) -> None:
+        """Cancels the requests still in flight, then stops and closes the loop."""
+        if self.loop.is_closed():
+            return
+
+        async def cancel_all() -> None:
+            tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        asyncio.run_coroutine_threadsafe(cancel_all(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+
+class PendingResponse:
+    """Future-like handle: result() returns a requests.Response or raises ConnectionError."""
+
+    def __init__(self, future: "Future[Result]"):
+        self.future = future
+
+    def result(self, timeout: typing.Optional[float] = None) -> requests.Response:
+        return self.future.result(timeout).to_response()
+
+    def done(self) -> bool:
+        return self.future.done()
+
+    def close(self) -> None:
+        self.future.cancel()
+
+
+_generator: typing.Optional[LoadGenerator] = None
+
+
+def generator() -> LoadGenerator:
+    """The shared LoadGenerator of this process."""
+    global _generator
+    if _generator is None:
+        _generator = LoadGenerator()
+        # its thread is a daemon; without this, pending requests are destroyed at exit
+        atexit.register(_generator.close)
+    return _generator
@@ -1,11 +1,17 @@
 from asyncio.subprocess import PIPE
 from multiprocessing.dummy import current_process
-from posixpath import basename
-from subprocess import Popen, PIPE
+from subprocess import Popen, PIPE, TimeoutExpired
 import sys
 import os
 import pytest
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import server_process
+
+# seconds a server may take to report it is ready, and to drain and exit on SIGTERM
+START_TIMEOUT = 5.0
+EXIT_TIMEOUT = 5.0
+
 
 class Server:
     def __init__(self, path, port, threads, queue_size):
@@ -15,12 +21,29 @@ class Server:
         self.queue_size = str(queue_size)
 
     def __enter__(self):
-        self.process = Popen([self.path, self.port, self.threads, self.queue_size], stdout=PIPE, stderr=PIPE, cwd="..", bufsize=0, encoding=sys.getdefaultencoding())
+        # serves on the socket server_port reserved, and is ready once this returns
+        self.process, ready_port = server_process.start(
+            [self.path, self.port, self.threads, self.queue_size], timeout=START_TIMEOUT, port=int(self.port),
+            stdout=PIPE, stderr=PIPE, cwd="..", bufsize=0, encoding=sys.getdefaultencoding())
+        if ready_port is None and self.process.poll() is None:
+            self.process.kill()
+            self.process.communicate()
+            raise RuntimeError(f"server did not get ready within {START_TIMEOUT}s")
         return self.process
 
     def __exit__(self, exc_type, exc_value, exc_traceback):
+        # SIGTERM drains the queue first; communicate() reaps the process and keeps
+        # its output for tests that call server.communicate() after the block
         self.process.terminate()
+        try:
+            self.process.communicate(timeout=EXIT_TIMEOUT)
+        except TimeoutExpired:
+            self.process.kill()
+            self.process.communicate()
 
 @pytest.fixture
-def server_port(request):
-    return 8000 + (abs(hash(basename(request.node.fspath) + request.node.name)) % 20000)
+def server_port():
+    """A free port chosen by the kernel, bound until a Server takes it over, so parallel tests never collide"""
+    port = server_process.reserve_port()
+    yield port
+    server_process.release_port(port)
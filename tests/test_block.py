@@ -10,7 +10,6 @@ from requests_futures.sessions import FuturesSession
 
 def test_sanity(server_port):
     with Server("./server", server_port, 1, 1) as server:
-        sleep(0.1)
         with FuturesSession() as session1:
             future1 = session1.get(f"http://localhost:{server_port}/output.cgi?1")
             sleep(0.1)
@@ -43,7 +42,6 @@ def test_sanity(server_port):
                          ])
 def test_load(threads, queue, amount, dispatches, server_port):
     with Server("./server", server_port, threads, queue) as server:
-        sleep(0.1)
         clients = spawn_clients(amount, server_port)
         for i in range(amount):
             response = clients[i][1].result()
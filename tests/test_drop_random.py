@@ -11,7 +11,6 @@ from utils import spawn_clients, generate_dynamic_headers, validate_out, validat
 
 def test_sanity(server_port):
     with Server("./server", server_port, 1, 1, "random") as server:
-        sleep(0.1)
         with FuturesSession() as session1:
             future1 = session1.get(
                 f"http://localhost:{server_port}/output.cgi?1")
@@ -43,7 +42,6 @@ def test_sanity(server_port):
                          ])
 def test_load(threads, queue, amount, server_port):
     with Server("./server", server_port, threads, queue, "random") as server:
-        sleep(0.1)
         clients = spawn_clients(amount, server_port)
         count = 0
         connections = []
@@ -85,7 +83,6 @@ def test_load(threads, queue, amount, server_port):
                          ])
 def test_available_after_load(threads, queue, amount_before, amount_after, server_port):
     with Server("./server", server_port, threads, queue, "random") as server:
-        sleep(0.1)
         clients = spawn_clients(amount_before, server_port)
         count_before = 0
         connections_before = []
@@ -1,6 +1,5 @@
 import os
 from signal import SIGINT
-from time import sleep
 import pytest
 from requests import Session, exceptions
 from requests_futures.sessions import FuturesSession
@@ -12,7 +11,6 @@ from utils import generate_error_headers, validate_out, validate_response_err
 
 def test_not_found(server_port):
     with Server("./server", server_port, 4, 8) as server:
-        sleep(0.1)
         with Session() as session:
             response = session.get(
                 f"http://localhost:{server_port}/not_exist.html")
@@ -53,7 +51,6 @@ def forbidden_file():
 
 def test_forbidden_file_static(server_port, forbidden_file):
     with Server("./server", server_port, 4, 8) as server:
-        sleep(0.1)
         with Session() as session:
             response = session.get(
                 f"http://localhost:{server_port}/{forbidden_file}")
@@ -75,7 +72,6 @@ def forbidden_folder():
 
 def test_forbidden_folder_static(server_port, forbidden_folder):
     with Server("./server", server_port, 4, 8) as server:
-        sleep(0.1)
         with Session() as session:
             response = session.get(
                 f"http://localhost:{server_port}/{forbidden_folder}")
@@ -99,7 +95,6 @@ def forbidden_file_dynamic():
 
 def test_forbidden_file_dynamic(server_port, forbidden_file_dynamic):
     with Server("./server", server_port, 4, 8) as server:
-        sleep(0.1)
         with Session() as session:
             response = session.get(
                 f"http://localhost:{server_port}/{forbidden_file_dynamic}")
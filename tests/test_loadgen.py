@@ -0,0 +1,78 @@
+import asyncio
+import time
+
+import pytest
+import requests
+
+from server import Server, server_port
+from loadgen import LoadGenerator, Result, constant, fetch, poisson, run_schedule
+
+
+def test_result(server_port):
+    with Server("./server", server_port, 2, 4):
+        result = asyncio.run(fetch(server_port, "/home.html"))
+        assert result.ok
+        assert result.status == 200
+        assert result.sent <= result.first_byte <= result.done
+        # unscheduled: latency runs from when the request was sent
+        assert result.due == 0.0
+        assert result.latency == result.done - result.sent
+        assert result.arrival > 0
+        assert result.dispatch >= 0
+        response = result.to_response()
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "text/html"
+        assert response.content == result.body
+
+
+def test_result_error():
+    result = Result("/home.html")
+    result.error = ConnectionResetError("reset")
+    assert not result.ok
+    with pytest.raises(requests.exceptions.ConnectionError):
+        result.to_response()
+
+
+def test_constant():
+    schedule = constant(100, 0.5, "/home.html")
+    assert schedule == [(i / 100, "/home.html") for i in range(50)]
+
+
+def test_poisson():
+    schedule = poisson(100, 2.0, "/home.html", seed=1)
+    offsets = [offset for offset, _ in schedule]
+    assert offsets == sorted(offsets)
+    assert 0 < offsets[0] and offsets[-1] < 2.0
+    # 200 arrivals expected; the count is Poisson distributed around that
+    assert 140 < len(schedule) < 260
+    assert poisson(100, 2.0, "/home.html", seed=1) == schedule
+
+
+def test_run_schedule(server_port):
+    schedule = constant(50, 0.2, "/home.html")
+    with Server("./server", server_port, 2, 16):
+        results = asyncio.run(run_schedule(server_port, schedule))
+    assert [result.path for result in results] == [path for _, path in schedule]
+    assert all(result.ok and result.status == 200 for result in results)
+    start = results[0].due
+    for result, (offset, _) in zip(results, schedule):
+        assert result.due == pytest.approx(start + offset)
+        # never sent ahead of schedule, and latency counts from the due time
+        assert result.sent >= result.due
+        assert result.latency == result.done - result.due
+
+
+def test_close_cancels_in_flight(server_port):
+    with Server("./server", server_port, 2, 4):
+        load = LoadGenerator()
+        # still running on the server, and not even due yet
+        running = load.submit(server_port, "/output.cgi?1")
+        waiting = load.submit(server_port, "/home.html", at=time.monotonic() + 30)
+        time.sleep(0.2)
+        assert not running.done() and not waiting.done()
+        start = time.monotonic()
+        load.close()
+        assert time.monotonic() - start < 0.5
+        assert running.cancelled() and waiting.cancelled()
+        assert load.loop.is_closed()
+        load.close()  # closing twice is harmless
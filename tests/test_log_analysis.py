@@ -0,0 +1,57 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from log_analysis import analyze, parse_log
+
+
+def entry(arrival, dispatch, thread_id, count, static=0, dynamic=0, post=0):
+    """One Stat-* block the way append_stats in request.c writes it"""
+    return (f"Stat-Req-Arrival:: {arrival}\r\n"
+            f"Stat-Req-Dispatch:: {dispatch}\r\n"
+            f"Stat-Thread-Id:: {thread_id}\r\n"
+            f"Stat-Thread-Count:: {count}\r\n"
+            f"Stat-Thread-Static:: {static}\r\n"
+            f"Stat-Thread-Dynamic:: {dynamic}\r\n"
+            f"Stat-Thread-Post:: {post}\r\n\r\n").encode()
+
+
+LOG = (entry("10.000000", "0.100000", 1, 1, static=1)
+       + entry("10.500000", "0.200000", 1, 2, static=1, dynamic=1)
+       + entry("11.000000", "0.500000", 2, 1, post=1)
+       # cut off mid-entry, as a log being written to can be
+       + entry("12.000000", "0.100000", 2, 2)[:60])
+
+
+def test_parse_log():
+    entries = parse_log(LOG)
+    assert len(entries) == 3
+    assert entries["arrival"].tolist() == [10.0, 10.5, 11.0]
+    assert entries["dispatch"].tolist() == [0.1, 0.2, 0.5]
+    assert entries["thread_id"].tolist() == [1, 1, 2]
+    assert entries["thread_count"].tolist() == [1, 2, 1]
+    assert entries["thread_dynamic"].tolist() == [0, 1, 0]
+    assert entries["thread_post"].tolist() == [0, 0, 1]
+
+
+def test_analyze():
+    analysis = analyze(parse_log(LOG), threads=3)
+    assert analysis.entries == 3
+    # from the first arrival, 10.0, to the last dispatch, 11.0 + 0.5
+    assert analysis.span == pytest.approx(1.5)
+    assert analysis.throughput == pytest.approx(2.0)
+    # thread 3 served nothing and still counts
+    assert analysis.thread_requests.tolist() == [2, 1, 0]
+    assert analysis.thread_throughput == pytest.approx(np.array([4 / 3, 2 / 3, 0.0]))
+    assert analysis.queue_wait[50] == pytest.approx(0.2)
+    assert analysis.imbalance == pytest.approx(2.0)
+    assert analysis.cv == pytest.approx(np.std([2, 1, 0]))
+
+
+@pytest.mark.parametrize("log", [b"", entry("10.000000", "0.100000", 1, 1)[:60]])
+def test_analyze_no_complete_entries(log):
+    with pytest.raises(ValueError, match="no complete entries"):
+        analyze(parse_log(log))
@@ -1,6 +1,5 @@
 import os
 from signal import SIGINT
-from time import sleep
 import pytest
 
 from server import Server, server_port
@@ -19,7 +18,6 @@ def gif_file():
 
 def test_gif(server_port, gif_file):
     with Server("./server", server_port, 4, 8) as server:
-        sleep(0.1)
         with FuturesSession() as session:
             future = session.get(f"http://localhost:{server_port}/{gif_file}")
             response = future.result()
@@ -44,7 +42,6 @@ def jpg_file():
 
 def test_jpg(server_port, jpg_file):
     with Server("./server", server_port, 4, 8) as server:
-        sleep(0.1)
         with FuturesSession() as session:
             future = session.get(f"http://localhost:{server_port}/{jpg_file}")
             response = future.result()
@@ -68,7 +65,6 @@ def plain_file():
 
 def test_plain(server_port, plain_file):
     with Server("./server", server_port, 4, 8) as server:
-        sleep(0.1)
         with FuturesSession() as session:
             future = session.get(f"http://localhost:{server_port}/{plain_file}")
             response = future.result()
@@ -84,7 +80,6 @@ def test_plain(server_port, plain_file):
 
 def test_static_slash(server_port):
     with Server("./server", server_port, 4, 8) as server:
-        sleep(0.1)
         with FuturesSession() as session:
             future = session.get(f"http://localhost:{server_port}/")
             response1 = future.result()
@@ -99,7 +94,6 @@ def test_static_slash(server_port):
 def test_statistics(server_port):
     post_count = 0
     with Server("./server", server_port, 1, 8) as server:
-        sleep(0.1)
         with FuturesSession() as session1:
             future = session1.get(f"http://localhost:{server_port}/")
             response1 = future.result()
@@ -150,7 +144,6 @@ def test_statistics_post(server_port):
     post_count = 0
     get_statistics_list_for_post = []
     with Server("./server", server_port, 1, 8) as server:
-        sleep(0.1)
         with FuturesSession() as session1:
             future = session1.get(f"http://localhost:{server_port}/")
             response1 = future.result()
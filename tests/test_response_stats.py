@@ -0,0 +1,76 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from response_stats import StatsParser, parse
+
+HEADERS = [
+    "HTTP/1.0 200 OK",
+    "Server: OS-HW3 Web Server",
+    "Content-Length: 293",
+    "Content-Type: text/html",
+    "Stat-Req-Arrival:: 1700000000.250000",
+    "Stat-Req-Dispatch:: 0.000125",
+    "Stat-Thread-Id:: 3",
+    "Stat-Thread-Count:: 7",
+    "Stat-Thread-Static:: 4",
+    "Stat-Thread-Dynamic:: 2",
+    "Stat-Thread-Post:: 1",
+]
+EXPECTED = {"arrival": 1700000000.25, "dispatch": 0.000125, "thread_id": 3, "thread_count": 7,
+            "thread_static": 4, "thread_dynamic": 2, "thread_post": 1}
+RAW = ("\r\n".join(HEADERS) + "\r\n\r\n<html>body</html>").encode()
+
+
+def feed(chunks):
+    parser = StatsParser()
+    done = [parser.feed(chunk) for chunk in chunks]
+    assert done[-1]
+    return parser.close()
+
+
+def test_header_split_across_chunks():
+    cut = RAW.index(b"Stat-Thread-Id") + 5
+    stats = feed([RAW[:cut], RAW[cut:]])
+    assert stats.status == 200
+    assert stats.as_dict() == EXPECTED
+
+
+@pytest.mark.parametrize("size", [1, 7, 50])
+def test_small_chunks(size):
+    stats = feed([RAW[start:start + size] for start in range(0, len(RAW), size)])
+    assert stats.status == 200
+    assert stats.as_dict() == EXPECTED
+
+
+def test_unterminated_last_line():
+    parser = StatsParser()
+    assert not parser.feed(b"HTTP/1.0 404 Not Found\r\nStat-Thread-Id:: 2")
+    stats = parser.close()
+    assert stats.status_name == "404"
+    assert stats.thread_id == 2
+
+
+def test_transcript():
+    # ./client prints "Header: " before every header line, and the body as is
+    transcript = "".join(f"Header: {line}\n" for line in HEADERS) + "Stat-Thread-Id:: 9\n<html>body</html>"
+    stats = parse(transcript)
+    assert stats.status == 200
+    assert stats.as_dict() == EXPECTED
+
+
+def test_post_body_is_not_parsed():
+    # a POST returns the server log: a body full of Stat-* blocks of other requests
+    log = "".join(f"Stat-Req-Arrival:: 1.0\r\nStat-Thread-Id:: {i}\r\nStat-Thread-Post:: 99\r\n\r\n"
+                  for i in range(100))
+    stats = parse(RAW.split(b"\r\n\r\n")[0] + b"\r\n\r\n" + log.encode())
+    assert stats.as_dict() == EXPECTED
+    assert parse(RAW.split(b"\r\n\r\n")[0].decode() + "\r\n\r\n" + log).as_dict() == EXPECTED
+
+
+def test_missing_values():
+    stats = parse(b"HTTP/1.0 501 Not Implemented\r\nStat-Thread-Id:: x\r\n\r\n")
+    assert stats.status_name == "501"
+    assert stats.as_dict() == {}
@@ -1,5 +1,4 @@
 from signal import SIGINT
-from time import sleep
 import pytest
 
 from server import Server, server_port
@@ -10,7 +9,6 @@ from requests_futures.sessions import FuturesSession
 
 def test_static(server_port):
     with Server("./server", server_port, 4, 8) as server:
-        sleep(0.1)
         with FuturesSession() as session:
             future = session.get(f"http://localhost:{server_port}/home.html")
             response = future.result()
@@ -26,7 +24,6 @@ def test_static(server_port):
 
 def test_dynamic(server_port):
     with Server("./server", server_port, 4, 8) as server:
-        sleep(0.1)
         with FuturesSession() as session:
             future = session.get(f"http://localhost:{server_port}/output.cgi?1")
             response = future.result()
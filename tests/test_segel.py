@@ -19,7 +19,6 @@ The tests in this file are based on the description of the tests given by the co
 def test_basic(server_port):
     """check if the webserver can serve requests"""
     with Server("./server", server_port, 1, 1) as server:
-        sleep(0.1)
         for req in ["output.cgi?1", "favicon.ico", "home.html"]:
             session = FuturesSession()
             r = session.get(f"http://localhost:{server_port}/{req}").result()
@@ -59,7 +58,6 @@ def test_nobusywait(server_port):
 def test_pool(threads, queue_size, server_port):
     """check if using a fixed size thread pool"""
     with Server("./server", server_port, threads, queue_size) as server:
-        sleep(0.1)
         stats = [stats for stats in psutil.process_iter() if server.pid == stats.pid][0]
         assert stats.num_threads() <= threads + 2
 
@@ -76,7 +74,6 @@ def test_single(threads, num_clients, queue_size, times, files, server_port):
     # single thread serving many requests server params: threads 1, Q_size 30.
     # 25 clients each requesting ['/home.html', '/favicon.ico'], 20 times
     with Server("./server", server_port, threads, queue_size) as server:
-        sleep(0.1)
         for _ in range(times):
             for file_name, options in files.items():
                 clients = []
@@ -113,7 +110,6 @@ LIGHT2_FILES = {'/home.html': [True, STATIC_OUTPUT_CONTENT, generate_static_head
                          ])
 def test_light(threads, num_clients, queue_size, times, files, server_port):
     with Server("./server", server_port, threads, queue_size) as server:
-        sleep(0.1)
         for _ in range(times):
             for file_name, options in files.items():
                 clients = []
@@ -160,7 +156,6 @@ LOCKS4_FILES = {'/output.cgi?0.01': [True, DYNAMIC_OUTPUT_CONTENT.format(seconds
 
 def test_locks(threads, num_clients, queue_size, times, files, server_port):
     with Server("./server", server_port, threads, queue_size) as server:
-        sleep(0.1)
         for _ in range(times):
             for file_name, options in files.items():
                 clients = []
@@ -192,7 +187,6 @@ EQUAL_FILES = {'/home.html': [True, STATIC_OUTPUT_CONTENT, generate_static_heade
                          ])
 def test_equal(threads, num_clients, queue_size, times, files, server_port):
     with Server("./server", server_port, threads, queue_size) as server:
-        sleep(0.1)
         for _ in range(times):
             for file_name, options in files.items():
                 clients = []
@@ -221,7 +215,6 @@ FEWER_FILES = {'/home.html': [True, STATIC_OUTPUT_CONTENT, generate_static_heade
                          ])
 def test_fewer(threads, num_clients, queue_size, times, files, server_port):
     with Server("./server", server_port, threads, queue_size) as server:
-        sleep(0.1)
         for _ in range(times):
             for file_name, options in files.items():
                 clients = []
@@ -408,7 +401,6 @@ STATS_EXTRACTOR = r"Header: Stat-Thread-Id:: (\d+)[\r\n]+" \
                          ])
 def test_stats(threads, queue_size, dynamic, static, server_port):
     with Server("./server", server_port, threads, queue_size) as server:
-        sleep(0.1)
         ask_for = ['/home.html'] * static + ['/output.cgi?0.1'] * dynamic
         random.shuffle(ask_for)
         clients = []
@@ -444,7 +436,6 @@ def test_stats(threads, queue_size, dynamic, static, server_port):
 def test_stats_dispatch_time(threads, num_clients, queue_size, server_port):
     # dispatch time should be greater than 1 secs when sending 1sec 4 dynamic requests. the server only has 2 worker threads.
     with Server("./server", server_port, threads, queue_size) as server:
-        sleep(0.1)
         clients = []
         for _ in range(num_clients):
             session = FuturesSession()
@@ -1,43 +1,47 @@
 from copy import copy
+from functools import lru_cache
 import re
-from time import sleep
+from time import monotonic, sleep
 import requests
-from requests_futures.sessions import FuturesSession
 import math
 
+from loadgen import PendingResponse, generator
+
 from definitions import DYNAMIC_OUTPUT_HEADERS, ERROR_OUTPUT_HEADERS, STATIC_OUTPUT_HEADERS
 
 def convert_dict_to_string(dictionary, dictionary_keys):
        return  "\r\n".join([':'.join([k, dictionary[k]]) for k in dictionary_keys if k not in ["Content-length","Content-type","Server","Content-Length","Content-Type"]])
 
 
-def generate_static_headers(length, count, static_count, dynamic_count, post_count,content_type="text/html"):
-    headers = copy(STATIC_OUTPUT_HEADERS)
-    headers['Content-Length'] = headers["Content-Length"].format(length=length)
-    headers['Content-Type'] = headers["Content-Type"].format(content_type=content_type)
+_HEADER_TEMPLATES = {
+    "static": STATIC_OUTPUT_HEADERS,
+    "dynamic": DYNAMIC_OUTPUT_HEADERS,
+    "error": ERROR_OUTPUT_HEADERS,
+}
+
+
+@lru_cache(maxsize=4096)
+def _expected_headers(kind, length, count, static_count, dynamic_count, post_count, content_type="text/html"):
+    headers = copy(_HEADER_TEMPLATES[kind])
+    length_header = "Content-length" if kind == "dynamic" else "Content-Length"
+    headers[length_header] = headers[length_header].format(length=length)
+    if kind == "static":
+        headers['Content-Type'] = headers["Content-Type"].format(content_type=content_type)
     headers['Stat-Thread-Count'] = headers['Stat-Thread-Count'].format(count=count)
     headers['Stat-Thread-Static'] = headers['Stat-Thread-Static'].format(count=static_count)
     headers['Stat-Thread-Dynamic'] = headers['Stat-Thread-Dynamic'].format(count=dynamic_count)
     headers['Stat-Thread-Post']    = headers['Stat-Thread-Post'].format(count=post_count)
-    return headers
+    return tuple(headers.items())
+
+
+def generate_static_headers(length, count, static_count, dynamic_count, post_count,content_type="text/html"):
+    return dict(_expected_headers("static", length, count, static_count, dynamic_count, post_count, content_type))
 
 def generate_dynamic_headers(length, count, static_count, dynamic_count, post_count):
-    headers = copy(DYNAMIC_OUTPUT_HEADERS)
-    headers['Content-length'] = headers["Content-length"].format(length=length)
-    headers['Stat-Thread-Count'] = headers['Stat-Thread-Count'].format(count=count)
-    headers['Stat-Thread-Static'] = headers['Stat-Thread-Static'].format(count=static_count)
-    headers['Stat-Thread-Dynamic'] = headers['Stat-Thread-Dynamic'].format(count=dynamic_count)
-    headers['Stat-Thread-Post']    = headers['Stat-Thread-Post'].format(count=post_count)
-    return headers
+    return dict(_expected_headers("dynamic", length, count, static_count, dynamic_count, post_count))
 
 def generate_error_headers(length, count, static_count, dynamic_count, post_count):
-    headers = copy(ERROR_OUTPUT_HEADERS)
-    headers['Content-Length'] = headers["Content-Length"].format(length=length)
-    headers['Stat-Thread-Count'] = headers['Stat-Thread-Count'].format(count=count)
-    headers['Stat-Thread-Static'] = headers['Stat-Thread-Static'].format(count=static_count)
-    headers['Stat-Thread-Dynamic'] = headers['Stat-Thread-Dynamic'].format(count=dynamic_count)
-    headers['Stat-Thread-Post']    = headers['Stat-Thread-Post'].format(count=post_count)
-    return headers
+    return dict(_expected_headers("error", length, count, static_count, dynamic_count, post_count))
 
 def validate_out(out: str, err: str, expected: str):
     return
@@ -47,62 +51,75 @@ def validate_out(out: str, err: str, expected: str):
         f"\nGot:\n{out}"
 
 
+class ResponseValidator:
+    """
+    Checks responses against one expected shape, with the header and body
+    patterns compiled once. Build them with response_validator(), which
+    caches them, rather than directly.
+
+    body_mode is "match" or "fullmatch" for the text of the response,
+    "fullmatch_repr" to also show the text repr()'d on failure, or "binary"
+    to only require a non-empty body.
+    """
+
+    __slots__ = ("status", "names", "keys", "headers", "header_label", "body", "body_pattern", "body_mode")
+
+    def __init__(self, status: int, header_items: tuple, body: str, body_mode: str, header_label: str):
+        self.status = status
+        self.names = [name for name, _ in header_items]
+        self.keys = frozenset(self.names)
+        self.headers = tuple((name, value, re.compile(value)) for name, value in header_items)
+        self.header_label = header_label
+        self.body = body
+        self.body_pattern = re.compile(body) if body_mode != "binary" else None
+        self.body_mode = body_mode
+
+    def __call__(self, response: requests.models.Response):
+        assert response.status_code == self.status
+        assert response.headers.keys() == self.keys,\
+            f"\nExpected:\n{self.names}"\
+            f"\nGot:\n{list(response.headers.keys())}"
+        got = response.headers
+        for header, value, pattern in self.headers:
+            assert pattern.fullmatch(got[header]),\
+                f"\nHeader:{self.header_label}{header}"\
+                f"\nExpected:\n{value}"\
+                f"\nGot:\n{got[header]}"
+        if self.body_mode == "binary":
+            assert response.content
+        elif self.body_mode == "match":
+            assert self.body_pattern.match(response.text),\
+                f"\nExpected:\n{self.body}"\
+                f"\nGot:\n{response.text}"
+        elif self.body_mode == "fullmatch":
+            assert self.body_pattern.fullmatch(response.text),\
+                f"\nExpected:\n{self.body}"\
+                f"\nGot:\n{response.text}"
+        else:
+            assert self.body_pattern.fullmatch(response.text),\
+                f"\nExpected:\n{repr(self.body)}"\
+                f"\nGot:\n{repr(response.text)}"
+
+
+@lru_cache(maxsize=1024)
+def response_validator(status: int, header_items: tuple, body: str = "",
+                       body_mode: str = "fullmatch", header_label: str = "\n") -> ResponseValidator:
+    """The ResponseValidator for (header, pattern) `header_items` and a body pattern, compiled once."""
+    return ResponseValidator(status, header_items, body, body_mode, header_label)
+
+
 def validate_response(response: requests.models.Response, expected_headers: dict, expected: str):
-    assert response.status_code == 200
-    assert response.headers.keys() == expected_headers.keys(),\
-        f"\nExpected:\n{list(expected_headers.keys())}"\
-        f"\nGot:\n{list(response.headers.keys())}"
-    for header, value in expected_headers.items():
-        assert re.fullmatch(value, response.headers[header]),\
-            f"\nHeader: {header}"\
-            f"\nExpected:\n{value}"\
-            f"\nGot:\n{response.headers[header]}"
-    assert re.match(expected, response.text),\
-        f"\nExpected:\n{expected}"\
-        f"\nGot:\n{response.text}"
+    response_validator(200, tuple(expected_headers.items()), expected, "match", " ")(response)
 
 
 def validate_response_full_post(response: requests.models.Response, expected_headers: dict, expected: str, post_string):
-    assert response.status_code == 200
-    assert response.headers.keys() == expected_headers.keys(),\
-        f"\nExpected:\n{list(expected_headers.keys())}"\
-        f"\nGot:\n{list(response.headers.keys())}"
-    for header, value in expected_headers.items():
-        assert re.fullmatch(value, response.headers[header]),\
-            f"\nHeader:\n{header}"\
-            f"\nExpected:\n{value}"\
-            f"\nGot:\n{response.headers[header]}"
-    assert re.fullmatch(post_string, response.text),\
-        f"\nExpected:\n{repr(post_string)}"\
-        f"\nGot:\n{repr(response.text)}"
+    response_validator(200, tuple(expected_headers.items()), post_string, "fullmatch_repr")(response)
     
 def validate_response_full(response: requests.models.Response, expected_headers: dict, expected: str):
-    assert response.status_code == 200
-    assert response.headers.keys() == expected_headers.keys(),\
-        f"\nExpected:\n{list(expected_headers.keys())}"\
-        f"\nGot:\n{list(response.headers.keys())}"
-    for header, value in expected_headers.items():
-        assert re.fullmatch(value, response.headers[header]),\
-            f"\nHeader:\n{header}"\
-            f"\nExpected:\n{value}"\
-            f"\nGot:\n{response.headers[header]}"
-    assert re.fullmatch(expected, response.text),\
-        f"\nExpected:\n{expected}"\
-        f"\nGot:\n{response.text}"
+    response_validator(200, tuple(expected_headers.items()), expected)(response)
 
 def validate_response_full_with_dispatch(response: requests.models.Response, expected_headers: dict, expected: str, dispatch: float):
-    assert response.status_code == 200
-    assert response.headers.keys() == expected_headers.keys(),\
-        f"\nExpected:\n{list(expected_headers.keys())}"\
-        f"\nGot:\n{list(response.headers.keys())}"
-    for header, value in expected_headers.items():
-        assert re.fullmatch(value, response.headers[header]),\
-            f"\nHeader:\n{header}"\
-            f"\nExpected:\n{value}"\
-            f"\nGot:\n{response.headers[header]}"
-    assert re.fullmatch(expected, response.text),\
-        f"\nExpected:\n{expected}"\
-        f"\nGot:\n{response.text}"
+    response_validator(200, tuple(expected_headers.items()), expected)(response)
 
     assert abs(float(response.headers['Stat-Req-Dispatch'][2:]) - dispatch) < 0.1,\
         f"\nExpected:\n{dispatch}"\
@@ -110,38 +127,27 @@ def validate_response_full_with_dispatch(response: requests.models.Response, exp
 
 
 def validate_response_binary(response: requests.models.Response, expected_headers: dict, expected: str):
-    assert response.status_code == 200
-    assert response.headers.keys() == expected_headers.keys(),\
-        f"\nExpected:\n{list(expected_headers.keys())}"\
-        f"\nGot:\n{list(response.headers.keys())}"
-    for header, value in expected_headers.items():
-        assert re.fullmatch(value, response.headers[header]),\
-            f"\nHeader:\n{header}"\
-            f"\nExpected:\n{value}"\
-            f"\nGot:\n{response.headers[header]}"
-    assert response.content
+    response_validator(200, tuple(expected_headers.items()), body_mode="binary")(response)
 
 def validate_response_err(response: requests.models.Response, status: int, expected_headers: dict, expected: str):
-    assert response.status_code == status
-    assert response.headers.keys() == expected_headers.keys(),\
-        f"\nExpected:\n{list(expected_headers.keys())}"\
-        f"\nGot:\n{list(response.headers.keys())}"
-    for header, value in expected_headers.items():
-        assert re.fullmatch(value, response.headers[header]),\
-            f"\nHeader:\n{header}"\
-            f"\nExpected:\n{value}"\
-            f"\nGot:\n{response.headers[header]}"
-    assert re.fullmatch(expected, response.text),\
-        f"\nExpected:\n{expected}"\
-        f"\nGot:\n{response.text}"
+    response_validator(status, tuple(expected_headers.items()), expected)(response)
 
 
 def spawn_clients(amount, server_port):
+    """
+    Starts `amount` CGI requests exactly 0.1s apart on the shared asyncio load
+    generator and returns once the last one started, as the old thread-per-request
+    version did. Each client is a (handle, future) pair: future.result() returns
+    a requests.Response or raises requests.exceptions.ConnectionError, and
+    handle.close() abandons the request.
+    """
+    load = generator()
+    start = monotonic()
     clients = []
     for i in range(amount):
-        session = FuturesSession()
-        clients.append((session, session.get(f"http://localhost:{server_port}/output.cgi?1.{i}")))
-        sleep(0.1)
+        pending = PendingResponse(load.submit(server_port, f"/output.cgi?1.{i}", at=start + i * 0.1))
+        clients.append((pending, pending))
+    sleep(max(0, start + amount * 0.1 - monotonic()))
     return clients
 
 
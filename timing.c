@@ -0,0 +1,39 @@
+#include "segel.h"
+#include "timing.h"
+
+static unsigned long g_wall_offset_ns = 0;
+
+static unsigned long timespec_ns(struct timespec *ts) {
+    return ts->tv_sec * 1000000000UL + ts->tv_nsec;
+}
+
+void timing_init(void) {
+    struct timespec before, wall, after;
+
+    // bracket the wall-clock read so the offset is off by at most half the gap
+    clock_gettime(CLOCK_MONOTONIC, &before);
+    clock_gettime(CLOCK_REALTIME, &wall);
+    clock_gettime(CLOCK_MONOTONIC, &after);
+    unsigned long mono = timespec_ns(&before)
+                         + (timespec_ns(&after) - timespec_ns(&before)) / 2;
+    g_wall_offset_ns = timespec_ns(&wall) - mono;
+}
+
+unsigned long mono_now_ns(void) {
+    struct timespec ts;
+
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return timespec_ns(&ts);
+}
+
+struct timeval mono_to_wall(unsigned long ns) {
+    return ns_to_timeval(ns + g_wall_offset_ns);
+}
+
+struct timeval ns_to_timeval(unsigned long ns) {
+    struct timeval tv;
+
+    tv.tv_sec = ns / 1000000000UL;
+    tv.tv_usec = (ns % 1000000000UL) / 1000;
+    return tv;
+}
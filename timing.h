@@ -0,0 +1,27 @@
+#ifndef SERVER_TIMING_H
+#define SERVER_TIMING_H
+
+#include <sys/time.h>
+
+//
+// Internal clock of the server.
+//
+// All request timing uses CLOCK_MONOTONIC, which NTP cannot step backwards.
+// Timestamps that are reported to clients (Stat-Req-Arrival) are converted to
+// wall-clock time with a single offset computed at startup, so the wire
+// format stays the same.
+//
+
+// Samples the offset between the wall clock and the monotonic clock
+void timing_init(void);
+
+// Current monotonic time in nanoseconds
+unsigned long mono_now_ns(void);
+
+// Converts a monotonic timestamp to wall-clock time
+struct timeval mono_to_wall(unsigned long ns);
+
+// Converts a duration in nanoseconds to a timeval
+struct timeval ns_to_timeval(unsigned long ns);
+
+#endif // SERVER_TIMING_H
@@ -0,0 +1,181 @@
+#include "segel.h"
+#include "request.h"
+#include "trace.h"
+#include "timing.h"
+
+#define TRACE_RING_SIZE 4096 // events per thread, a power of two
+
+typedef struct {
+    unsigned long start;
+    unsigned long end;
+    int phase;
+} trace_event;
+
+typedef struct __attribute__((aligned(CACHE_LINE))) {
+    unsigned long head; // number of events ever recorded
+    trace_event events[TRACE_RING_SIZE];
+} trace_ring;
+
+static const char *phase_names[TRACE_PHASES] = {
+    "accept", "queue_wait", "parse", "stat", "open_mmap",
+    "write", "cgi_fork", "cgi_wait", "log_append"
+};
+
+static trace_ring *g_rings = NULL;
+static int g_num_rings = 0;
+static int g_num_workers = 0;
+static int g_trace_enabled = 0;
+static __thread trace_ring *tl_ring = NULL;
+
+void trace_init(int num_workers, int num_acceptors, int enabled) {
+    int num_slots = 1 + num_workers + num_acceptors;
+
+    g_trace_enabled = enabled;
+    if (!enabled) {
+        return;
+    }
+    size_t size = sizeof(trace_ring) * num_slots;
+    int rc = posix_memalign((void **)&g_rings, CACHE_LINE, size);
+    if (rc != 0) {
+        posix_error(rc, "posix_memalign error");
+    }
+    memset(g_rings, 0, size);
+    g_num_rings = num_slots;
+    g_num_workers = num_workers;
+}
+
+void trace_destroy(void) {
+    free(g_rings);
+    g_rings = NULL;
+    g_num_rings = 0;
+    g_trace_enabled = 0;
+}
+
+int trace_enabled(void) {
+    return g_trace_enabled;
+}
+
+void trace_attach(int slot) {
+    if (g_trace_enabled && slot < g_num_rings) {
+        tl_ring = &g_rings[slot];
+    }
+}
+
+unsigned long trace_now(void) {
+    if (!g_trace_enabled) {
+        return 0;
+    }
+    return mono_now_ns();
+}
+
+void trace_record(trace_phase phase, unsigned long start, unsigned long end) {
+    trace_ring *ring = tl_ring;
+
+    if (ring == NULL || start == 0) {
+        return;
+    }
+    unsigned long head = ring->head;
+    trace_event *event = &ring->events[head & (TRACE_RING_SIZE - 1)];
+    // order the overwrite after the previous head store, so a reader that
+    // copied any of these stores sees head move past the slot (see ring_copy)
+    __atomic_thread_fence(__ATOMIC_RELEASE);
+    __atomic_store_n(&event->start, start, __ATOMIC_RELAXED);
+    __atomic_store_n(&event->end, end, __ATOMIC_RELAXED);
+    __atomic_store_n(&event->phase, phase, __ATOMIC_RELAXED);
+    // publish the event
+    __atomic_store_n(&ring->head, head + 1, __ATOMIC_RELEASE);
+}
+
+void trace_end(trace_phase phase, unsigned long start) {
+    if (start == 0) {
+        return;
+    }
+    trace_record(phase, start, trace_now());
+}
+
+// The oldest event that cannot be mid-overwrite while head is `head`
+static unsigned long ring_oldest(unsigned long head) {
+    return head >= TRACE_RING_SIZE ? head - TRACE_RING_SIZE + 1 : 0;
+}
+
+//
+// Copies the events still held in a ring.
+// The owner keeps writing while we read, so events that were overwritten
+// during the copy are dropped by re-checking head afterwards.
+// The owner writes slot head before it publishes head + 1, so the oldest
+// of the last TRACE_RING_SIZE events may be mid-overwrite: at most
+// TRACE_RING_SIZE - 1 events are ever copied.
+//
+static int ring_copy(trace_ring *ring, trace_event *out) {
+    unsigned long head = __atomic_load_n(&ring->head, __ATOMIC_ACQUIRE);
+    unsigned long first = ring_oldest(head);
+
+    for (unsigned long i = first; i < head; i++) {
+        trace_event *event = &ring->events[i & (TRACE_RING_SIZE - 1)];
+        out[i - first].start = __atomic_load_n(&event->start, __ATOMIC_RELAXED);
+        out[i - first].end = __atomic_load_n(&event->end, __ATOMIC_RELAXED);
+        out[i - first].phase = __atomic_load_n(&event->phase, __ATOMIC_RELAXED);
+    }
+    __atomic_thread_fence(__ATOMIC_ACQUIRE);
+    unsigned long now = __atomic_load_n(&ring->head, __ATOMIC_RELAXED);
+    unsigned long valid = ring_oldest(now);
+    if (valid > first) {
+        unsigned long skip = valid - first;
+        if (skip >= head - first) {
+            return 0;
+        }
+        memmove(out, out + skip, sizeof(trace_event) * (head - first - skip));
+        first = valid;
+    }
+    return head - first;
+}
+
+int trace_export(char **dst) {
+    size_t len = 0;
+    int pid = getpid();
+    const char *sep = "";
+    trace_event *events = Malloc(sizeof(trace_event) * TRACE_RING_SIZE);
+
+    FILE *out = open_memstream(dst, &len);
+    if (out == NULL) {
+        unix_error("open_memstream error");
+    }
+    fprintf(out, "{\"traceEvents\":[");
+    for (int slot = 0; slot < g_num_rings; slot++) {
+        fprintf(out, "%s\n{\"name\":\"thread_name\",\"ph\":\"M\",\"pid\":%d,"
+                     "\"tid\":%d,\"args\":{\"name\":\"%s %d\"}}",
+                sep, pid, slot,
+                slot == 0 ? "main" : slot <= g_num_workers ? "worker" : "acceptor",
+                slot <= g_num_workers ? slot : slot - g_num_workers);
+        sep = ",";
+        int count = ring_copy(&g_rings[slot], events);
+        for (int i = 0; i < count; i++) {
+            if (events[i].phase < 0 || events[i].phase >= TRACE_PHASES) {
+                continue;
+            }
+            fprintf(out, ",\n{\"name\":\"%s\",\"cat\":\"request\",\"ph\":\"X\","
+                         "\"ts\":%.3f,\"dur\":%.3f,\"pid\":%d,\"tid\":%d}",
+                    phase_names[events[i].phase], events[i].start / 1e3,
+                    (events[i].end - events[i].start) / 1e3, pid, slot);
+        }
+    }
+    fprintf(out, "\n],\"displayTimeUnit\":\"ns\"}\n");
+    fclose(out);
+    free(events);
+    return len;
+}
+
+int trace_dump(const char *path) {
+    char *json = NULL;
+    int len = trace_export(&json);
+    int fd = open(path, O_WRONLY | O_CREAT | O_TRUNC, DEF_MODE);
+
+    if (fd < 0) {
+        free(json);
+        return -1;
+    }
+    rio_writen(fd, json, len);
+    close(fd);
+    free(json);
+    return 0;
+}
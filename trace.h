@@ -0,0 +1,56 @@
+#ifndef SERVER_TRACE_H
+#define SERVER_TRACE_H
+
+//
+// Request-lifecycle tracing.
+//
+// When enabled (./server ... --trace) every thread records the phases of the
+// requests it handles, with CLOCK_MONOTONIC timestamps, into its own ring of
+// recent events. Rings have a single writer and are read without locks, so
+// tracing never blocks the request path. The rings can be exported as Chrome
+// trace-event JSON (chrome://tracing, Perfetto) on GET /__trace or SIGUSR1.
+//
+
+typedef enum {
+    TRACE_ACCEPT,      // accept() returned -> connection enqueued
+    TRACE_QUEUE_WAIT,  // enqueued -> dequeued by a worker
+    TRACE_PARSE,       // reading the request line and headers
+    TRACE_STAT,        // stat() of the requested file
+    TRACE_OPEN,        // open() + mmap() of a static file
+    TRACE_WRITE,       // writing the response
+    TRACE_CGI_FORK,    // fork() of the CGI program
+    TRACE_CGI_WAIT,    // waiting for the CGI program to exit
+    TRACE_LOG,         // appending to the server log
+    TRACE_PHASES
+} trace_phase;
+
+// Allocates one ring per thread: slot 0 is the main thread, 1..num_workers
+// the workers and the following num_acceptors slots the acceptors
+void trace_init(int num_workers, int num_acceptors, int enabled);
+
+// Frees the rings
+void trace_destroy(void);
+
+// Returns 1 if tracing is on
+int trace_enabled(void);
+
+// Binds the calling thread to its ring
+void trace_attach(int slot);
+
+// Current monotonic time (see timing.h), or 0 when tracing is off
+unsigned long trace_now(void);
+
+// Records a phase of the calling thread that ran from start to now
+void trace_end(trace_phase phase, unsigned long start);
+
+// Records a phase of the calling thread with explicit start and end times
+void trace_record(trace_phase phase, unsigned long start, unsigned long end);
+
+// Renders all rings as Chrome trace-event JSON into a newly allocated string.
+// NOTE: caller is responsible for freeing dst
+int trace_export(char **dst);
+
+// Writes the Chrome trace-event JSON to path; returns -1 on error
+int trace_dump(const char *path);
+
+#endif // SERVER_TRACE_H
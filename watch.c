@@ -0,0 +1,177 @@
+#include "segel.h"
+#include <dirent.h>
+#include <sys/inotify.h>
+#include "watch.h"
+
+// Changes that can alter what a request for a file under the root returns
+#define WATCH_MASK (IN_CREATE | IN_DELETE | IN_MODIFY | IN_ATTRIB | \
+                    IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE_SELF | IN_MOVE_SELF)
+
+typedef struct {
+    watch_callback cb;
+    void *arg;
+} watch_subscriber;
+
+static unsigned long g_epoch = 0;
+static int g_enabled = 0;
+static char *g_root = NULL;
+static int g_inotify = -1;
+static char **g_dirs = NULL;     // path of every watched directory, by wd
+static int g_num_dirs = 0;
+static watch_subscriber g_subscribers[WATCH_MAX_CALLBACKS];
+static int g_num_subscribers = 0;
+static pthread_mutex_t g_subscribers_lock = PTHREAD_MUTEX_INITIALIZER;
+
+// Watches dir and every directory below it.
+// Returns -1 if any of them could not be watched.
+static int watch_tree(const char *dir) {
+    char path[MAXLINE];
+    struct stat sbuf;
+    struct dirent *entry;
+    int rc = 0;
+
+    int wd = inotify_add_watch(g_inotify, dir, WATCH_MASK | IN_ONLYDIR);
+    if (wd < 0) {
+        return -1;
+    }
+    if (wd >= g_num_dirs) {
+        int num_dirs = g_num_dirs ? g_num_dirs : 16;
+        while (num_dirs <= wd) {
+            num_dirs *= 2;
+        }
+        g_dirs = realloc(g_dirs, sizeof(char *) * num_dirs);
+        if (g_dirs == NULL) {
+            unix_error("realloc error");
+        }
+        memset(g_dirs + g_num_dirs, 0, sizeof(char *) * (num_dirs - g_num_dirs));
+        g_num_dirs = num_dirs;
+    }
+    free(g_dirs[wd]);
+    g_dirs[wd] = strdup(dir);
+
+    DIR *d = opendir(dir);
+    if (d == NULL) {
+        return 0; // already gone: its parent reports the deletion
+    }
+    while ((entry = readdir(d)) != NULL) {
+        if (!strcmp(entry->d_name, ".") || !strcmp(entry->d_name, "..")) {
+            continue;
+        }
+        snprintf(path, sizeof(path), "%s/%s", dir, entry->d_name);
+        if (entry->d_type == DT_DIR ||
+            (entry->d_type == DT_UNKNOWN && lstat(path, &sbuf) == 0 &&
+             S_ISDIR(sbuf.st_mode))) {
+            if (watch_tree(path) < 0) {
+                rc = -1;
+            }
+        }
+    }
+    closedir(d);
+    return rc;
+}
+
+// Follows new directories; returns -1 if changes may have gone unnoticed
+static int handle_events(char *events, ssize_t len) {
+    char path[MAXLINE];
+    int rc = 0;
+
+    for (char *p = events; p < events + len;) {
+        struct inotify_event *event = (struct inotify_event *)p;
+        int known = event->wd >= 0 && event->wd < g_num_dirs && g_dirs[event->wd];
+
+        if (event->mask & IN_Q_OVERFLOW) {
+            // events were dropped, possibly creations of directories
+            if (watch_tree(g_root) < 0) {
+                rc = -1;
+            }
+        } else if (known && (event->mask & IN_ISDIR) &&
+                   (event->mask & (IN_CREATE | IN_MOVED_TO))) {
+            snprintf(path, sizeof(path), "%s/%s", g_dirs[event->wd], event->name);
+            if (watch_tree(path) < 0) {
+                rc = -1;
+            }
+        } else if (known && (event->mask & IN_IGNORED)) {
+            free(g_dirs[event->wd]);
+            g_dirs[event->wd] = NULL;
+        }
+        p += sizeof(struct inotify_event) + event->len;
+    }
+    return rc;
+}
+
+int watch_init(const char *root) {
+    g_inotify = inotify_init1(IN_CLOEXEC | IN_NONBLOCK);
+    if (g_inotify < 0) {
+        fprintf(stderr, "watch: inotify_init1: %s\n", strerror(errno));
+        return -1;
+    }
+    g_root = strdup(root);
+    if (watch_tree(root) < 0) {
+        fprintf(stderr, "watch: cannot watch %s: %s\n", root, strerror(errno));
+        watch_destroy();
+        return -1;
+    }
+    g_enabled = 1;
+    return 0;
+}
+
+void watch_destroy(void) {
+    if (g_inotify >= 0) {
+        Close(g_inotify);
+        g_inotify = -1;
+    }
+    for (int i = 0; i < g_num_dirs; i++) {
+        free(g_dirs[i]);
+    }
+    free(g_dirs);
+    g_dirs = NULL;
+    g_num_dirs = 0;
+    free(g_root);
+    g_root = NULL;
+    g_enabled = 0;
+}
+
+int watch_fd(void) {
+    return g_inotify;
+}
+
+// Publishes a new epoch after every batch of changes
+void watch_handle(void) {
+    char events[4096] __attribute__((aligned(__alignof__(struct inotify_event))));
+
+    ssize_t len = read(g_inotify, events, sizeof(events));
+    if (len <= 0) {
+        return;
+    }
+    if (handle_events(events, len) < 0 && g_enabled) {
+        fprintf(stderr, "watch: lost track of %s, caching disabled\n", g_root);
+        __atomic_store_n(&g_enabled, 0, __ATOMIC_RELAXED);
+    }
+    // only published once new directories are watched, so nothing
+    // created in them can predate the epoch
+    unsigned long epoch = __atomic_add_fetch(&g_epoch, 1, __ATOMIC_RELEASE);
+    pthread_mutex_lock(&g_subscribers_lock);
+    for (int i = 0; i < g_num_subscribers; i++) {
+        g_subscribers[i].cb(epoch, g_subscribers[i].arg);
+    }
+    pthread_mutex_unlock(&g_subscribers_lock);
+}
+
+int watch_enabled(void) {
+    return __atomic_load_n(&g_enabled, __ATOMIC_RELAXED);
+}
+
+unsigned long watch_epoch(void) {
+    return __atomic_load_n(&g_epoch, __ATOMIC_ACQUIRE);
+}
+
+void watch_register(watch_callback cb, void *arg) {
+    pthread_mutex_lock(&g_subscribers_lock);
+    if (g_num_subscribers == WATCH_MAX_CALLBACKS) {
+        app_error("watch: too many callbacks");
+    }
+    g_subscribers[g_num_subscribers].cb = cb;
+    g_subscribers[g_num_subscribers].arg = arg;
+    g_num_subscribers++;
+    pthread_mutex_unlock(&g_subscribers_lock);
+}
@@ -0,0 +1,45 @@
+#ifndef SERVER_WATCH_H
+#define SERVER_WATCH_H
+
+//
+// Change notification for everything served out of the content root.
+//
+// The root and every directory below it are followed with inotify
+// (directories created later are picked up as they appear). The watcher has
+// no thread of its own: the server polls watch_fd() on a thread it already
+// runs and calls watch_handle() when it is readable, which bumps a global
+// epoch after each batch of changes. Caches stamp their entries with the
+// epoch they were built in and treat an entry as stale once watch_epoch()
+// moved on, so the hot path only pays one atomic load. Caches can also
+// register a callback, run from watch_handle() after every change, to drop
+// stale memory eagerly.
+//
+
+#define WATCH_MAX_CALLBACKS 8
+
+typedef void (*watch_callback)(unsigned long epoch, void *arg);
+
+// Starts watching root recursively.
+// Returns 0, or -1 if root cannot be watched (caches must then stay off).
+int watch_init(const char *root);
+
+// Stops watching; nothing may call watch_handle() any more
+void watch_destroy(void);
+
+// The inotify descriptor to poll for POLLIN, or -1 if nothing is watched
+int watch_fd(void);
+
+// Reads the pending changes and publishes a new epoch for them.
+// Call only from one thread, when watch_fd() is readable.
+void watch_handle(void);
+
+// Returns 1 if changes are being tracked
+int watch_enabled(void);
+
+// Current epoch; changes whenever anything under the root changed
+unsigned long watch_epoch(void);
+
+// Calls cb(epoch, arg) from watch_handle() after every change
+void watch_register(watch_callback cb, void *arg);
+
+#endif // SERVER_WATCH_H